@@ -7,10 +7,11 @@ from django.conf import settings
 from django.contrib import admin, messages
 from django.db.models import QuerySet
 from django.http import HttpResponse
+from django.utils import timezone
 
 from bp.models import BP, Project, AGGradeBeforeDeadline, AGGradeAfterDeadline, TL, Student, TLLog, TLLogTemplate, \
     TLLogProblem, PeerGroup
-from bp.models import OrgaLog
+from bp.models import OrgaLog, QueuedMail, PretixOrder, ReminderRun
 from bp.grading.models import PitchGrade, DocsGrade
 from bp.timetracking.models import TimeSpentCategory, TimeInterval
 
@@ -116,3 +117,34 @@ class TLLogAdmin(admin.ModelAdmin):
 @admin.register(TLLogProblem)
 class TLLogProblemAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(QueuedMail)
+class QueuedMailAdmin(admin.ModelAdmin):
+    list_filter = ['status']
+    list_display = ['subject', 'created', 'status', 'attempts', 'sent']
+    actions = ['retry']
+
+    @admin.action(description="Erneut versuchen")
+    def retry(self, request, queryset):
+        count = queryset.exclude(status__in=[QueuedMail.SENT, QueuedMail.SENDING]).update(status=QueuedMail.PENDING, attempts=0,
+                                                                next_attempt=timezone.now())
+        self.message_user(request, f"{count} E-Mail(s) werden erneut verschickt.", messages.SUCCESS)
+
+
+@admin.register(ReminderRun)
+class ReminderRunAdmin(admin.ModelAdmin):
+    list_filter = ['status', 'dry_run']
+    list_display = ['started', 'status', 'dry_run', 'period', 'tls_reminded', 'projects_reminded', 'duration']
+    readonly_fields = ['started', 'finished', 'status', 'dry_run', 'period', 'tls_reminded', 'projects_reminded',
+                       'error']
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(PretixOrder)
+class PretixOrderAdmin(admin.ModelAdmin):
+    list_filter = ['event']
+    list_display = ['code', 'title', 'name', 'event', 'fetched']
+    exclude = ['secret']
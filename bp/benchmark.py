@@ -0,0 +1,334 @@
+import json
+import random
+import statistics
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import get_resolver, reverse, URLResolver
+from django.utils import timezone
+
+from bp.models import BP, Project, Student, TL, TLLog, TLLogProblem, TLLogTemplate, PeerGroup, PretixOrder, \
+    AGGradeBeforeDeadline, AGGradeAfterDeadline, PitchGrade, DocsGrade, OrgaLog
+from bp.timetracking.models import TimeInterval, TimeSpentCategory, TimeTrackingEntry, TimeTrackingRollup
+
+BASELINE_FILE = Path(__file__).resolve().parent / "benchmark_baseline.json"
+
+# Allowed deviations from the baseline: additional queries, relative response size, factor and slack of the time
+QUERY_TOLERANCE = 0
+SIZE_TOLERANCE = 0.1
+TIME_TOLERANCE = 3
+TIME_SLACK_MS = 20
+
+ROLES = ["orga", "tl", "student", "ag"]
+
+Cohort = namedtuple('Cohort', ['bp', 'orga', 'project', 'tl', 'student', 'interval', 'archived_interval',
+                               'planned_interval', 'log', 'orga_log', 'secret'])
+
+Measurement = namedtuple('Measurement', ['key', 'status', 'expected_status', 'queries', 'ms', 'bytes'])
+
+# Request of a view: HTTP method, roles that use the view, functions returning the URL parameters and the POST data
+# for a cohort (POST data given as string is sent as JSON) and the status of the response of the actual page
+ViewRequest = namedtuple('ViewRequest', ['method', 'roles', 'kwargs', 'data', 'status'], defaults=[None, 200])
+
+
+@override_settings(SEND_MAILS=False)
+def seed_cohort(bps=1, projects=12, students_per_project=4, intervals=4, categories=3, entries_per_interval=2,
+                logs_per_project=4, graded_share=0.7, seed=0):
+    """
+    Create a synthetic cohort: the active BP (and older ones) with projects, TLs, students, time tracking intervals
+    and entries, logs, grades, peer groups and cached pretix orders of the AGs
+
+    :param bps: number of BPs (all but the last one are inactive)
+    :param projects: number of projects per BP
+    :param students_per_project: number of students per project
+    :param intervals: number of time tracking intervals per project (the last one is the current one)
+    :param categories: number of time tracking categories
+    :param entries_per_interval: number of time tracking entries (categories) per student and interval
+    :param logs_per_project: number of TL logs per project
+    :param graded_share: share of projects graded by their AG
+    :param seed: seed of the random number generator
+    :return: objects of the active BP used to request the views
+    :rtype: Cohort
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    all_categories = [TimeSpentCategory.objects.create(name=f"Kategorie {i}") for i in range(1, categories + 1)]
+    problems = [TLLogProblem.objects.create(name=f"Problem {i}") for i in range(1, 4)]
+    orga = User.objects.create_superuser("orga", "orga@example.org", None)
+
+    for b in range(1, bps + 1):
+        bp = BP.objects.create(name=f"BP {b}", moodle_course_id=b, active=b == bps, pretix_event_ag=f"ag{b}",
+                               pretix_event_tl=f"tl{b}", ag_grading_start=today - timedelta(days=7),
+                               ag_grading_end=today + timedelta(days=7))
+        TLLogTemplate.objects.create(bp=bp, text="Wie läuft es?\nGibt es Probleme?")
+        tls = [TL.objects.create(bp=bp, name=f"TL {b}-{t}", confirmed=True,
+                                 user=User.objects.create(username=f"tl{b}-{t}", email=f"tl{b}-{t}@example.org"))
+               for t in range(max(1, projects // 3))]
+        bp_projects = []
+        for nr in range(1, projects + 1):
+            project = Project.objects.create(bp=bp, nr=nr, title=f"Projekt {nr}", ag=f"AG {nr % 5}",
+                                             ag_mail=f"ag{nr % 5}@example.org", order_id=f"{b}{nr:04d}",
+                                             tl=tls[nr % len(tls)])
+            PretixOrder.objects.create(event=bp.pretix_event_ag, code=project.order_id, secret=f"secret{nr}",
+                                       title=project.title, name=project.ag, email=project.ag_mail,
+                                       fetched=timezone.now())
+            bp_projects.append(project)
+            students = [Student.objects.create(bp=bp, project=project, name=f"Student {b}-{nr}-{s}",
+                                               moodle_id=f"{b}-{nr}-{s}", mail=f"s{b}-{nr}-{s}@example.org",
+                                               user=User.objects.create(username=f"s{b}-{nr}-{s}"))
+                        for s in range(students_per_project)]
+            entries = []
+            for i in range(intervals):
+                start = today - timedelta(days=7 * (intervals - 1 - i))
+                interval = TimeInterval.objects.create(name=f"Woche {i + 1}", start=start,
+                                                       end=start + timedelta(days=6), group=project)
+                for student in students:
+                    for category in rng.sample(all_categories, min(entries_per_interval, categories)):
+                        entries.append(TimeTrackingEntry(hours=Decimal(rng.randint(1, 32)) / 4, category=category,
+                                                         interval=interval, student=student))
+            TimeTrackingEntry.objects.bulk_create(entries)
+            for _ in range(logs_per_project):
+                log = TLLog.objects.create(bp=bp, group=project, tl=project.tl, text="Bericht " * rng.randint(20, 200),
+                                           status=rng.randint(-2, 2), read=rng.random() < 0.5,
+                                           rating=rng.choice([None, 1, 3, 5]),
+                                           requires_attention=rng.random() < 0.2)
+                log.current_problems.set(rng.sample(problems, rng.randint(0, 2)))
+            OrgaLog.objects.create(bp=bp, group=project, text="Notiz")
+            if rng.random() < graded_share:
+                AGGradeBeforeDeadline.objects.create(project=project, ag_points=rng.randint(40, 100),
+                                                     ag_points_justification="Begründung")
+                if rng.random() < 0.2:
+                    AGGradeAfterDeadline.objects.create(project=project, ag_points=rng.randint(40, 100),
+                                                        ag_points_justification="Begründung")
+                PitchGrade.objects.create(project=project, grade_points=Decimal(rng.randint(0, 20)), grade_notes="-")
+                DocsGrade.objects.create(project=project, grade_points=Decimal(rng.randint(0, 80)), grade_notes="-")
+        # one student without a project
+        Student.objects.create(bp=bp, name=f"Student {b} ohne Projekt", moodle_id=f"{b}-0",
+                               mail=f"s{b}@example.org")
+        for g, start in enumerate(range(0, len(bp_projects), 3), start=1):
+            peer_group = PeerGroup.objects.create(bp=bp, nr=g)
+            Project.objects.filter(pk__in=[p.pk for p in bp_projects[start:start + 3]]).update(peer_group=peer_group)
+    TimeTrackingRollup.rebuild()
+
+    project = Project.get_active().get(nr=1)
+    interval = project.timeinterval_set.order_by('start').last()
+    # intervals only the TL views need: hours can only be corrected in archived intervals (no longer editable by
+    # the students) and only intervals without entries can be deleted
+    archived_start = today - timedelta(days=7 * intervals + 28)
+    archived_interval = TimeInterval.objects.create(name="Archiviert", start=archived_start,
+                                                    end=archived_start + timedelta(days=6), group=project)
+    planned_interval = TimeInterval.objects.create(name="Geplant", start=today + timedelta(days=7),
+                                                   end=today + timedelta(days=13), group=project)
+    return Cohort(bp=project.bp, orga=orga, project=project, tl=project.tl, student=project.student_set.first(),
+                  interval=interval, archived_interval=archived_interval, planned_interval=planned_interval,
+                  log=project.tllog_set.first(), orga_log=OrgaLog.objects.get(group=project),
+                  secret=f"secret{project.nr}")
+
+
+# URL name -> request of the actual page (error paths like missing permissions are not benchmarked)
+VIEW_REQUESTS = {
+    "index": ViewRequest("get", ROLES, lambda c: {}),
+    "login": ViewRequest("get", ["ag"], lambda c: {}),
+    "project_list": ViewRequest("get", ["orga"], lambda c: {}),
+    "timetracking_statistics_orga": ViewRequest("get", ["orga"], lambda c: {}),
+    "peer_group_list": ViewRequest("get", ["orga"], lambda c: {}),
+    "create_peer_groups": ViewRequest("get", ["orga"], lambda c: {}),
+    # deletes the peer groups and redirects to the list
+    "delete_peer_groups": ViewRequest("get", ["orga"], lambda c: {}, status=302),
+    "peer_groups_export": ViewRequest("get", ["orga"], lambda c: {}),
+    "project_import": ViewRequest("get", ["orga"], lambda c: {}),
+    "project_export_grades": ViewRequest("get", ["orga"], lambda c: {}),
+    "project_detail": ViewRequest("get", ["orga"], lambda c: {'pk': c.project.pk}),
+    "project_tab": ViewRequest("get", ["orga"], lambda c: {'pk': c.project.pk, 'tab': "grading_content"}),
+    "project_edit_pitch_points": ViewRequest("get", ["orga"], lambda c: {'pk': c.project.pk}),
+    "project_edit_documentation_points": ViewRequest("get", ["orga"], lambda c: {'pk': c.project.pk}),
+    "project_list_ungraded": ViewRequest("get", ["orga"], lambda c: {}),
+    "project_list_close_to_higher_grade": ViewRequest("get", ["orga"], lambda c: {}),
+    "tl_list": ViewRequest("get", ["orga"], lambda c: {}),
+    "tl_detail": ViewRequest("get", ["orga"], lambda c: {'pk': c.tl.pk}),
+    "log_list": ViewRequest("get", ["orga"], lambda c: {}),
+    "log_list_attention": ViewRequest("get", ["orga"], lambda c: {}),
+    "log_list_unread": ViewRequest("get", ["orga"], lambda c: {}),
+    "log_list_unrated": ViewRequest("get", ["orga"], lambda c: {}),
+    "log_remind": ViewRequest("get", ["orga"], lambda c: {'period': 7}),
+    "log_detail": ViewRequest("get", ["orga"], lambda c: {'pk': c.log.pk}),
+    "log_api_mark_read": ViewRequest("post", ["orga"], lambda c: {'pk': c.log.pk}, lambda c: {}),
+    "log_api_mark_handled": ViewRequest("post", ["orga"], lambda c: {'pk': c.log.pk}, lambda c: {}),
+    "log_api_rate": ViewRequest("post", ["orga"], lambda c: {'pk': c.log.pk}, lambda c: {'rating': 4}),
+    # looks up the next unread log and redirects to it
+    "next_log": ViewRequest("get", ["orga"], lambda c: {'pk': c.log.pk}, status=302),
+    "log_api_triage_queue": ViewRequest("get", ["orga"], lambda c: {'pk': c.log.pk}),
+    "orga_log_create": ViewRequest("post", ["orga"], lambda c: {'group': c.project.nr},
+                                   lambda c: {'group_id': c.project.pk, 'text': "Notiz"}),
+    "orga_log_update": ViewRequest("post", ["orga"], lambda c: {'pk': c.orga_log.pk}, lambda c: {'text': "Notiz"}),
+    "orga_log_delete": ViewRequest("post", ["orga"], lambda c: {'pk': c.orga_log.pk}, lambda c: {}),
+    "student_list": ViewRequest("get", ["orga"], lambda c: {}),
+    "student_import": ViewRequest("get", ["orga"], lambda c: {}),
+    "ag_grade_invalid": ViewRequest("get", ["ag"], lambda c: {}),
+    "ag_grade_too_early": ViewRequest("get", ["ag"], lambda c: {'order_id': c.project.order_id}),
+    "ag_grade_success": ViewRequest("get", ["ag"], lambda c: {'order_id': c.project.order_id}),
+    "ag_grade": ViewRequest("get", ["ag"], lambda c: {'order_id': c.project.order_id, 'secret': c.secret}),
+    "orga_grades_import": ViewRequest("get", ["orga"], lambda c: {}),
+    "log_tl_start": ViewRequest("get", ["tl"], lambda c: {}),
+    "log_tl_create": ViewRequest("get", ["tl"], lambda c: {'group': c.project.nr}),
+    "log_tl_detail": ViewRequest("get", ["tl"], lambda c: {'group': c.project.nr, 'pk': c.log.pk}),
+    "log_tl_update": ViewRequest("get", ["tl"], lambda c: {'group': c.project.nr, 'pk': c.log.pk}),
+    "log_tl_delete": ViewRequest("get", ["tl"], lambda c: {'group': c.project.nr, 'pk': c.log.pk}),
+    "timetracking_tl_start": ViewRequest("get", ["tl"], lambda c: {}),
+    "timetracking_intervals": ViewRequest("get", ["tl"], lambda c: {'group': c.project.nr}),
+    "timetracking_interval_create": ViewRequest("get", ["tl"], lambda c: {'group': c.project.nr}),
+    "timetracking_interval_generate": ViewRequest("get", ["tl"], lambda c: {'group': c.project.nr}),
+    "timetracking_interval_update": ViewRequest("get", ["tl"], lambda c: {'group': c.project.nr, 'pk': c.interval.pk}),
+    "timetracking_interval_delete": ViewRequest("get", ["tl"],
+                                                lambda c: {'group': c.project.nr, 'pk': c.planned_interval.pk}),
+    "timetracking_project_overview": ViewRequest("get", ["orga", "tl", "student"], lambda c: {'group': c.project.nr}),
+    "timetracking_statistics_tl_and_student": ViewRequest("get", ["tl", "student"], lambda c: {'group': c.project.nr}),
+    "timetracking_interval_detail": ViewRequest("get", ["tl", "student"],
+                                                lambda c: {'group': c.project.nr, 'pk': c.interval.pk}),
+    "timetracking_interval_tl_correct": ViewRequest("get", ["tl"],
+                                                    lambda c: {'group': c.project.nr, 'pk': c.archived_interval.pk}),
+    "timetracking_api_add_hours": ViewRequest("post", ["student"],
+                                              lambda c: {'group': c.project.nr, 'pk': c.interval.pk},
+                                              lambda c: {'category': "Kategorie 1", 'hours': "2.5"}),
+    "timetracking_api_bulk_add_hours": ViewRequest("post", ["student"], lambda c: {'group': c.project.nr},
+                                                   lambda c: json.dumps({'cells': [
+                                                       {'interval': c.interval.pk, 'category': f"Kategorie {nr}",
+                                                        'hours': 2.5}
+                                                       for nr in range(1, 4)]})),
+    "timetracking_members_detail": ViewRequest("get", ["tl", "student"],
+                                               lambda c: {'group': c.project.nr, 'pk': c.student.pk}),
+    "import_overview": ViewRequest("get", ["orga"], lambda c: {}),
+}
+
+
+def bp_url_names():
+    """
+    :return: names of all URLs of the bp app
+    :rtype: set of str
+    """
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns)
+            elif pattern.name:
+                yield pattern.name
+
+    return set(walk(get_resolver('bp.urls').url_patterns))
+
+
+def _client(cohort, role):
+    client = Client()
+    user = {"orga": cohort.orga, "tl": cohort.tl.user, "student": cohort.student.user}.get(role)
+    if user is not None:
+        client.force_login(user)
+    return client
+
+
+@override_settings(SEND_MAILS=False)
+def measure_views(cohort, roles=ROLES, url_names=None, runs=1):
+    """
+    Request the views as those of the given roles that use them (each request with an empty cache and rolled back
+    afterwards), the wall time is the median of several runs
+
+    :param cohort: cohort created by seed_cohort
+    :type cohort: Cohort
+    :param roles: roles of the users requesting the views (AGs are anonymous users with the secret of the project)
+    :type roles: list of str
+    :param url_names: names of the URLs to request (default: all in VIEW_REQUESTS)
+    :type url_names: list of str
+    :param runs: number of requests per view and role
+    :type runs: int
+    :return: status, number of queries, wall time and size of the response per view and role
+    :rtype: list of Measurement
+    """
+    measurements = []
+    for role in roles:
+        client = _client(cohort, role)
+        for name in url_names or VIEW_REQUESTS:
+            method, view_roles, kwargs, data, expected_status = VIEW_REQUESTS[name]
+            if role not in view_roles:
+                continue
+            url = reverse(f"bp:{name}", kwargs=kwargs(cohort))
+            durations = []
+            for _ in range(max(1, runs)):
+                cache.clear()
+                with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    payload = data(cohort) if data else None
+                    content_type = {'content_type': "application/json"} if isinstance(payload, str) else {}
+                    response = getattr(client, method)(url, payload, **content_type)
+                    content = b"".join(response.streaming_content) if response.streaming else response.content
+                    durations.append((time.perf_counter() - start) * 1000)
+                    transaction.set_rollback(True)
+            measurements.append(Measurement(f"{name} {role}", response.status_code, expected_status, len(queries),
+                                            statistics.median(durations), len(content)))
+    return measurements
+
+
+def load_baseline():
+    """
+    :return: cohort parameters and measurements of the checked-in baseline
+    :rtype: dict
+    """
+    with open(BASELINE_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(cohort_parameters, measurements, update_times=False):
+    """
+    Store the measurements as new baseline. The wall times depend on the machine and vary from run to run,
+    so those of the previous baseline are kept unless update_times is set (or the view is new).
+
+    :param cohort_parameters: parameters of seed_cohort
+    :type cohort_parameters: dict
+    :param measurements: measurements of all views and roles
+    :type measurements: list of Measurement
+    :param update_times: whether to store the measured wall times
+    :type update_times: bool
+    """
+    previous = load_baseline()['views'] if BASELINE_FILE.exists() else {}
+    baseline = {
+        'cohort': cohort_parameters,
+        'views': {m.key: {'status': m.status, 'queries': m.queries, 'bytes': m.bytes,
+                          'ms': round(m.ms, 1) if update_times or m.key not in previous else previous[m.key]['ms']}
+                  for m in measurements},
+    }
+    with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare_to_baseline(measurement, baseline, check_time=True):
+    """
+    :param measurement: measurement of a view
+    :type measurement: Measurement
+    :param baseline: baseline (see load_baseline)
+    :type baseline: dict
+    :param check_time: whether to compare the wall time (which depends on the machine)
+    :type check_time: bool
+    :return: deviations from the baseline exceeding the tolerances
+    :rtype: list of str
+    """
+    problems = []
+    if measurement.status != measurement.expected_status:
+        problems.append(f"status {measurement.status} instead of {measurement.expected_status} (not the actual page)")
+    expected = baseline['views'].get(measurement.key)
+    if expected is None:
+        return problems + ["not in baseline"]
+    if measurement.status != expected['status']:
+        problems.append(f"status {measurement.status} instead of {expected['status']}")
+    if measurement.queries > expected['queries'] + QUERY_TOLERANCE:
+        problems.append(f"{measurement.queries} queries instead of {expected['queries']}")
+    if abs(measurement.bytes - expected['bytes']) > expected['bytes'] * SIZE_TOLERANCE:
+        problems.append(f"{measurement.bytes} bytes instead of {expected['bytes']}")
+    if check_time and measurement.ms > expected['ms'] * TIME_TOLERANCE + TIME_SLACK_MS:
+        problems.append(f"{measurement.ms:.1f} ms instead of {expected['ms']} ms")
+    return problems
@@ -0,0 +1,62 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Namespaces of cached data, each of them can be invalidated separately
+DASHBOARD = "dashboard"
+REFERENCE_DATA = "reference"
+
+
+def _generation_key(namespace):
+    return f"bp:generation:{namespace}"
+
+
+def _generation(namespace):
+    generation = cache.get(_generation_key(namespace))
+    if generation is None:
+        cache.add(_generation_key(namespace), uuid4().hex, None)
+        generation = cache.get(_generation_key(namespace))
+    return generation
+
+
+def cache_key(namespace, *parts):
+    """
+    Cache key for data derived from the database, e.g. cache_key(DASHBOARD, "orga", bp.pk).
+    All keys of a namespace become invalid at once by calling invalidate_cached_data.
+
+    :param namespace: namespace of the cached data (e.g. DASHBOARD)
+    :type namespace: str
+    :param parts: parts identifying the cached data
+    :return: key including the current generation of the namespace
+    :rtype: str
+    """
+    return ":".join(["bp", namespace, _generation(namespace), *map(str, parts)])
+
+
+def get_cached(key, compute, timeout=None):
+    """
+    Get a value from the cache, compute and store it if it is missing
+
+    :param key: key of the value (see cache_key)
+    :type key: str
+    :param compute: function computing the value
+    :type compute: function
+    :param timeout: maximum age of the value in seconds (default: settings.REFERENCE_DATA_CACHE_SECONDS)
+    :type timeout: int
+    :return: cached or computed value
+    """
+    if timeout is None:
+        timeout = settings.REFERENCE_DATA_CACHE_SECONDS
+    return cache.get_or_set(key, compute, timeout)
+
+
+def invalidate_cached_data(*namespaces):
+    """
+    Invalidate all data cached with keys of the given namespaces (e.g. after an update of the database)
+
+    :param namespaces: namespaces to invalidate (default: all)
+    :type namespaces: str
+    """
+    for namespace in namespaces or (DASHBOARD, REFERENCE_DATA):
+        cache.set(_generation_key(namespace), uuid4().hex, None)
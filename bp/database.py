@@ -0,0 +1,130 @@
+import logging
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection, OperationalError
+
+logger = logging.getLogger(__name__)
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    Receiver of connection_created: apply settings.SQLITE_PRAGMAS to every new SQLite connection
+    (executed directly on the database connection, so that they do not count as queries of the request)
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for pragma, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f"PRAGMA {pragma} = {value}")
+
+
+def _no_contention():
+    return {'calls': 0, 'locked': 0, 'retries': 0, 'failures': 0, 'wait_seconds': 0.0}
+
+
+class LockStatistics:
+    """
+        Contention on database locks seen by retry_on_lock in this process per write path (qualified name of the
+        decorated function): number of calls, calls that found the database locked at least once, retries, calls
+        that failed after all retries and the time spent waiting for the locks (failed attempts and backoff).
+        The contention of a single thread can be collected in addition (see track_thread), e.g. of a request
+        for the performance log.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._paths = {}
+
+    def add(self, path, **counts):
+        with self._lock:
+            statistics = self._paths.setdefault(path, _no_contention())
+            for name, value in counts.items():
+                statistics[name] += value
+        tracked = getattr(self._thread, 'paths', None)
+        if tracked is not None:
+            statistics = tracked.setdefault(path, _no_contention())
+            for name, value in counts.items():
+                statistics[name] += value
+
+    def track_thread(self):
+        """
+        Collect the contention of the current thread from now on separately (until the next call)
+
+        :return: counters per write path of the current thread, updated by retry_on_lock
+        :rtype: dict of str to dict
+        """
+        self._thread.paths = {}
+        return self._thread.paths
+
+    def snapshot(self):
+        """
+        :return: current values of the counters per write path
+        :rtype: dict of str to dict
+        """
+        with self._lock:
+            return {path: dict(statistics) for path, statistics in self._paths.items()}
+
+    @staticmethod
+    def total(statistics):
+        """
+        :param statistics: counters (e.g. the values of a snapshot)
+        :type statistics: iterable of dict
+        :return: sum of the counters
+        :rtype: dict
+        """
+        total = _no_contention()
+        for counts in statistics:
+            for name, value in counts.items():
+                total[name] += value
+        return total
+
+
+lock_statistics = LockStatistics()
+
+
+def is_lock_error(error):
+    return isinstance(error, OperationalError) and "locked" in str(error)
+
+
+def retry_on_lock(func):
+    """
+    Decorator for write paths: run the function again if the database is locked, with exponential backoff,
+    at most settings.DATABASE_LOCK_RETRIES times. SQLite reports a lock immediately (without waiting for the busy
+    timeout) if a transaction that has already read wants to write while another one is writing, so the function
+    should contain the whole transaction. Within an outer transaction the error is passed on, since only the
+    whole transaction can be repeated.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        for attempt in range(settings.DATABASE_LOCK_RETRIES + 1):
+            attempt_start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except OperationalError as e:
+                if not is_lock_error(e):
+                    raise
+                if attempt == settings.DATABASE_LOCK_RETRIES:
+                    lock_statistics.add(func.__qualname__, calls=1, locked=1, retries=attempt, failures=1,
+                                        wait_seconds=time.perf_counter() - start)
+                    logger.warning(f"{func.__qualname__}: database still locked after {attempt} retries")
+                    raise
+                time.sleep(settings.DATABASE_LOCK_RETRY_DELAY_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+                continue
+            if attempt:
+                lock_statistics.add(func.__qualname__, calls=1, locked=1, retries=attempt,
+                                    wait_seconds=attempt_start - start)
+            else:
+                lock_statistics.add(func.__qualname__, calls=1)
+            return result
+    return wrapper
@@ -0,0 +1,69 @@
+import csv
+import logging
+import time
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+# Rows are sent in chunks of roughly this size (in bytes) instead of one write per row
+CHUNK_SIZE = 64 * 1024
+
+
+class _Echo:
+    """
+        Pseudo file for csv.writer that returns the written line instead of storing it
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_chunks(filename, header, rows, delimiter):
+    writer = csv.writer(_Echo(), delimiter=delimiter)
+    row_count = 0
+    byte_count = 0
+    start = time.monotonic()
+    try:
+        chunk = [writer.writerow(header)]
+        chunk_length = len(chunk[0])
+        for row in rows:
+            line = writer.writerow(row)
+            chunk.append(line)
+            chunk_length += len(line)
+            row_count += 1
+            if chunk_length >= CHUNK_SIZE:
+                data = "".join(chunk).encode(settings.DEFAULT_CHARSET)
+                byte_count += len(data)
+                yield data
+                chunk, chunk_length = [], 0
+        data = "".join(chunk).encode(settings.DEFAULT_CHARSET)
+        byte_count += len(data)
+        yield data
+    finally:
+        # Also executed if the client aborts the download
+        duration = time.monotonic() - start
+        logger.info("Exported %s: %d rows, %d bytes in %.3f s (%.0f rows/s)",
+                    filename, row_count, byte_count, duration, row_count / duration if duration else row_count)
+
+
+def streaming_csv_response(filename, header, rows, delimiter=","):
+    """
+    Stream a CSV file to the client while it is generated, without building it in memory first.
+    The number of rows and bytes as well as the throughput are logged once the export is finished.
+
+    :param filename: name of the downloaded file
+    :type filename: str
+    :param header: column names
+    :type header: list of str
+    :param rows: rows of the file, ideally a lazily evaluated iterable like QuerySet.iterator()
+    :type rows: iterable of list
+    :param delimiter: column separator
+    :type delimiter: str
+    :return: response streaming the CSV file
+    :rtype: StreamingHttpResponse
+    """
+    response = StreamingHttpResponse(_csv_chunks(filename, header, rows, delimiter), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -6,7 +6,7 @@ from django.core.exceptions import ValidationError
 from django.core.mail import EmailMessage
 from django.urls import reverse_lazy
 
-from bp.models import AGGradeBeforeDeadline, AGGradeAfterDeadline
+from bp.models import AGGradeBeforeDeadline, AGGradeAfterDeadline, QueuedMail
 from bp.pretix import get_order_secret
 
 
@@ -69,7 +69,7 @@ Falls noch nicht geschehen, nehmen Sie daher bitte Kontakt zum BP Orga Team ({se
                 f"Sent via BP-Tool <{settings.SEND_MAILS_FROM}>",
                 [project.ag_mail]
             )
-            ag_mail.send(fail_silently=False)
+            QueuedMail.enqueue(ag_mail)
 
             # E-Mail for Orga team
             url = f"{'https://' + settings.ALLOWED_HOSTS[0] if len(settings.ALLOWED_HOSTS) > 0 else 'http://localhost'}{reverse_lazy('bp:project_detail', kwargs={'pk': project.pk})}"
@@ -80,4 +80,4 @@ Falls noch nicht geschehen, nehmen Sie daher bitte Kontakt zum BP Orga Team ({se
                 [settings.SEND_MAILS_TO],
                 reply_to=[project.ag_mail]
             )
-            orga_mail.send(fail_silently=False)
+            QueuedMail.enqueue(orga_mail)
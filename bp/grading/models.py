@@ -25,6 +25,10 @@ class AGGradeBeforeDeadline(AGGrade):
         verbose_name = "Bewertung"
         verbose_name_plural = "Bewertungen"
         ordering = ['project', 'timestamp']
+        indexes = [
+            # latest grade of a project
+            models.Index(fields=['project', 'timestamp'], name='bp_aggrade_project_time_idx'),
+        ]
 
     def __str__(self):
         return f"Bewertung für Projekt {self.project.nr} am {self.simple_timestamp}"
@@ -35,6 +39,10 @@ class AGGradeAfterDeadline(AGGrade):
         verbose_name = "Bewertung (verspätet)"
         verbose_name_plural = "Bewertungen (verspätet)"
         ordering = ['project', 'timestamp']
+        indexes = [
+            # latest (late) grade of a project
+            models.Index(fields=['project', 'timestamp'], name='bp_aggrade_late_project_idx'),
+        ]
 
     def __str__(self):
         return f"Verspätete Bewertung für Projekt {self.project.nr} am {self.simple_timestamp}"
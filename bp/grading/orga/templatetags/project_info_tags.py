@@ -8,8 +8,10 @@ grading_tab = ProjectInfoTabTags(priority=3 * 128)
 
 @grading_tab.register_description('bp/grading/orga/project_info_misc_grading_desc.html')
 def grading_description(project):
-    tab_context = {'project': project}
-    return ProjectGradesMixin.get_grading_context_data(tab_context, project)
+    # only the number, the gradings are loaded with the content of the tab
+    return {
+        'gradings_count': project.aggradebeforedeadline_set.count() + project.aggradeafterdeadline_set.count(),
+    }
 
 
 @grading_tab.register_content('bp/grading/orga/project_info_misc_grading_content.html')
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q, Exists, OuterRef
+from django.utils import timezone
+
+from bp.cache import cache_key, get_cached, DASHBOARD
+from bp.models import Project, TLLog, AGGradeBeforeDeadline, TimeInterval
+
+
+def _has_recent_log():
+    remind_after_days = timedelta(days=settings.LOG_REMIND_PERIOD_DAYS) + timedelta(days=1)
+    latest_day_to_remind = timezone.now() - remind_after_days
+    return Exists(TLLog.objects.filter(group=OuterRef('pk'), timestamp__gt=latest_day_to_remind))
+
+
+def _cached(key, compute):
+    # Cached values are invalidated by changes of the counted objects (see bp.models),
+    # the timeout refreshes counts that change over time (e.g. projects without recent logs)
+    return get_cached(key, compute, settings.DASHBOARD_CACHE_SECONDS)
+
+
+def orga_dashboard_metrics(bp):
+    """
+    Key figures of the given BP for the orga dashboard, computed with one conditional aggregate query per model
+
+    :param bp: BP of interest
+    :type bp: BP
+    :return: counts of projects, TLs, students and logs
+    :rtype: dict of str to int
+    """
+    def compute():
+        metrics = {}
+        metrics.update(bp.project_set
+                       .annotate(has_early_grade=Exists(AGGradeBeforeDeadline.objects.filter(project=OuterRef('pk'))),
+                                 has_recent_log=_has_recent_log())
+                       .aggregate(projects_count=Count('pk'),
+                                  projects_graded_count=Count('pk', filter=Q(has_early_grade=True)
+                                                                            | Q(ag_grade__isnull=False)),
+                                  projects_without_recent_logs_count=Count('pk', filter=Q(has_recent_log=False))))
+        metrics.update(bp.tl_set.aggregate(tls_count=Count('pk', filter=Q(confirmed=True)),
+                                           tls_unconfirmed_count=Count('pk', filter=Q(confirmed=False))))
+        metrics.update(bp.student_set.aggregate(students_count=Count('pk'),
+                                                students_without_project_count=Count('pk', filter=Q(project=None))))
+        metrics.update(bp.tllog_set.aggregate(logs_count=Count('pk'),
+                                              logs_unread_count=Count('pk', filter=Q(read=False)),
+                                              logs_attention_count=Count('pk', filter=Q(requires_attention=True,
+                                                                                        handled=False))))
+        return metrics
+
+    return _cached(cache_key(DASHBOARD, "orga", bp.pk), compute)
+
+
+def tl_dashboard_metrics(tl):
+    """
+    Key figures of the projects and logs of the given TL for the TL dashboard
+
+    :param tl: TL of interest
+    :type tl: TL
+    :return: counts of projects and logs
+    :rtype: dict of str to int
+    """
+    def compute():
+        metrics = {}
+        metrics.update(tl.project_set
+                       .annotate(has_interval=Exists(TimeInterval.objects.filter(group=OuterRef('pk'))),
+                                 has_recent_log=_has_recent_log())
+                       .aggregate(projects_count=Count('pk'),
+                                  projects_without_intervals=Count('pk', filter=Q(has_interval=False)),
+                                  projects_without_recent_logs_count=Count('pk', filter=Q(has_recent_log=False))))
+        metrics['logs_count'] = tl.tllog_set.count()
+        return metrics
+
+    return _cached(cache_key(DASHBOARD, "tl", tl.pk), compute)
@@ -0,0 +1,101 @@
+import re
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from bp.models import Project, TLLog, AGGradeBeforeDeadline, AGGradeAfterDeadline
+from bp.timetracking.models import TimeInterval, TimeTrackingEntry
+
+
+def key_queries():
+    """
+    Frequent queries that must be answered using an index
+
+    :return: name, queryset, the table that must not be scanned completely and the columns of the index to use
+    :rtype: list of (str, QuerySet, str, list of str)
+    """
+    # the IDs do not matter for the query plans
+    log_table = TLLog._meta.db_table
+    return [
+        ("next unread log", TLLog.objects.filter(bp_id=0, read=False, pk__gt=0).order_by('pk').values('pk')[:1],
+         log_table, ['bp_id', 'id']),
+        ("logs requiring attention", TLLog.objects.filter(bp_id=0, requires_attention=True, handled=False),
+         log_table, ['bp_id', 'timestamp']),
+        ("latest log of a project", TLLog.objects.filter(group_id=0).order_by('-timestamp').values('timestamp')[:1],
+         log_table, ['group_id', 'timestamp']),
+        ("projects without recent logs", Project.without_recent_logs(Project.objects.filter(bp_id=0)),
+         log_table, ['group_id', 'timestamp']),
+        ("time tracking entry", TimeTrackingEntry.objects.filter(interval_id=0, student_id=0, category_id=0),
+         TimeTrackingEntry._meta.db_table, ['interval_id', 'student_id', 'category_id']),
+        ("past and current intervals", TimeInterval.objects.filter(group_id=0, start__lte=date.today())
+         .order_by('-start'), TimeInterval._meta.db_table, ['group_id', 'start']),
+        ("latest grade of a project", AGGradeBeforeDeadline.objects.filter(project_id=0).order_by('-timestamp')[:1],
+         AGGradeBeforeDeadline._meta.db_table, ['project_id', 'timestamp']),
+        ("latest late grade of a project", AGGradeAfterDeadline.objects.filter(project_id=0)
+         .order_by('-timestamp')[:1], AGGradeAfterDeadline._meta.db_table, ['project_id', 'timestamp']),
+    ]
+
+
+def index_names(table, columns):
+    """
+    :return: names of the indexes of the table on exactly these columns (empty if the migration is missing)
+    :rtype: list of str
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [name for name, constraint in constraints.items()
+            if constraint['index'] and constraint['columns'] == columns]
+
+
+def is_full_scan(plan, table):
+    """
+    :param plan: output of QuerySet.explain()
+    :type plan: str
+    :param table: name of the table
+    :type table: str
+    :return: whether the plan reads the whole table (or a whole index of it)
+    :rtype: bool
+    """
+    if connection.vendor == 'sqlite':
+        return re.search(rf"\bSCAN (TABLE )?{table}\b", plan) is not None
+    return re.search(rf"\bSeq Scan on {table}\b", plan) is not None
+
+
+class Command(BaseCommand):
+    help = "Check (EXPLAIN) that the key queries use their indexes and fail if one of them scans a whole table"
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"Query plans of {connection.vendor} are not supported")
+
+        failures = []
+        for name, queryset, table, columns in key_queries():
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    # Small tables are always scanned sequentially, only check whether an index could be used
+                    with connection.cursor() as cursor:
+                        cursor.execute("SET LOCAL enable_seqscan = off")
+                plan = queryset.explain()
+            indexes = index_names(table, columns)
+            if not indexes:
+                problem = f"no index on {table}({', '.join(columns)}), are all migrations applied?"
+            elif is_full_scan(plan, table):
+                problem = f"full scan of {table}"
+            elif not any(re.search(rf"\b{index}\b", plan) for index in indexes):
+                problem = f"{table}({', '.join(columns)}) not used"
+            else:
+                problem = None
+
+            if problem:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"FAILED {name}: {problem}"))
+            else:
+                self.stdout.write(f"OK     {name}")
+            if options['verbosity'] > 1 or problem:
+                for line in plan.splitlines():
+                    self.stdout.write(f"       {line}")
+
+        if failures:
+            raise CommandError(f"{len(failures)} key query/queries do not use their indexes: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All key queries use their indexes"))
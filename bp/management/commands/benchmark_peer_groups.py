@@ -0,0 +1,103 @@
+import random
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bp.peer_groups import solve_peer_groups, PeerGroupSolution
+
+SyntheticProject = namedtuple('SyntheticProject', ['nr', 'ag_mail', 'tl_id'])
+
+
+def synthetic_cohort(size, rng, projects_per_tl=2.5, repeat_ag_share=0.3):
+    """
+    Cohort of projects similar to a real BP: each TL supervises a few projects,
+    most AGs offer a single project while some offer several ones (with a long tail)
+
+    :param size: number of projects
+    :type size: int
+    :param rng: random number generator
+    :type rng: random.Random
+    :param projects_per_tl: average number of projects per TL
+    :type projects_per_tl: float
+    :param repeat_ag_share: share of projects offered by an AG that offers more than one project
+    :type repeat_ag_share: float
+    :return: projects
+    :rtype: list of SyntheticProject
+    """
+    tl_count = max(1, round(size / projects_per_tl))
+    repeat_ags = max(1, round(size * repeat_ag_share / 3))
+    projects = []
+    for nr in range(1, size + 1):
+        if rng.random() < repeat_ag_share:
+            # Zipf-like distribution: the first AGs offer the most projects
+            ag = f"ag{int(repeat_ags ** rng.random())}@example.org"
+        else:
+            ag = f"single{nr}@example.org"
+        projects.append(SyntheticProject(nr, ag, rng.randrange(tl_count)))
+    return projects
+
+
+def _conflict_keys(project):
+    return [('ag', project.ag_mail), ('tl', project.tl_id)]
+
+
+def random_shuffle_baseline(projects, groups_per_peergroup, max_tries, rng):
+    """
+    Previous approach: shuffle until consecutive slices form valid peer groups
+    """
+    projects = list(projects)
+    for tries in range(1, max_tries + 1):
+        rng.shuffle(projects)
+        peer_groups = [projects[j:j + groups_per_peergroup] for j in range(0, len(projects), groups_per_peergroup)]
+        violations = sum(_pairs(peer_group) for peer_group in peer_groups)
+        if violations == 0 or tries == max_tries:
+            return PeerGroupSolution(peer_groups, violations, tries)
+
+
+def _pairs(peer_group):
+    return sum(1 for i, p in enumerate(peer_group) for q in peer_group[i + 1:]
+               if set(_conflict_keys(p)) & set(_conflict_keys(q)))
+
+
+class Command(BaseCommand):
+    help = "Benchmark the peer group solver against random shuffling on synthetic cohorts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[50, 100, 200, 500],
+                            help="Numbers of projects per cohort (default: 50 100 200 500)")
+        parser.add_argument('--runs', type=int, default=5, help="Cohorts per size (default: 5)")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for cohorts and solvers (default: 0)")
+        parser.add_argument('--limit', type=int, default=settings.PEER_GROUPS_OPTIMISATION_LIMIT,
+                            help="Optimisation steps/shuffles (default: PEER_GROUPS_OPTIMISATION_LIMIT)")
+        parser.add_argument('--projects-per-tl', type=float, default=2.5,
+                            help="Average number of projects per TL (default: 2.5)")
+        parser.add_argument('--repeat-ag-share', type=float, default=0.3,
+                            help="Share of projects offered by AGs with several projects (default: 0.3)")
+        parser.add_argument('--no-baseline', action='store_true', help="Only run the solver")
+
+    def handle(self, *args, **options):
+        groups_per_peergroup = settings.PEER_GROUPS_MEMBER_GROUPS_COUNT
+        methods = [('solver', lambda projects, rng: solve_peer_groups(
+            projects, groups_per_peergroup, options['limit'], conflict_keys=_conflict_keys, seed=rng.random()))]
+        if not options['no_baseline']:
+            methods.append(('shuffle', lambda projects, rng: random_shuffle_baseline(
+                projects, groups_per_peergroup, options['limit'], rng)))
+
+        self.stdout.write(f"{'projects':>8} {'method':>8} {'valid':>7} {'violations':>10} {'avg ms':>9} {'max ms':>9}")
+        for size in options['sizes']:
+            cohorts = [synthetic_cohort(size, random.Random(f"{options['seed']}-{size}-{run}"),
+                                        options['projects_per_tl'], options['repeat_ag_share'])
+                       for run in range(options['runs'])]
+            for name, method in methods:
+                rng = random.Random(options['seed'])
+                durations, violations, valid = [], 0, 0
+                for projects in cohorts:
+                    start = time.perf_counter()
+                    solution = method(projects, rng)
+                    durations.append((time.perf_counter() - start) * 1000)
+                    violations += solution.violations
+                    valid += solution.is_valid
+                self.stdout.write(f"{size:>8} {name:>8} {valid:>3}/{len(cohorts):<3} {violations / len(cohorts):>10.1f} "
+                                  f"{sum(durations) / len(durations):>9.1f} {max(durations):>9.1f}")
@@ -0,0 +1,63 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test.utils import setup_test_environment, teardown_test_environment, override_settings
+
+import bp.urls  # noqa: F401 (registers the columns of all sub-apps)
+from bp.benchmark import seed_cohort
+from bp.models import Project
+from bp.templatetags import tags_bp
+from bp.templatetags.tags_project_overview_list import ProjectOverviewList
+
+
+def render_overview(projects):
+    return render_to_string('bp/project/project_overview_list/table.html',
+                            {'projects': projects, 'columns': ProjectOverviewList.get_ordered_columns()})
+
+
+class Command(BaseCommand):
+    help = "Benchmark rendering the project overview table ({% render %} tags) with the compiled render plan " \
+           "against parsing every tag again (on a synthetic cohort in a throwaway test database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[50, 100, 200],
+                            help="Numbers of projects (default: 50 100 200)")
+        parser.add_argument('--runs', type=int, default=5, help="Renderings per size (default: 5)")
+        parser.add_argument('--no-baseline', action='store_true', help="Only render with the compiled render plan")
+
+    def handle(self, *args, **options):
+        methods = [('compiled', mock.patch.object(tags_bp, 'compile_render_tag', tags_bp.compile_render_tag))]
+        if not options['no_baseline']:
+            # previous approach: a new template for every rendered tag
+            methods.append(('parsed', mock.patch.object(tags_bp, 'compile_render_tag',
+                                                        tags_bp.compile_render_tag.__wrapped__)))
+
+        with override_settings(CACHES=settings.TEST_CACHES):
+            setup_test_environment(debug=False)
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                seed_cohort(projects=max(options['sizes']), students_per_project=4, intervals=1, logs_per_project=1)
+                # as loaded by ProjectListView, the queries are not part of the benchmark
+                projects = list(Project.get_active().select_related('tl', 'peer_group').prefetch_related('student_set')
+                                .with_grades().with_log_statistics())
+                columns = len(ProjectOverviewList.get_ordered_columns())
+                self.stdout.write(f"{'projects':>8} {'method':>8} {'avg ms':>9} {'min ms':>9} {'µs/cell':>8}")
+                for size in options['sizes']:
+                    for name, patch in methods:
+                        with patch:
+                            render_overview(projects[:size])
+                            durations = []
+                            for _ in range(options['runs']):
+                                start = time.perf_counter()
+                                render_overview(projects[:size])
+                                durations.append((time.perf_counter() - start) * 1000)
+                        self.stdout.write(f"{size:>8} {name:>8} {sum(durations) / len(durations):>9.1f} "
+                                          f"{min(durations):>9.1f} {min(durations) * 1000 / (size * columns):>8.1f}")
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
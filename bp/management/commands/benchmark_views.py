@@ -0,0 +1,83 @@
+from inspect import signature
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment, override_settings
+
+from bp.benchmark import seed_cohort, measure_views, load_baseline, save_baseline, compare_to_baseline, ROLES, \
+    BASELINE_FILE
+
+COHORT_PARAMETERS = ['bps', 'projects', 'students_per_project', 'intervals', 'categories', 'entries_per_interval',
+                     'logs_per_project']
+
+
+class Command(BaseCommand):
+    help = "Request every view as the roles using it (orga, TL, student, AG) on a synthetic cohort (in a throwaway test database) " \
+           "and compare query counts, wall times and response sizes to the checked-in baseline"
+
+    def add_arguments(self, parser):
+        defaults = {parameter: signature(seed_cohort).parameters[parameter].default
+                    for parameter in COHORT_PARAMETERS}
+        if BASELINE_FILE.exists():
+            defaults.update(load_baseline()['cohort'])
+        for parameter in COHORT_PARAMETERS:
+            parser.add_argument(f"--{parameter.replace('_', '-')}", type=int, default=defaults[parameter],
+                                help=f"Cohort size (default of the baseline: {defaults[parameter]})")
+        parser.add_argument('--roles', nargs='+', choices=ROLES, default=ROLES, help="Roles to request the views as")
+        parser.add_argument('--views', nargs='+', help="Names of the URLs to request (default: all)")
+        parser.add_argument('--no-time', action='store_true', help="Do not compare the wall times")
+        parser.add_argument('--runs', type=int, default=5,
+                            help="Requests per view and role, the wall time is their median (default: 5)")
+        parser.add_argument('--update-baseline', action='store_true',
+                            help=f"Store the status, query counts and sizes as new baseline in {BASELINE_FILE.name} "
+                                 f"(keeps the wall times of the baseline)")
+        parser.add_argument('--update-times', action='store_true',
+                            help="With --update-baseline: also store the measured wall times")
+
+    def handle(self, *args, **options):
+        parameters = {parameter: options[parameter] for parameter in COHORT_PARAMETERS}
+        baseline = load_baseline() if BASELINE_FILE.exists() else None
+        if options['update_times'] and not options['update_baseline']:
+            raise CommandError("--update-times requires --update-baseline")
+        if options['update_baseline'] and (options['views'] or options['roles'] != ROLES):
+            raise CommandError("The baseline can only be updated for all views and roles")
+        if baseline is not None and not options['update_baseline'] and parameters != baseline['cohort']:
+            self.stdout.write(self.style.WARNING("The cohort differs from the one of the baseline, "
+                                                 "expect deviations of the query counts and sizes"))
+
+        # like the test runner: without DEBUG (and thus without the debug toolbar)
+        with override_settings(CACHES=settings.TEST_CACHES):
+            setup_test_environment(debug=False)
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                cohort = seed_cohort(**parameters)
+                measurements = measure_views(cohort, options['roles'], options['views'], options['runs'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        if options['update_baseline']:
+            wrong_status = [f"{m.key} ({m.status})" for m in measurements if m.status != m.expected_status]
+            if wrong_status:
+                raise CommandError(f"Not the actual pages, the baseline is not updated: {', '.join(wrong_status)}")
+            save_baseline(parameters, measurements, options['update_times'])
+            self.stdout.write(self.style.SUCCESS(f"Stored {len(measurements)} measurements in {BASELINE_FILE}"))
+            return
+
+        failures = []
+        self.stdout.write(f"{'view':<48} {'status':>6} {'queries':>7} {'ms':>8} {'bytes':>8}")
+        for measurement in measurements:
+            problems = compare_to_baseline(measurement, baseline, not options['no_time']) if baseline else []
+            line = f"{measurement.key:<48} {measurement.status:>6} {measurement.queries:>7} " \
+                   f"{measurement.ms:>8.1f} {measurement.bytes:>8}"
+            if problems:
+                failures.append(measurement.key)
+                self.stdout.write(self.style.ERROR(f"{line}  {'; '.join(problems)}"))
+            else:
+                self.stdout.write(line)
+
+        if failures:
+            raise CommandError(f"{len(failures)} view(s) exceed the baseline: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All views are within the baseline"))
@@ -0,0 +1,70 @@
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bp.performance import read_performance_log, percentile
+
+METRICS = ['total_ms', 'db_ms', 'template_ms', 'queries', 'peak_kb', 'lock_wait_ms', 'lock_retries']
+
+
+class Command(BaseCommand):
+    help = "Aggregate the performance log (see PerformanceMiddleware) into percentiles per view"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help="Performance log to read (default: PERFORMANCE_LOG_FILE)")
+        parser.add_argument('--since', type=date.fromisoformat, help="Only requests since this day (YYYY-MM-DD)")
+        parser.add_argument('--view', help="Only views whose name contains this text, e.g. timetracking")
+        parser.add_argument('--metric', choices=METRICS, default='total_ms',
+                            help="Metric to compute the percentiles of (default: total_ms)")
+        parser.add_argument('--by-week', action='store_true',
+                            help="Aggregate per view and calendar week to see how the views degrade over time")
+        parser.add_argument('--sort', choices=['view', 'count', 'p50', 'p95', 'p99'], default='p95',
+                            help="Order of the rows (default: p95, descending)")
+
+    def handle(self, *args, **options):
+        if not (options['file'] or settings.PERFORMANCE_LOG_FILE):
+            raise CommandError("No performance log configured (PERFORMANCE_LOG_FILE), use --file")
+        metric = options['metric']
+
+        values = defaultdict(list)
+        queries = defaultdict(list)
+        for record in read_performance_log(options['file']):
+            timestamp = datetime.fromisoformat(record['time'])
+            if options['since'] and timestamp.date() < options['since']:
+                continue
+            view = record['view'] or "(not resolved)"
+            if options['view'] and options['view'] not in view:
+                continue
+            if record.get(metric) is None:
+                continue
+            key = (view, timestamp.strftime("%G-W%V") if options['by_week'] else "")
+            values[key].append(record[metric])
+            queries[key].append(record['queries'])
+        if not values:
+            raise CommandError("No matching requests in the performance log")
+
+        rows = []
+        for key, measurements in values.items():
+            measurements.sort()
+            rows.append((key, len(measurements), percentile(measurements, 50), percentile(measurements, 95),
+                         percentile(measurements, 99), measurements[-1], sum(queries[key]) / len(queries[key])))
+        if options['sort'] == 'view':
+            rows.sort(key=lambda row: row[0])
+        else:
+            column = ['count', 'p50', 'p95', 'p99'].index(options['sort']) + 1
+            rows.sort(key=lambda row: row[column], reverse=True)
+        if options['by_week']:
+            # keep the weeks of a view together and in chronological order
+            order = {}
+            for (view, week), *_ in rows:
+                order.setdefault(view, len(order))
+            rows.sort(key=lambda row: (order[row[0][0]], row[0][1]))
+
+        self.stdout.write(f"{'view':<44} {'week':>8} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} "
+                          f"{'queries':>7}")
+        for (view, week), count, p50, p95, p99, maximum, average_queries in rows:
+            self.stdout.write(f"{view:<44} {week:>8} {count:>6} {p50:>9} {p95:>9} {p99:>9} {maximum:>9} "
+                              f"{average_queries:>7.1f}")
+        self.stdout.write(f"Percentiles of {metric}")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bp.timetracking.models import TimeTrackingRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the time tracking totals (TimeTrackingRollup) from the raw entries or verify them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help="Only compare the stored totals with the raw entries, do not change anything")
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+        else:
+            count = TimeTrackingRollup.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} time tracking totals"))
+
+    def verify(self):
+        expected = {key: hours for key, hours in TimeTrackingRollup.totals_from_entries().items() if hours}
+        stored = {}
+        for r in TimeTrackingRollup.objects.values('project', 'student', 'interval', 'category', 'hours'):
+            key = (r['project'], r['student'], r['interval'], r['category'])
+            stored[key] = stored.get(key, 0) + r['hours']
+        stored = {key: hours for key, hours in stored.items() if hours}
+
+        mismatches = [(key, expected.get(key, 0), stored.get(key, 0))
+                      for key in expected.keys() | stored.keys() if expected.get(key, 0) != stored.get(key, 0)]
+        for (project, student, interval, category), entries_hours, rollup_hours in sorted(mismatches, key=str):
+            self.stdout.write(f"Project {project}, student {student}, interval {interval}, category {category}: "
+                              f"entries {entries_hours}h, rollup {rollup_hours}h")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} time tracking total(s) out of sync, "
+                               f"run rebuild_timetracking_rollup to fix them")
+        self.stdout.write(self.style.SUCCESS(f"All {len(stored)} time tracking totals are in sync"))
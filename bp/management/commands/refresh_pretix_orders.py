@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bp.models import BP
+from bp.pretix import refresh_orders, PretixError
+
+
+class Command(BaseCommand):
+    help = "Load all orders of the pretix AG event of the active BP (or the given events) into the local cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('events', nargs='*', help="Pretix event slugs (default: AG event of the active BP)")
+
+    def handle(self, *args, **options):
+        events = options['events'] or [BP.get_active().pretix_event_ag]
+        for event in events:
+            if not event:
+                raise CommandError("No pretix event configured for the active BP")
+            try:
+                count = refresh_orders(event)
+            except PretixError as e:
+                raise CommandError(f"Could not refresh the orders of event {event}: {e}")
+            self.stdout.write(self.style.SUCCESS(f"Refreshed {count} order(s) of event {event}"))
@@ -0,0 +1,77 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bp.models import ReminderRun
+from bp.tllogs.reminders import reminders_due, send_reminders, describe_reminders
+
+
+class Command(BaseCommand):
+    help = "Remind the TLs of missing logs (once every LOG_REMINDER_INTERVAL_DAYS days during LOG_REMINDER_HOURS, " \
+           "so it can be run e.g. hourly by cron), the runs are listed in the admin interface"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', type=int, default=settings.LOG_REMIND_PERIOD_DAYS,
+                            help="Days without log or reminder (default: LOG_REMIND_PERIOD_DAYS)")
+        parser.add_argument('--chunk-size', type=int, default=settings.LOG_REMINDER_CHUNK_SIZE,
+                            help="TLs reminded at a time (default: LOG_REMINDER_CHUNK_SIZE)")
+        parser.add_argument('--pause', type=float, default=0,
+                            help="Seconds to wait between two chunks to spread the load (default: 0)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only list the TLs that would be reminded (ignores the schedule)")
+        parser.add_argument('--force', action='store_true', help="Run regardless of the schedule")
+
+    def handle(self, *args, **options):
+        if not (options['force'] or options['dry_run']):
+            reason = self.not_due_reason()
+            if reason:
+                self.stdout.write(f"No reminders sent: {reason}")
+                return
+
+        run = ReminderRun.start(options['period'], options['dry_run'])
+        if run is None:
+            self.stdout.write(self.style.WARNING("No reminders sent: another run is in progress"))
+            return
+
+        try:
+            reminders = reminders_due(options['period'])
+            chunk_size = max(1, options['chunk_size'])
+            for start in range(0, len(reminders), chunk_size):
+                if start and options['pause']:
+                    time.sleep(options['pause'])
+                sent, unreachable = send_reminders(reminders[start:start + chunk_size], options['dry_run'])
+                run.tls_reminded += len(sent)
+                run.projects_reminded += sum(len(reminder.projects) for reminder in sent)
+                run.save(update_fields=['tls_reminded', 'projects_reminded'])
+                if sent and (options['dry_run'] or options['verbosity'] > 1):
+                    self.stdout.write(f"{'Would remind' if options['dry_run'] else 'Reminded'}: "
+                                      f"{describe_reminders(sent)}")
+                if unreachable:
+                    self.stderr.write(f"No e-mail address: {describe_reminders(unreachable)}")
+        except Exception as e:
+            run.finish(e)
+            raise
+        run.finish()
+        self.stdout.write(f"{run.tls_reminded} TL(s) {'would be ' if options['dry_run'] else ''}reminded of "
+                          f"{run.projects_reminded} project(s) in {run.duration.total_seconds():.1f} s")
+
+    @staticmethod
+    def not_due_reason():
+        """
+        :return: why no reminders are sent now (None if they are due)
+        :rtype: str
+        """
+        now = timezone.localtime()
+        first_hour, end_hour = settings.LOG_REMINDER_HOURS
+        if not first_hour <= now.hour < end_hour:
+            return f"reminders are only sent between {first_hour}:00 and {end_hour}:00"
+        # compared to the start of the time window instead of the time of the last run, which would move the runs
+        # to later hours (and eventually out of the window) whenever a run starts a little earlier than the last one
+        window_start = now.replace(hour=first_hour, minute=0, second=0, microsecond=0)
+        last_run = ReminderRun.get_last_successful()
+        if last_run and last_run.started >= window_start - timedelta(days=settings.LOG_REMINDER_INTERVAL_DAYS - 1):
+            return f"last run at {timezone.localtime(last_run.started):%d.%m.%y %H:%M}"
+        return None
@@ -0,0 +1,53 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from bp.outbox.models import QueuedMail
+
+
+class Command(BaseCommand):
+    help = "Send the queued e-mails (QueuedMail) that are due, reusing a single connection to the mail server"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep running and check for new e-mails periodically")
+        parser.add_argument('--interval', type=int, default=10,
+                            help="Seconds to wait between two checks in loop mode (default: 10)")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Maximum number of e-mails sent per connection (default: 100)")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = self.send_due_mails(options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(f"{sent} e-mail(s) sent, {failed} failed")
+            if not options['loop']:
+                break
+            if sent + failed < options['batch_size']:
+                time.sleep(options['interval'])
+
+    def send_due_mails(self, batch_size):
+        mails = QueuedMail.claim_due(batch_size)
+        if not mails:
+            return 0, 0
+        sent = failed = 0
+        connection = get_connection(fail_silently=False)
+        try:
+            for mail in mails:
+                try:
+                    # no-op while the connection is open, reconnects after an error
+                    connection.open()
+                    if not connection.send_messages([mail.as_email_message(connection)]):
+                        raise ValueError("Keine gültigen Empfänger")
+                except Exception as e:
+                    self.stderr.write(f"Sending '{mail}' failed: {e}")
+                    mail.mark_failed(e)
+                    failed += 1
+                    connection.close()
+                else:
+                    mail.mark_sent()
+                    sent += 1
+        finally:
+            connection.close()
+        return sent, failed
@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment, override_settings
+
+from bp.benchmark import seed_cohort
+from bp.database import retry_on_lock, is_lock_error, lock_statistics, LockStatistics
+from bp.models import Project, TLLog, TimeSpentCategory, TimeTrackingEntry
+from bp.performance import percentile
+
+
+@retry_on_lock
+@transaction.atomic
+def write_log(project):
+    # like LogTLCreateView: the log and its problems in one transaction
+    log = TLLog.objects.create(bp_id=project.bp_id, tl_id=project.tl_id, group=project, status=0, text="Stresstest")
+    log.current_problems.set([])
+
+
+def run_writer(project, operations, seed):
+    """
+    Alternately enter hours of a student of the project and write a log
+
+    :return: durations of the successful operations (seconds) and number of failed operations
+    :rtype: (list of float, int)
+    """
+    rng = random.Random(seed)
+    student = project.student_set.first()
+    intervals = list(project.timeinterval_set.all())
+    categories = TimeSpentCategory.get_all()
+    durations, failed = [], 0
+    try:
+        for nr in range(operations):
+            start = time.perf_counter()
+            try:
+                if nr % 2:
+                    write_log(project)
+                else:
+                    TimeTrackingEntry.set_hours(student, rng.choice(intervals), rng.choice(categories),
+                                                Decimal(rng.randint(0, 40)) / 4)
+            except Exception as e:
+                if not is_lock_error(e):
+                    raise
+                failed += 1
+                continue
+            durations.append(time.perf_counter() - start)
+    finally:
+        connection.close()
+    return durations, failed
+
+
+def run_process(project_pks, threads, operations):
+    """
+    Run one writer per thread (in a process of its own)
+
+    :return: durations of the successful operations, number of failed operations and lock statistics per write path
+    :rtype: (list of float, int, dict)
+    """
+    lock_statistics.reset()
+    projects = list(Project.objects.filter(pk__in=project_pks).select_related('bp'))
+    connection.close()
+    results = [None] * threads
+
+    def writer(nr):
+        results[nr] = run_writer(projects[nr], operations, seed=projects[nr].pk)
+
+    workers = [threading.Thread(target=writer, args=(nr,)) for nr in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [d for durations, _ in results for d in durations], sum(failed for _, failed in results), \
+        lock_statistics.snapshot()
+
+
+class Command(BaseCommand):
+    help = "Stress test concurrent writes (hour entries and logs) with several processes and threads, " \
+           "like uwsgi, on a temporary copy of the database schema and report throughput and lock waits"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help="Writing processes (default: 4)")
+        parser.add_argument('--threads', type=int, default=2, help="Writing threads per process (default: 2)")
+        parser.add_argument('--operations', type=int, default=100,
+                            help="Writes per thread, alternately hours and logs (default: 100)")
+        parser.add_argument('--no-tuning', action='store_true',
+                            help="Without SQLITE_PRAGMAS and retries, for comparison")
+
+    def handle(self, *args, **options):
+        processes, threads = max(1, options['processes']), max(1, options['threads'])
+        tuning = {} if not options['no_tuning'] else {'SQLITE_PRAGMAS': {}, 'DATABASE_LOCK_RETRIES': 0}
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(SEND_MAILS=False, CACHES=settings.TEST_CACHES, **tuning):
+            setup_test_environment(debug=False)
+            old_name = connection.settings_dict['NAME']
+            old_test_settings = connection.settings_dict['TEST']
+            # a file, so that all processes use the same SQLite database
+            connection.settings_dict['TEST'] = {**old_test_settings, 'NAME': os.path.join(directory, "stress.sqlite3")}
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                seed_cohort(projects=processes * threads, students_per_project=1, intervals=4, entries_per_interval=0,
+                            logs_per_project=0)
+                project_pks = list(Project.get_active().order_by('pk').values_list('pk', flat=True))
+                # connections must not be shared with the forked processes
+                connections.close_all()
+                start = time.perf_counter()
+                with multiprocessing.get_context('fork').Pool(processes) as pool:
+                    results = pool.starmap(run_process, [(project_pks[nr * threads:(nr + 1) * threads], threads,
+                                                          options['operations']) for nr in range(processes)])
+                seconds = time.perf_counter() - start
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                connection.settings_dict['TEST'] = old_test_settings
+                teardown_test_environment()
+
+        durations = sorted(d * 1000 for process_durations, _, _ in results for d in process_durations)
+        failed = sum(process_failed for _, process_failed, _ in results)
+        paths = {}
+        for _, _, statistics in results:
+            for path, counts in statistics.items():
+                paths.setdefault(path, []).append(counts)
+        locks = LockStatistics.total(counts for path_counts in paths.values() for counts in path_counts)
+        self.stdout.write(f"{processes} process(es) x {threads} thread(s), {len(durations)} writes in {seconds:.1f} s: "
+                          f"{len(durations) / seconds:.0f} writes/s, {failed} failed (database locked)")
+        if durations:
+            self.stdout.write(f"Latency: p50 {percentile(durations, 50):.1f} ms, p95 {percentile(durations, 95):.1f} ms, "
+                              f"p99 {percentile(durations, 99):.1f} ms, max {durations[-1]:.1f} ms")
+        self.stdout.write(f"Lock contention: {locks['locked']} of {locks['calls']} writes found the database locked, "
+                          f"{locks['retries']} retries, {locks['failures']} failed after all retries, "
+                          f"{locks['wait_seconds']:.1f} s waited")
+        for path, path_counts in sorted(paths.items()):
+            counts = LockStatistics.total(path_counts)
+            self.stdout.write(f"  {path}: {counts['locked']} of {counts['calls']} locked, {counts['retries']} retries, "
+                              f"{counts['failures']} failed, {counts['wait_seconds']:.1f} s waited")
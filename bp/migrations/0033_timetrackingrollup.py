@@ -0,0 +1,43 @@
+# Generated by Django 3.2.20 on 2026-10-18 01:14
+
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def populate_rollup(apps, schema_editor):
+    TimeTrackingEntry = apps.get_model('bp', 'TimeTrackingEntry')
+    TimeTrackingRollup = apps.get_model('bp', 'TimeTrackingRollup')
+    totals = TimeTrackingEntry.objects.filter(interval__group__isnull=False, student__isnull=False) \
+        .values('interval__group', 'student', 'interval', 'category').annotate(total=Sum('hours')).order_by()
+    TimeTrackingRollup.objects.bulk_create(
+        [TimeTrackingRollup(project_id=t['interval__group'], student_id=t['student'], interval_id=t['interval'],
+                            category_id=t['category'], hours=t['total']) for t in totals],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bp', '0032_delete_tllogreminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeTrackingRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hours', models.DecimalField(decimal_places=2, default=0, max_digits=7, verbose_name='Stunden (h)')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='bp.timespentcategory', verbose_name='Kategorie')),
+                ('interval', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bp.timeinterval', verbose_name='Zeitintervall')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bp.project', verbose_name='Projekt')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bp.student', verbose_name='Teammitglied')),
+            ],
+            options={
+                'verbose_name': 'Summe für Zeiterfassung',
+                'verbose_name_plural': 'Summen für Zeiterfassung',
+                'unique_together': {('project', 'student', 'interval', 'category')},
+            },
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
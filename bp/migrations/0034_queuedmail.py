@@ -0,0 +1,37 @@
+# Generated by Django 3.2.20 on 2026-10-18 01:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bp', '0033_timetrackingrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedMail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.TextField(verbose_name='Betreff')),
+                ('body', models.TextField(verbose_name='Inhalt')),
+                ('from_email', models.CharField(max_length=255, verbose_name='Absender')),
+                ('to', models.JSONField(verbose_name='Empfänger')),
+                ('reply_to', models.JSONField(blank=True, default=list, verbose_name='Antwort an')),
+                ('status', models.SmallIntegerField(choices=[(0, 'Wartend'), (3, 'Wird verschickt'), (1, 'Verschickt'), (2, 'Fehlgeschlagen')], default=0, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Anzahl Versuche')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Erstellt')),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Nächster Versuch')),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='Verschickt')),
+                ('last_error', models.TextField(blank=True, verbose_name='Letzter Fehler')),
+                ('claim', models.UUIDField(blank=True, editable=False, null=True, verbose_name='Reservierung')),
+            ],
+            options={
+                'verbose_name': 'Ausgehende E-Mail',
+                'verbose_name_plural': 'Ausgehende E-Mails',
+                'ordering': ['created'],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.20 on 2026-10-18 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bp', '0034_queuedmail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PretixOrder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(max_length=50, verbose_name='Pretix Event Slug')),
+                ('code', models.CharField(max_length=16, verbose_name='Pretix Order ID')),
+                ('secret', models.CharField(max_length=255, verbose_name='Secret')),
+                ('title', models.CharField(blank=True, max_length=255, verbose_name='Titel')),
+                ('name', models.CharField(blank=True, max_length=255, verbose_name='Name')),
+                ('email', models.EmailField(blank=True, max_length=254, verbose_name='E-Mail')),
+                ('fetched', models.DateTimeField(verbose_name='Abgerufen')),
+            ],
+            options={
+                'verbose_name': 'Pretix-Bestellung',
+                'verbose_name_plural': 'Pretix-Bestellungen',
+                'ordering': ['event', 'code'],
+                'unique_together': {('event', 'code')},
+            },
+        ),
+    ]
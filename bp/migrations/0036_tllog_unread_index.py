@@ -0,0 +1,17 @@
+# Generated by Django 3.2.20 on 2026-10-18 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bp', '0035_pretixorder'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tllog',
+            index=models.Index(condition=models.Q(('read', False)), fields=['bp', 'id'], name='bp_tllog_unread_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.20 on 2026-10-18 01:34
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_entries(apps, schema_editor):
+    # Concurrent requests may have created several entries for the same student, interval and category.
+    # Merge them into the oldest one (the sum of the hours is what the time tables and rollups show)
+    TimeTrackingEntry = apps.get_model('bp', 'TimeTrackingEntry')
+    duplicates = TimeTrackingEntry.objects \
+        .filter(interval__isnull=False, student__isnull=False, category__isnull=False) \
+        .values('interval', 'student', 'category') \
+        .annotate(count=Count('pk'), first=Min('pk'), total=Sum('hours')).filter(count__gt=1).order_by()
+    for duplicate in duplicates:
+        TimeTrackingEntry.objects.filter(pk=duplicate['first']).update(hours=duplicate['total'])
+        TimeTrackingEntry.objects.filter(interval=duplicate['interval'], student=duplicate['student'],
+                                         category=duplicate['category']).exclude(pk=duplicate['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bp', '0036_tllog_unread_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_entries, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='timetrackingentry',
+            unique_together={('interval', 'student', 'category')},
+        ),
+        migrations.AddIndex(
+            model_name='aggradeafterdeadline',
+            index=models.Index(fields=['project', 'timestamp'], name='bp_aggrade_late_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aggradebeforedeadline',
+            index=models.Index(fields=['project', 'timestamp'], name='bp_aggrade_project_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeinterval',
+            index=models.Index(fields=['group', 'start'], name='bp_interval_group_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tllog',
+            index=models.Index(condition=models.Q(('requires_attention', True)), fields=['bp', 'timestamp'], name='bp_tllog_attention_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tllog',
+            index=models.Index(fields=['group', 'timestamp'], name='bp_tllog_group_time_idx'),
+        ),
+    ]
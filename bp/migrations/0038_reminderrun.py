@@ -0,0 +1,37 @@
+# Generated by Django 3.2.20 on 2026-10-18 01:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bp', '0037_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Gestartet')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Beendet')),
+                ('status', models.SmallIntegerField(choices=[(0, 'Läuft'), (1, 'Erfolgreich'), (2, 'Fehlgeschlagen')], default=0, verbose_name='Status')),
+                ('dry_run', models.BooleanField(default=False, verbose_name='Probelauf')),
+                ('period', models.PositiveSmallIntegerField(verbose_name='Zeitraum ohne Log (Tage)')),
+                ('tls_reminded', models.PositiveIntegerField(default=0, verbose_name='Erinnerte TLs')),
+                ('projects_reminded', models.PositiveIntegerField(default=0, verbose_name='Projekte')),
+                ('error', models.TextField(blank=True, verbose_name='Fehler')),
+            ],
+            options={
+                'verbose_name': 'Erinnerungslauf',
+                'verbose_name_plural': 'Erinnerungsläufe',
+                'ordering': ['-started'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reminderrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('dry_run', False), ('status', 0)), fields=('status',), name='bp_reminderrun_lock'),
+        ),
+    ]
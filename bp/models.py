@@ -6,20 +6,28 @@ from decimal import Decimal
 from django.contrib.auth.models import User
 from django.core.mail import EmailMessage
 from django.db import models
-from django.db.models import Sum, Max, Q
-from django.db.models.functions import Coalesce
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db.models import Sum, Max, Q, F, Case, When, Value, Func, OuterRef, Subquery, Count, Avg
+from django.db.models.functions import Coalesce, Mod
+from django.db.models.query import ModelIterable
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
 from django.urls import reverse_lazy
 from django.utils import timezone, formats
+from django.utils.functional import cached_property
 
 # necessary to register models in database
 from bp.grading.models import *
 from bp.orgalogs.models import *
+from bp.outbox.models import *
 from bp.timetracking.models import *
 from bp.tllogs.models import *
 
+from bp.cache import cache_key, get_cached, invalidate_cached_data, DASHBOARD, REFERENCE_DATA
+from bp.database import configure_sqlite_connection
+from bp.timetracking.aggregation import HoursSummary
+
 
 class BP(models.Model):
     class Meta:
@@ -40,7 +48,8 @@ class BP(models.Model):
 
     @staticmethod
     def get_active():
-        return BP.objects.get(active=True)
+        # Needed by almost every request, hence cached (invalidated by changes of any BP, see bottom of this file)
+        return get_cached(cache_key(REFERENCE_DATA, "active_bp"), lambda: BP.objects.get(active=True))
 
     def __str__(self):
         if self.active:
@@ -48,6 +57,143 @@ class BP(models.Model):
         return self.name
 
 
+class PretixOrder(models.Model):
+    """
+        Local copy of the relevant data of a pretix order (see bp.pretix.get_order),
+        so that e.g. AG secrets can be checked without waiting for the pretix API
+    """
+
+    class Meta:
+        verbose_name = "Pretix-Bestellung"
+        verbose_name_plural = "Pretix-Bestellungen"
+        ordering = ['event', 'code']
+        unique_together = [('event', 'code')]
+
+    event = models.CharField(max_length=50, verbose_name="Pretix Event Slug")
+    code = models.CharField(max_length=16, verbose_name="Pretix Order ID")
+    secret = models.CharField(max_length=255, verbose_name="Secret")
+    title = models.CharField(max_length=255, verbose_name="Titel", blank=True)
+    name = models.CharField(max_length=255, verbose_name="Name", blank=True)
+    email = models.EmailField(verbose_name="E-Mail", blank=True)
+    fetched = models.DateTimeField(verbose_name="Abgerufen")
+
+    @property
+    def is_fresh(self):
+        return self.fetched >= timezone.now() - timedelta(seconds=settings.PRETIX_CACHE_TTL_SECONDS)
+
+    @property
+    def is_usable_while_unavailable(self):
+        return self.fetched >= timezone.now() - timedelta(seconds=settings.PRETIX_CACHE_MAX_STALE_SECONDS)
+
+    def __str__(self):
+        return f"{self.code} ({self.event})"
+
+
+def _latest_ag_grade(grade_model, field):
+    return Subquery(grade_model.objects.filter(project=OuterRef('pk')).order_by('-timestamp').values(field)[:1])
+
+
+def _log_aggregate(field, aggregate):
+    # Subquery instead of a join, so that it can be combined with other annotations without multiplying rows
+    return Subquery(TLLog.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+                    .annotate(value=aggregate).values('value'))
+
+
+def _log_statistic(obj, annotation, compute):
+    if hasattr(obj, annotation):
+        # Already set for objects fetched via with_log_statistics()
+        return getattr(obj, annotation)
+    return compute()
+
+
+# Set by ProjectQuerySet.with_grades(), forgotten by Project.invalidate_computed_values()
+_GRADE_ANNOTATIONS = [f"{field}_{deadline}_deadline" for field in ['ag_points', 'ag_points_justification']
+                      for deadline in ['before', 'after']] \
+                     + ['current_ag_points', 'current_ag_points_justification', 'points_total', 'points_bucket']
+
+
+class ProjectQuerySet(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._with_hours = False
+
+    def with_hours(self):
+        """
+        Attach the tracked hours to all fetched projects (see HoursSummary)
+        using one grouped query for the whole queryset instead of one query per student and category
+        """
+        clone = self._chain()
+        clone._with_hours = True
+        return clone
+
+    def with_grades(self):
+        """
+        Resolve the grade components of all fetched projects in the same query instead of one query per property.
+
+        Annotates the latest AG points and justifications given before and after the deadline
+        (e.g. ag_points_before_deadline, ag_points_justification_after_deadline), the currently valid AG points
+        and justification (current_ag_points, -1 if there are none, and current_ag_points_justification), the sum of all points (points_total) and the
+        total rounded down to the next multiple of 10 (points_bucket), which determines the grade.
+        Pitch and documentation grades are fetched with select_related.
+        """
+        latest_grades = {}
+        for field in ['ag_points', 'ag_points_justification']:
+            latest_grades[f"{field}_before_deadline"] = _latest_ag_grade(AGGradeBeforeDeadline, field)
+            latest_grades[f"{field}_after_deadline"] = _latest_ag_grade(AGGradeAfterDeadline, field)
+
+        decimal_points = models.DecimalField(max_digits=5, decimal_places=2)
+        ag_points_value = Case(When(current_ag_points__gte=0, then=F('current_ag_points')),
+                               default=Value(0), output_field=models.IntegerField())
+        points_total = Func(ag_points_value
+                            + Coalesce(F('pitchgrade__grade_points'), Value(Decimal(0)))
+                            + Coalesce(F('docsgrade__grade_points'), Value(Decimal(0))),
+                            Value(2), function='ROUND', output_field=decimal_points)
+        rounded_points_total = Func(F('points_total'), function='ROUND', output_field=decimal_points)
+
+        return self.select_related('ag_grade', 'pitchgrade', 'docsgrade') \
+            .annotate(**latest_grades) \
+            .annotate(current_ag_points=Case(
+                When(ag_grade__isnull=False, then=F('ag_grade__ag_points')),
+                When(ag_points_before_deadline__gt=0, then=F('ag_points_before_deadline')),
+                default=Value(-1), output_field=models.IntegerField()),
+                current_ag_points_justification=Case(
+                When(ag_grade__isnull=False, then=F('ag_grade__ag_points_justification')),
+                default=F('ag_points_justification_before_deadline'), output_field=models.TextField())) \
+            .annotate(points_total=points_total) \
+            .annotate(points_bucket=rounded_points_total - Mod(rounded_points_total, Value(10)))
+
+    def with_log_statistics(self):
+        """
+        Annotate the number of logs (tllog_count) as well as time and status of the latest log
+        (latest_log_timestamp, latest_log_status) without loading the logs
+        """
+        latest_logs = TLLog.objects.filter(group=OuterRef('pk')).order_by('-timestamp')
+        return self.annotate(tllog_count=Coalesce(_log_aggregate('group', Count('pk')), Value(0)),
+                             latest_log_timestamp=Subquery(latest_logs.values('timestamp')[:1]),
+                             latest_log_status=Subquery(latest_logs.values('status')[:1]))
+
+    def close_to_higher_grade(self):
+        """
+        Filter for completely graded projects that miss the next better grade by less than 2 points
+        (database version of Project.grade_close_to_higher_grade)
+        """
+        queryset = self if 'points_bucket' in self.query.annotations else self.with_grades()
+        return queryset.annotate(points_to_bucket=Mod(F('points_total'), Value(10))) \
+            .filter(current_ag_points__gte=0, pitchgrade__isnull=False, docsgrade__isnull=False,
+                    points_total__gt=100, points_to_bucket__gt=10 - 2, points_bucket__lt=190)
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._with_hours = self._with_hours
+        return clone
+
+    def _fetch_all(self):
+        attach_hours = self._with_hours and self._result_cache is None
+        super()._fetch_all()
+        if attach_hours and issubclass(self._iterable_class, ModelIterable):
+            HoursSummary.attach(self._result_cache)
+
+
 class Project(models.Model):
     class Meta:
         verbose_name = "Projekt"
@@ -76,10 +222,32 @@ class Project(models.Model):
     last_reminded = models.DateField(blank=True, null=True,
                                      verbose_name="Datum der letzten Erinnerung, einen Log zu senden")
 
+    objects = ProjectQuerySet.as_manager()
+
     @staticmethod
     def get_active():
         return Project.objects.filter(bp__active=True)
 
+    def invalidate_computed_values(self):
+        """
+        Forget the values computed for this instance, i.e. the memoized points, grade and hours (cached properties),
+        the annotations of with_grades() and the cached grades, so that they are read from the database again
+        (called when a grade of the project or the project itself is saved)
+        """
+        for name, attribute in vars(Project).items():
+            if isinstance(attribute, cached_property):
+                self.__dict__.pop(name, None)
+        for annotation in _GRADE_ANNOTATIONS:
+            self.__dict__.pop(annotation, None)
+        for relation in ['ag_grade', 'pitchgrade', 'docsgrade']:
+            self._state.fields_cache.pop(relation, None)
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        if fields is None:
+            # not when a deferred field is loaded
+            self.invalidate_computed_values()
+
     @property
     def short_title_else_title(self):
         if self.short_title is not None:
@@ -99,16 +267,19 @@ class Project(models.Model):
     def student_mail_as_list(self):
         return [s.mail for s in self.student_set.all()]
 
+    @cached_property
+    def hours_summary(self):
+        # Already set for projects fetched via Project.objects.with_hours()
+        return HoursSummary.for_projects([self.pk])[self.pk]
+
     @property
     def total_hours(self):
-        total_hours = sum((s.total_hours for s in self.student_set.all()), Decimal(0))
-        return round(total_hours, 2)
+        return self.hours_summary.total
 
     def total_hours_of_category(self, category):
-        total_hours = sum((s.total_hours_of_category(category) for s in self.student_set.all()), Decimal(0))
-        return round(total_hours, 2)
+        return self.hours_summary.of_category(category)
 
-    @property
+    @cached_property
     def expected_hours(self):
         expected_hours_per_student = Decimal(270)
         expected_hours = self.student_set.all().count() * expected_hours_per_student
@@ -118,15 +289,15 @@ class Project(models.Model):
     def get_past_and_current_intervals(self):
         return self.timeinterval_set.order_by("-start").filter(start__lte=date.today()).all()
 
-    @property
+    @cached_property
     def grade_complete(self):
         return all([self.ag_grade_points, self.pitch_grade_points, self.docs_grade_points])
 
-    @property
+    @cached_property
     def total_points(self):
         return sum([self.ag_grade_points_value, self.pitch_grade_points_value, self.docs_grade_points_value])
 
-    @property
+    @cached_property
     def grade(self):
         points = round(self.total_points, 0) - round(self.total_points, 0) % 10
         if points < 100:
@@ -147,7 +318,7 @@ class Project(models.Model):
             grade = grades[points]
         return grade
 
-    @property
+    @cached_property
     def grade_close_to_higher_grade(self):
         return self.grade_complete and self.total_points > 100 and self.total_points % 10 > (10 - 2) and self.grade != 1.0
 
@@ -159,40 +330,41 @@ class Project(models.Model):
     def ag_grade_points(self):
         return formats.localize(self.ag_points, use_l10n=True) if self.ag_points >= 0 else ""
 
-    @property
+    def _latest_ag_grade_value(self, field, after_deadline=False):
+        annotation = f"{field}_{'after' if after_deadline else 'before'}_deadline"
+        if hasattr(self, annotation):
+            # Already set for projects fetched via Project.objects.with_grades()
+            return getattr(self, annotation)
+        grades = self.aggradeafterdeadline_set if after_deadline else self.aggradebeforedeadline_set
+        value = grades.order_by('-timestamp').values_list(field, flat=True).first()
+        # Memoized like the annotation (see invalidate_computed_values)
+        setattr(self, annotation, value)
+        return value
+
+    @cached_property
     def ag_points(self):
         if self.ag_grade:
             return self.ag_grade.ag_points
-        recent = self.aggradebeforedeadline_set \
-            .order_by('-timestamp').values_list('ag_points', flat=True).first()
+        recent = self._latest_ag_grade_value('ag_points')
         return recent or -1
 
-    @property
+    @cached_property
     def ag_points_justification(self):
         if self.ag_grade:
             return self.ag_grade.ag_points_justification
-        recent = self.aggradebeforedeadline_set \
-            .order_by('-timestamp').values_list('ag_points_justification', flat=True).first()
+        recent = self._latest_ag_grade_value('ag_points_justification')
         return recent or ""
 
-    @property
+    @cached_property
     def most_recent_ag_points(self):
-        after_deadline = self.aggradeafterdeadline_set \
-            .order_by('-timestamp').values_list('ag_points', flat=True).first()
-
-        before_deadline = self.aggradebeforedeadline_set \
-            .order_by('-timestamp').values_list('ag_points', flat=True).first()
-
+        after_deadline = self._latest_ag_grade_value('ag_points', after_deadline=True)
+        before_deadline = self._latest_ag_grade_value('ag_points')
         return after_deadline or before_deadline or -1
 
-    @property
+    @cached_property
     def most_recent_ag_points_justification(self):
-        after_deadline = self.aggradeafterdeadline_set \
-            .order_by('-timestamp').values_list('ag_points_justification', flat=True).first()
-
-        before_deadline = self.aggradebeforedeadline_set \
-            .order_by('-timestamp').values_list('ag_points_justification', flat=True).first()
-
+        after_deadline = self._latest_ag_grade_value('ag_points_justification', after_deadline=True)
+        before_deadline = self._latest_ag_grade_value('ag_points_justification')
         return after_deadline or before_deadline or ""
 
     @property
@@ -225,10 +397,31 @@ class Project(models.Model):
         docs_grade = hasattr(self, 'docsgrade') and self.docsgrade
         return docs_grade and str(docs_grade.grade_notes) or ""
 
+    @property
+    def log_count(self):
+        return _log_statistic(self, 'tllog_count', lambda: self.tllog_set.count())
+
+    @property
+    def current_status(self):
+        """
+        :return: status of the latest log (None if there are no logs)
+        :rtype: int
+        """
+        return _log_statistic(self, 'latest_log_status',
+                              lambda: self.tllog_set.order_by('-timestamp').values_list('status', flat=True).first())
+
+    @property
+    def status_series(self):
+        """
+        :return: time and status of all logs in chronological order (without loading the logs)
+        :rtype: list of (datetime, int)
+        """
+        return list(self.tllog_set.order_by('timestamp').values_list('timestamp', 'status'))
+
     @property
     def status_json_string(self):
-        return json.dumps(
-            [{'x': log.simple_timestamp, 'y': log.status} for log in self.tllog_set.all().order_by('timestamp')])
+        return json.dumps([{'x': timestamp.strftime(SIMPLE_TIMESTAMP_FORMAT), 'y': status}
+                           for timestamp, status in self.status_series])
 
     @staticmethod
     def without_recent_logs(projects=None):
@@ -260,7 +453,12 @@ class Project(models.Model):
 
     @property
     def last_log(self):
-        return self.tllog_set.order_by('timestamp').last().timestamp
+        """
+        :return: time of the latest log (None if there are no logs)
+        :rtype: datetime
+        """
+        return _log_statistic(self, 'latest_log_timestamp',
+                              lambda: self.tllog_set.order_by('-timestamp').values_list('timestamp', flat=True).first())
 
 
 class PeerGroup(models.Model):
@@ -287,6 +485,16 @@ class PeerGroup(models.Model):
         return [p for p in self.projects.all()]
 
 
+class TLQuerySet(models.QuerySet):
+    def with_log_statistics(self):
+        """
+        Annotate the number of logs (tllog_count) and their average rating (average_log_rating)
+        without loading the logs
+        """
+        return self.annotate(tllog_count=Coalesce(_log_aggregate('tl', Count('pk')), Value(0)),
+                             average_log_rating=_log_aggregate('tl', Avg('rating')))
+
+
 class TL(models.Model):
     class Meta:
         verbose_name = "Teamleitung"
@@ -299,16 +507,23 @@ class TL(models.Model):
     confirmed = models.BooleanField(verbose_name="Bestätigt", default=False, blank=True)
     log_reminder = models.PositiveSmallIntegerField(verbose_name="Anzahl Reminder für Logs", default=0)
 
+    objects = TLQuerySet.as_manager()
+
     @staticmethod
     def get_active():
         return TL.objects.filter(bp__active=True, confirmed=True)
 
+    @property
+    def log_count(self):
+        return _log_statistic(self, 'tllog_count', lambda: self.tllog_set.count())
+
     @property
     def average_rating(self):
-        ratings = [log.rating for log in self.tllog_set.all() if log.rating]
-        if not ratings:
+        average = _log_statistic(self, 'average_log_rating',
+                                 lambda: self.tllog_set.aggregate(average=Avg('rating'))['average'])
+        if not average:
             return
-        return round(sum(ratings)/len(ratings), 2)
+        return round(average, 2)
 
     def __str__(self):
         return self.name
@@ -338,14 +553,57 @@ class Student(models.Model):
 
     @property
     def total_hours(self):
-        total_hours = self.timetrackingentry_set.filter(interval__group=self.project).aggregate(
+        total_hours = self.timetrackingrollup_set.filter(project=self.project).aggregate(
             total_hours=Coalesce(Sum('hours'), Decimal(0)))['total_hours']
         return round(total_hours, 2)
 
     def total_hours_of_category(self, category):
-        total_hours = self.timetrackingentry_set.filter(interval__group=self.project, category=category).aggregate(
+        total_hours = self.timetrackingrollup_set.filter(project=self.project, category=category).aggregate(
             total_hours=Coalesce(Sum('hours'), Decimal(0)))['total_hours']
         return round(total_hours, 2)
 
     def __str__(self):
         return self.name
+
+
+@receiver(post_save, sender=Project)
+def invalidate_computed_values_of_project_receiver(sender, instance: Project, **kwargs):
+    instance.invalidate_computed_values()
+
+
+def invalidate_computed_values_of_graded_project_receiver(sender, instance, **kwargs):
+    # Only the project instance the grade refers to can be updated, other instances live until the end of their request
+    if sender._meta.get_field('project').is_cached(instance):
+        instance.project.invalidate_computed_values()
+
+
+for model in [AGGradeBeforeDeadline, AGGradeAfterDeadline, PitchGrade, DocsGrade]:
+    post_save.connect(invalidate_computed_values_of_graded_project_receiver, sender=model,
+                      dispatch_uid=f"invalidate_computed_values_{model.__name__}")
+    post_delete.connect(invalidate_computed_values_of_graded_project_receiver, sender=model,
+                        dispatch_uid=f"invalidate_computed_values_{model.__name__}")
+
+
+def invalidate_dashboard_receiver(sender, **kwargs):
+    # Key figures shown on the dashboards (see bp.index.metrics)
+    invalidate_cached_data(DASHBOARD)
+
+
+def invalidate_reference_data_receiver(sender, **kwargs):
+    # Active BP, categories, problems and log templates (see get_active/get_all of these models)
+    invalidate_cached_data(REFERENCE_DATA)
+
+
+for model in [BP, Project, TL, Student, TLLog, AGGradeBeforeDeadline, AGGradeAfterDeadline, PitchGrade, DocsGrade,
+              TimeInterval]:
+    post_save.connect(invalidate_dashboard_receiver, sender=model, dispatch_uid=f"invalidate_dashboard_{model.__name__}")
+    post_delete.connect(invalidate_dashboard_receiver, sender=model,
+                        dispatch_uid=f"invalidate_dashboard_{model.__name__}")
+
+for model in [BP, TimeSpentCategory, TLLogProblem, TLLogTemplate]:
+    post_save.connect(invalidate_reference_data_receiver, sender=model,
+                      dispatch_uid=f"invalidate_reference_data_{model.__name__}")
+    post_delete.connect(invalidate_reference_data_receiver, sender=model,
+                        dispatch_uid=f"invalidate_reference_data_{model.__name__}")
+
+connection_created.connect(configure_sqlite_connection, dispatch_uid="configure_sqlite_connection")
@@ -0,0 +1,128 @@
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import models
+from django.utils import timezone
+
+
+class QueuedMail(models.Model):
+    """
+        E-mail that is sent asynchronously by the send_queued_mails management command,
+        so that requests do not have to wait for the mail server.
+    """
+
+    class Meta:
+        verbose_name = "Ausgehende E-Mail"
+        verbose_name_plural = "Ausgehende E-Mails"
+        ordering = ['created']
+
+    PENDING = 0
+    SENT = 1
+    FAILED = 2
+    SENDING = 3
+    STATUS_CHOICES = [
+        (PENDING, 'Wartend'),
+        (SENDING, 'Wird verschickt'),
+        (SENT, 'Verschickt'),
+        (FAILED, 'Fehlgeschlagen'),
+    ]
+
+    subject = models.TextField(verbose_name="Betreff")
+    body = models.TextField(verbose_name="Inhalt")
+    from_email = models.CharField(max_length=255, verbose_name="Absender")
+    to = models.JSONField(verbose_name="Empfänger")
+    reply_to = models.JSONField(default=list, blank=True, verbose_name="Antwort an")
+
+    status = models.SmallIntegerField(choices=STATUS_CHOICES, default=PENDING, verbose_name="Status")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Anzahl Versuche")
+    created = models.DateTimeField(auto_now_add=True, verbose_name="Erstellt")
+    next_attempt = models.DateTimeField(default=timezone.now, verbose_name="Nächster Versuch")
+    sent = models.DateTimeField(blank=True, null=True, verbose_name="Verschickt")
+    last_error = models.TextField(blank=True, verbose_name="Letzter Fehler")
+    # identifies the sending process that claimed the e-mail (see claim_due)
+    claim = models.UUIDField(blank=True, null=True, editable=False, verbose_name="Reservierung")
+
+    @staticmethod
+    def enqueue(mail):
+        """
+        Queue an e-mail instead of sending it directly
+
+        :param mail: e-mail to be sent
+        :type mail: EmailMessage
+        :return: queued e-mail
+        :rtype: QueuedMail
+        """
+        return QueuedMail.objects.create(subject=mail.subject, body=mail.body, from_email=mail.from_email,
+                                         to=list(mail.to), reply_to=list(mail.reply_to))
+
+    @staticmethod
+    def enqueue_all(mails):
+        """
+        Queue several e-mails using a single query
+
+        :param mails: e-mails to be sent
+        :type mails: list of EmailMessage
+        :return: queued e-mails
+        :rtype: list of QueuedMail
+        """
+        return QueuedMail.objects.bulk_create([
+            QueuedMail(subject=mail.subject, body=mail.body, from_email=mail.from_email, to=list(mail.to),
+                       reply_to=list(mail.reply_to))
+            for mail in mails])
+
+    @staticmethod
+    def get_due():
+        # e-mails whose claim expired (e.g. because the sending process crashed) are due again
+        return QueuedMail.objects.filter(status__in=[QueuedMail.PENDING, QueuedMail.SENDING],
+                                         next_attempt__lte=timezone.now())
+
+    @staticmethod
+    def claim_due(batch_size):
+        """
+        Claim due e-mails for sending, so that no other process (e.g. a manual run of send_queued_mails next to the
+        one started by uwsgi) sends them as well. The claim is a conditional update and expires after
+        settings.MAIL_QUEUE_CLAIM_TIMEOUT_SECONDS.
+
+        :param batch_size: maximum number of e-mails to claim
+        :type batch_size: int
+        :return: the claimed e-mails (only those not claimed by another process in the meantime)
+        :rtype: list of QueuedMail
+        """
+        pks = list(QueuedMail.get_due().values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return []
+        claim = uuid4()
+        QueuedMail.get_due().filter(pk__in=pks).update(
+            status=QueuedMail.SENDING, claim=claim,
+            next_attempt=timezone.now() + timedelta(seconds=settings.MAIL_QUEUE_CLAIM_TIMEOUT_SECONDS))
+        return list(QueuedMail.objects.filter(claim=claim))
+
+    def as_email_message(self, connection=None):
+        return EmailMessage(self.subject, self.body, self.from_email, self.to, reply_to=self.reply_to,
+                            connection=connection)
+
+    def mark_sent(self):
+        self.status = QueuedMail.SENT
+        self.attempts += 1
+        self.sent = timezone.now()
+        self.save()
+
+    def mark_failed(self, error):
+        """
+        Schedule the next attempt with exponential backoff
+        or give up after settings.MAIL_QUEUE_MAX_ATTEMPTS attempts
+        """
+        self.attempts += 1
+        self.last_error = str(error)
+        if self.attempts >= settings.MAIL_QUEUE_MAX_ATTEMPTS:
+            self.status = QueuedMail.FAILED
+        else:
+            self.status = QueuedMail.PENDING
+            delay = settings.MAIL_QUEUE_RETRY_DELAY_SECONDS * 2 ** (self.attempts - 1)
+            self.next_attempt = timezone.now() + timedelta(seconds=delay)
+        self.save()
+
+    def __str__(self):
+        return f"{self.subject} an {', '.join(self.to)}"
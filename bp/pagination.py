@@ -0,0 +1,109 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class KeysetPage:
+    """
+        Page of a KeysetPaginator, links to the neighbouring pages use the cursors of the first and last object
+    """
+
+    def __init__(self, paginator, object_list, has_previous, has_next):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.has_previous = has_previous
+        self.has_next = has_next
+
+    @property
+    def previous_cursor(self):
+        return self.paginator.cursor(self.object_list[0]) if self.has_previous and self.object_list else None
+
+    @property
+    def next_cursor(self):
+        return self.paginator.cursor(self.object_list[-1]) if self.has_next and self.object_list else None
+
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+        Paginates a queryset in descending order of (field, pk) without counting the objects or using OFFSET,
+        so that every page is loaded by an index range scan no matter how deep it is.
+
+        Example Usage:
+        paginator = KeysetPaginator(TLLog.objects.all(), 20, 'timestamp')
+        page = paginator.page(after=request.GET.get('after'))
+        # link to the next page: ?after={{ page.next_cursor }}, to the previous page: ?before={{ page.previous_cursor }}
+    """
+
+    def __init__(self, queryset, per_page, field):
+        """
+        :param queryset: objects to paginate (will be ordered by field and pk, descending)
+        :type queryset: QuerySet
+        :param per_page: number of objects per page
+        :type per_page: int
+        :param field: (unique enough) field to order by, e.g. a timestamp
+        :type field: str
+        """
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+
+    def cursor(self, obj):
+        """
+        :param obj: object of the queryset
+        :return: position of the object as used for the after/before parameters of page
+        :rtype: str
+        """
+        value = getattr(obj, self.field)
+        return f"{value.isoformat() if hasattr(value, 'isoformat') else value}_{obj.pk}"
+
+    def _parse_cursor(self, cursor):
+        value, _, pk = cursor.rpartition("_")
+        try:
+            value = self.queryset.model._meta.get_field(self.field).to_python(value)
+            pk = int(pk)
+        except (ValidationError, ValueError):
+            raise Http404("Ungültige Seite")
+        if value is None:
+            raise Http404("Ungültige Seite")
+        return value, pk
+
+    def page(self, after=None, before=None, last=False):
+        """
+        Get the objects after (older than) or before (newer than) the given cursor, the first page by default
+
+        :param after: cursor of the last object of the previous page
+        :type after: str
+        :param before: cursor of the first object of the next page
+        :type before: str
+        :param last: get the last page (ignored if a cursor is given)
+        :type last: bool
+        :return: page of at most per_page objects
+        :rtype: KeysetPage
+        """
+        descending = self.queryset.order_by(f"-{self.field}", "-pk")
+        if after:
+            value, pk = self._parse_cursor(after)
+            objects = list(descending.filter(Q(**{f"{self.field}__lt": value})
+                                             | Q(**{self.field: value, "pk__lt": pk}))[:self.per_page + 1])
+            return KeysetPage(self, objects[:self.per_page], True, len(objects) > self.per_page)
+        if before or last:
+            ascending = self.queryset.order_by(self.field, "pk")
+            if before:
+                value, pk = self._parse_cursor(before)
+                ascending = ascending.filter(Q(**{f"{self.field}__gt": value}) | Q(**{self.field: value, "pk__gt": pk}))
+            objects = list(ascending[:self.per_page + 1])
+            if before and len(objects) <= self.per_page:
+                # back at the beginning, show a full first page
+                return self.page()
+            return KeysetPage(self, objects[:self.per_page][::-1], len(objects) > self.per_page, bool(before))
+        objects = list(descending[:self.per_page + 1])
+        return KeysetPage(self, objects[:self.per_page], False, len(objects) > self.per_page)
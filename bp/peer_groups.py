@@ -0,0 +1,158 @@
+import math
+import random
+from collections import defaultdict
+
+
+def project_conflict_keys(project):
+    """
+    Projects sharing one of these keys must not be in the same peer group
+
+    :param project: project to be assigned to a peer group
+    :type project: Project
+    :return: AG and TL of the project (if set)
+    :rtype: list of tuple
+    """
+    keys = []
+    if project.ag_mail:
+        keys.append(('ag', project.ag_mail.lower()))
+    if project.tl_id is not None:
+        keys.append(('tl', project.tl_id))
+    return keys
+
+
+class PeerGroupSolution:
+    """
+        Assignment of projects to peer groups, see solve_peer_groups
+    """
+
+    def __init__(self, peer_groups, violations, iterations):
+        self.peer_groups = peer_groups
+        self.violations = violations
+        self.iterations = iterations
+
+    @property
+    def is_valid(self):
+        return self.violations == 0
+
+    def violated_peer_groups(self, conflict_keys=project_conflict_keys):
+        """
+        :return: indices of peer groups that contain at least two conflicting projects
+        :rtype: list of int
+        """
+        violated = []
+        for i, peer_group in enumerate(self.peer_groups):
+            keys = [key for project in peer_group for key in conflict_keys(project)]
+            if len(keys) != len(set(keys)):
+                violated.append(i)
+        return violated
+
+
+def _conflict_graph(items, conflict_keys):
+    items_by_key = defaultdict(list)
+    for i, item in enumerate(items):
+        for key in set(conflict_keys(item)):
+            items_by_key[key].append(i)
+    conflicts = [set() for _ in items]
+    for members in items_by_key.values():
+        for i in members:
+            conflicts[i].update(members)
+    for i, conflicting in enumerate(conflicts):
+        conflicting.discard(i)
+    return conflicts
+
+
+def solve_peer_groups(items, groups_per_peergroup, max_iterations, conflict_keys=project_conflict_keys, seed=None):
+    """
+    Split items (projects) into peer groups of (at most) groups_per_peergroup items
+    such that no two items in the same peer group share a conflict key (AG or TL).
+
+    The items with the most conflicts are assigned first, each to the peer group where it causes the fewest
+    conflicts (greedy). Remaining conflicts are then resolved by a min-conflicts local search that swaps
+    conflicting items between peer groups. If no solution without conflicts is found within max_iterations,
+    the solution with the fewest conflicting pairs is returned.
+
+    :param items: items to be assigned to peer groups
+    :type items: list
+    :param groups_per_peergroup: maximum number of items per peer group
+    :type groups_per_peergroup: int
+    :param max_iterations: maximum number of local search steps
+    :type max_iterations: int
+    :param conflict_keys: function returning the conflict keys of an item
+    :type conflict_keys: function
+    :param seed: seed of the random number generator (for reproducible results)
+    :type seed: int
+    :return: peer groups (with sizes differing by at most one) and the number of conflicting pairs
+    :rtype: PeerGroupSolution
+    """
+    rng = random.Random(seed)
+    items = list(items)
+    if not items:
+        return PeerGroupSolution([], 0, 0)
+
+    conflicts = _conflict_graph(items, conflict_keys)
+    group_count = math.ceil(len(items) / groups_per_peergroup)
+    base_size, larger_groups = divmod(len(items), group_count)
+    capacities = [base_size + 1 if g < larger_groups else base_size for g in range(group_count)]
+
+    members = [set() for _ in range(group_count)]
+    group_of = [0] * len(items)
+
+    def conflicts_in(i, group, ignore=None):
+        return sum(1 for j in conflicts[i] if j in members[group] and j != ignore)
+
+    # Greedy: largest conflict degree first, into the peer group with the fewest conflicts (then the emptiest one)
+    order = list(range(len(items)))
+    rng.shuffle(order)
+    order.sort(key=lambda i: len(conflicts[i]), reverse=True)
+    for i in order:
+        group = min((g for g in range(group_count) if len(members[g]) < capacities[g]),
+                    key=lambda g: (conflicts_in(i, g), len(members[g]) - capacities[g], rng.random()))
+        members[group].add(i)
+        group_of[i] = group
+
+    violations = sum(conflicts_in(i, group_of[i]) for i in range(len(items))) // 2
+    best_violations, best_group_of = violations, list(group_of)
+
+    # Local search (min-conflicts): swap a conflicting item with the item of another peer group
+    # that reduces the number of conflicts the most, accept sideways moves and random swaps to escape plateaus
+    iteration = 0
+    while violations > 0 and iteration < max_iterations:
+        iteration += 1
+        conflicting = [i for i in range(len(items)) if conflicts_in(i, group_of[i])]
+        i = rng.choice(conflicting)
+        a = group_of[i]
+        current_i = conflicts_in(i, a)
+        best_delta, best_swaps = None, []
+        for b in range(group_count):
+            if b == a:
+                continue
+            gain_i = conflicts_in(i, b)
+            for j in members[b]:
+                delta = (gain_i - (j in conflicts[i]) + conflicts_in(j, a, ignore=i)) \
+                        - (current_i + conflicts_in(j, b))
+                if best_delta is None or delta < best_delta:
+                    best_delta, best_swaps = delta, [j]
+                elif delta == best_delta:
+                    best_swaps.append(j)
+        if best_delta is None:
+            break
+        if best_delta > 0 and rng.random() < 0.5:
+            j = rng.choice([j for b in range(group_count) if b != a for j in members[b]])
+            best_delta = None
+        else:
+            j = rng.choice(best_swaps)
+        b = group_of[j]
+        members[a].remove(i)
+        members[b].remove(j)
+        members[a].add(j)
+        members[b].add(i)
+        group_of[i], group_of[j] = b, a
+        violations = sum(conflicts_in(k, group_of[k]) for k in range(len(items))) // 2 \
+            if best_delta is None else violations + best_delta
+        if violations < best_violations:
+            best_violations, best_group_of = violations, list(group_of)
+
+    peer_groups = [[] for _ in range(group_count)]
+    for i, group in enumerate(best_group_of):
+        peer_groups[group].append(items[i])
+    return PeerGroupSolution(peer_groups, best_violations, iteration)
@@ -0,0 +1,148 @@
+import json
+import logging
+import math
+import time
+import tracemalloc
+from logging.handlers import WatchedFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+
+from bp.database import lock_statistics, LockStatistics
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetrics:
+    """
+        Measurements of a single request, also used as execute wrapper of the database connection
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0
+        self.template_start = None
+        self.template_seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.queries += 1
+
+    def template_rendered(self, response):
+        if self.template_start is not None:
+            self.template_seconds += time.perf_counter() - self.template_start
+
+
+class PerformanceMiddleware:
+    """
+        Opt-in (set PERFORMANCE_LOG_FILE): records view, number and duration of the queries, template render time,
+        total time, retries and waiting time of write paths that found the database locked (see retry_on_lock)
+        and (with PERFORMANCE_LOG_TRACE_MEMORY) peak of the memory allocated during every request.
+        They are appended as one JSON object per line to a log (see the performance_report command)
+        and sent to the browser in the Server-Timing header. All uwsgi processes append to the same file,
+        so it is rotated externally by logrotate (see logrotate-bp-tool.conf); the handler reopens the file
+        once it was rotated.
+
+        The time of streaming responses does not include generating their content. The peak allocations are
+        measured for the whole process, i.e. include concurrent requests of other threads.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_LOG_FILE:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.trace_memory = settings.PERFORMANCE_LOG_TRACE_MEMORY
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if not logger.handlers:
+            handler = WatchedFileHandler(settings.PERFORMANCE_LOG_FILE, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    def __call__(self, request):
+        metrics = request.performance_metrics = RequestMetrics()
+        locks = lock_statistics.track_thread()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        with connection.execute_wrapper(metrics):
+            response = self.get_response(request)
+        total_seconds = time.perf_counter() - metrics.start
+        peak_kb = round((tracemalloc.get_traced_memory()[1] - memory_before) / 1024) if self.trace_memory else None
+        lock_contention = LockStatistics.total(locks.values())
+
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'time': timezone.now().isoformat(timespec='seconds'),
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_seconds * 1000, 1),
+            'template_ms': round(metrics.template_seconds * 1000, 1),
+            'total_ms': round(total_seconds * 1000, 1),
+            'peak_kb': peak_kb,
+            'lock_retries': lock_contention['retries'],
+            'lock_wait_ms': round(lock_contention['wait_seconds'] * 1000, 1),
+            'locked': sorted(path for path, counts in locks.items() if counts['locked']),
+        }))
+        timings = [
+            f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.queries} queries"',
+            f'tpl;dur={metrics.template_seconds * 1000:.1f}',
+            f'total;dur={total_seconds * 1000:.1f}',
+        ]
+        if lock_contention['locked']:
+            timings.append(f'lock;dur={lock_contention["wait_seconds"] * 1000:.1f};'
+                           f'desc="{lock_contention["retries"]} retries"')
+        response['Server-Timing'] = ", ".join(timings)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before the response is rendered (this middleware is the outermost one)
+        request.performance_metrics.template_start = time.perf_counter()
+        response.add_post_render_callback(request.performance_metrics.template_rendered)
+        return response
+
+
+def read_performance_log(path=None):
+    """
+    Read the records of the performance log including its files rotated by logrotate (oldest first,
+    settings.PERFORMANCE_LOG_BACKUP_COUNT should match the rotate count)
+
+    :param path: path of the log (default: settings.PERFORMANCE_LOG_FILE)
+    :type path: str
+    :return: records written by PerformanceMiddleware
+    :rtype: generator of dict
+    """
+    path = str(path or settings.PERFORMANCE_LOG_FILE)
+    for suffix in [f".{i}" for i in range(settings.PERFORMANCE_LOG_BACKUP_COUNT, 0, -1)] + [""]:
+        try:
+            with open(path + suffix, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # e.g. an incomplete line of a request still being written
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def percentile(sorted_values, p):
+    """
+    :param sorted_values: values in ascending order (at least one)
+    :type sorted_values: list
+    :param p: percentile (0-100)
+    :type p: float
+    :return: nearest-rank percentile of the values
+    """
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
@@ -1,43 +1,159 @@
-import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qs, urlencode
 
+import requests
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
 
-from bp.models import BP
+from bp.models import BP, PretixOrder
 
 
-def load_pretix_entries(start_url, callback):
+class PretixError(ValueError):
+    """
+        Pretix could not be reached or returned an unexpected answer
     """
-    Load (paginated) entries from pretix and perform callback on every entry
 
-    :param start_url: initial URL
-    :type start_url: str
-    :param callback: callback function for each entry (should accept the result/entry as single argument)
-    :type callback: function
+
+class PretixUnavailableError(PretixError):
+    """
+        Pretix could not be reached (timeout, connection error) or failed itself (5xx), the request may be repeated
     """
-    url = start_url
-    while True:
-        # Get page
-        r = requests.get(url, headers={'Authorization': f"Token {settings.PRETIX_API_TOKEN}"})
 
-        if r.status_code != 200:
-            print(f"Error: {r.status_code}")
-            break
 
-        # Load all page entries...
-        j = json.loads(r.text)
+class PretixNotFoundError(PretixError):
+    """
+        The requested entry does not exist (anymore), e.g. a deleted order
+    """
 
-        # ... loop over them...
-        for result in j["results"]:
-            # ... and call the callback function for each of them
-            callback(result)
 
-        # Repeat as long as there are further pages
-        if j["next"] is None:
-            break
+class PretixClient:
+    """
+        Client for the pretix API using a pooled HTTP session (reused connections) and timeouts for all requests.
+
+        Example Usage:
+        client = PretixClient()
+        client.load_entries(pretix_url("orders/", event_slug), callback)
+        order = client.load_single_entry(pretix_url(f"orders/{order_id}/", event_slug))
+    """
+
+    def __init__(self, token=None, timeout=None, max_workers=None):
+        """
+        :param token: API token (default: settings.PRETIX_API_TOKEN)
+        :type token: str
+        :param timeout: timeout of a single request in seconds (default: settings.PRETIX_TIMEOUT_SECONDS)
+        :type timeout: float
+        :param max_workers: maximum number of pages loaded concurrently (default: settings.PRETIX_MAX_WORKERS)
+        :type max_workers: int
+        """
+        self.timeout = timeout or settings.PRETIX_TIMEOUT_SECONDS
+        self.max_workers = max_workers or settings.PRETIX_MAX_WORKERS
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f"Token {token or settings.PRETIX_API_TOKEN}"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
+    def _get(self, url):
+        try:
+            r = self.session.get(url, timeout=self.timeout)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            raise PretixUnavailableError(f"Pretix API not reachable for {url}: {e}") from e
+        if r.status_code == 404:
+            raise PretixNotFoundError(f"Pretix API returned 404 for {url}")
+        if r.status_code >= 500:
+            raise PretixUnavailableError(f"Pretix API returned {r.status_code} for {url}")
+        if r.status_code != 200:
+            raise PretixError(f"Pretix API returned {r.status_code} for {url}")
+        return json.loads(r.text)
+
+    @staticmethod
+    def _fix_url(url):
         # Fix URL returned by API (since it may contain "localhost" depending on the configuration of the installation)
-        url = settings.PRETIX_API_BASE_URL + j["next"].split("/api/v1/")[1]
+        return settings.PRETIX_API_BASE_URL + url.split("/api/v1/")[1]
+
+    @staticmethod
+    def _page_url(url, page):
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        query['page'] = [str(page)]
+        return urlunsplit(parts._replace(query=urlencode(query, doseq=True)))
+
+    def load_entries(self, start_url, callback):
+        """
+        Load (paginated) entries from pretix and perform callback on every entry.
+        Once the first page reveals the total number of entries, all remaining pages are loaded concurrently.
+        The callback is only called once all pages were loaded (in the original order of the entries),
+        so it is not called at all if any page fails.
+
+        :param start_url: initial URL
+        :type start_url: str
+        :param callback: callback function for each entry (should accept the result/entry as single argument)
+        :type callback: function
+        :raises PretixError: if any page could not be loaded
+        """
+        try:
+            first_page = self._get(start_url)
+            pages = [first_page["results"]]
+            if first_page["next"] is not None and first_page["results"]:
+                next_url = self._fix_url(first_page["next"])
+                page_count = -(-first_page["count"] // len(first_page["results"]))
+                page_urls = [self._page_url(next_url, page) for page in range(2, page_count + 1)]
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    pages.extend(page["results"] for page in executor.map(self._get, page_urls))
+        except (ValueError, KeyError, requests.RequestException) as e:
+            raise PretixError(f"Could not load {start_url}: {e}") from e
+
+        for results in pages:
+            for result in results:
+                callback(result)
+
+    def load_single_entry(self, url):
+        """
+        Load a single entry from the pretix API
+
+        :param url: endpoint (single entry, e.g. order)
+        :type url: str
+        :return: Response describing the entry
+        :rtype: Dict
+        :raises PretixNotFoundError: if the entry does not exist
+        :raises PretixUnavailableError: if pretix could not be reached or failed
+        :raises PretixError: if the entry could not be loaded for another reason
+        """
+        try:
+            return self._get(url)
+        except PretixError:
+            raise
+        except (ValueError, requests.RequestException) as e:
+            raise PretixError(str(e)) from e
+
+
+_client = None
+
+
+def get_client():
+    """
+    Shared client of this process, so that connections to pretix are reused across requests
+    """
+    global _client
+    if _client is None:
+        _client = PretixClient()
+    return _client
+
+
+def load_pretix_entries(start_url, callback):
+    """
+    Load (paginated) entries from pretix and perform callback on every entry
+
+    :param start_url: initial URL
+    :type start_url: str
+    :param callback: callback function for each entry (should accept the result/entry as single argument)
+    :type callback: function
+    :raises PretixError: if any page could not be loaded
+    """
+    get_client().load_entries(start_url, callback)
 
 
 def load_pretix_single_entry(url):
@@ -48,13 +164,9 @@ def load_pretix_single_entry(url):
     :type url: str
     :return: Response describing the entry
     :rtype: Dict
+    :raises PretixError: if the entry could not be loaded
     """
-    r = requests.get(url, headers={'Authorization': f"Token {settings.PRETIX_API_TOKEN}"})
-
-    if r.status_code != 200:
-        raise ValueError
-
-    return json.loads(r.text)
+    return get_client().load_single_entry(url)
 
 def get_pretix_projectinfo_url(project):
     """
@@ -109,6 +221,69 @@ def get_project_details(result):
     return code, title, name, email, secret
 
 
+def _store_order(event_slug, result):
+    try:
+        code, title, name, email, secret = get_project_details(result)
+    except (IndexError, KeyError):
+        # e.g. canceled orders without positions
+        code, title, name, email, secret = result["code"], "", "", result.get("email") or "", result["secret"]
+    order, _ = PretixOrder.objects.update_or_create(
+        event=event_slug, code=code,
+        defaults={'secret': secret, 'title': title or "", 'name': name or "", 'email': email or "",
+                  'fetched': timezone.now()})
+    return order
+
+
+def get_order(order_id, event_slug=None):
+    """
+    Get the data of an order identified by the given ID. Orders are cached locally
+    for settings.PRETIX_CACHE_TTL_SECONDS. If pretix cannot be reached (or fails), an outdated copy is still used
+    up to settings.PRETIX_CACHE_MAX_STALE_SECONDS after it was fetched. The copy of a deleted order is removed.
+
+    :param order_id: ID of the order
+    :type order_id: str
+    :param event_slug: slug of the event (default: AG event of the active BP)
+    :type event_slug: str
+    :return: (cached) order
+    :rtype: PretixOrder
+    :raises PretixNotFoundError: if the order does not exist (anymore)
+    :raises PretixError: if the order could not be loaded and there is no usable copy
+    """
+    if event_slug is None:
+        event_slug = BP.get_active().pretix_event_ag
+    cached = PretixOrder.objects.filter(event=event_slug, code=order_id).first()
+    if cached and cached.is_fresh:
+        return cached
+    try:
+        return _store_order(event_slug, load_pretix_single_entry(pretix_url(f"orders/{order_id}/", event_slug)))
+    except PretixNotFoundError:
+        if cached:
+            cached.delete()
+        raise
+    except PretixUnavailableError:
+        if cached and cached.is_usable_while_unavailable:
+            return cached
+        raise
+
+
+def refresh_orders(event_slug):
+    """
+    Load all orders of the given event from pretix into the local cache
+
+    :param event_slug: slug of the event
+    :type event_slug: str
+    :return: number of updated orders
+    :rtype: int
+    :raises PretixError: if the orders could not be loaded (the cache is not changed then)
+    """
+    orders = []
+    load_pretix_entries(pretix_url("orders/", event_slug), orders.append)
+    with transaction.atomic():
+        for result in orders:
+            _store_order(event_slug, result)
+    return len(orders)
+
+
 def get_order_secret(order_id):
     """
     Get secret for an order identified by the given ID
@@ -117,5 +292,4 @@ def get_order_secret(order_id):
     :return: secret of the given order
     :rtype: str
     """
-    pretix_order = load_pretix_single_entry(pretix_url(f"orders/{order_id}/",BP.get_active().pretix_event_ag))
-    return pretix_order["secret"]
+    return get_order(order_id).secret
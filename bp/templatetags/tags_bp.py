@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from django import template
 from django.apps import apps
 from django.conf import settings
@@ -66,14 +68,32 @@ def render_tag(parser, token):
         )
     return RenderTagNode(tag_to_be_rendered, template_tag_set)
 
+@lru_cache(maxsize=None)
+def compile_render_tag(tag_name, template_tag_set):
+    """
+        Compile the tag once per process instead of parsing a new template (including the {% load %})
+        for every rendered tag, e.g. for every cell of the project overview
+
+        :param tag_name: name of the tag to render
+        :type tag_name: str
+        :param template_tag_set: tag library containing the tag
+        :type template_tag_set: str
+        :return: nodes rendering the tag
+        :rtype: NodeList
+    """
+    return template.Template(f"{{% load {tag_name} from {template_tag_set} %}}{{% {tag_name} %}}").nodelist
+
+
 class RenderTagNode(template.Node):
     def __init__(self, tag, template_tag_set):
         self.template_tag_set = template_tag_set
         self.tag = template.Variable(tag)
+
     def render(self, context):
         tag_name = self.tag.resolve(context)
-        template_code = f"{{% load {tag_name} from {self.template_tag_set} %}}{{% {tag_name} %}}"
-        return template.Template(template_code).render(context)
+        # rendered within the current template, so that e.g. inclusion tags load their templates once per page
+        return compile_render_tag(tag_name, self.template_tag_set).render(context)
+
 
 @register.inclusion_tag('bp/project/project_info/table.html', takes_context=True)
 def project_info_table(context):
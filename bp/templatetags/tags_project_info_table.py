@@ -16,10 +16,14 @@ class ProjectInfoTable():
               Equal priority is sorted alphabetically
     """
     registered_rows = []
+    ordered_infos = None
 
     @staticmethod
     def get_ordered_infos():
-        return map(lambda e: e[1], sorted(ProjectInfoTable.registered_rows))
+        # sorted once after the registration instead of for every rendered table
+        if ProjectInfoTable.ordered_infos is None:
+            ProjectInfoTable.ordered_infos = [tag_name for _, tag_name in sorted(ProjectInfoTable.registered_rows)]
+        return ProjectInfoTable.ordered_infos
 
     @staticmethod
     def register(template_name, *, priority):
@@ -50,6 +54,7 @@ class ProjectInfoTable():
             def new_tag(context):
                 return info_tag(context['project'])
             heapq.heappush(ProjectInfoTable.registered_rows, (priority, tag_name))
+            ProjectInfoTable.ordered_infos = None
         return create_and_register_tag
 
 
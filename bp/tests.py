@@ -1,3 +1,704 @@
-from django.test import TestCase
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import urlsplit, parse_qs
 
-# Create your tests here.
+import requests
+
+from django.core.cache import cache
+from django.conf import settings
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage, get_connection
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+
+from bp.benchmark import seed_cohort, measure_views, load_baseline, compare_to_baseline, bp_url_names, \
+    VIEW_REQUESTS, ROLES
+from bp.cache import cache_key, DASHBOARD
+from bp.database import retry_on_lock, lock_statistics
+from bp.index.metrics import orga_dashboard_metrics
+from bp.management.commands.send_log_reminders import Command as SendLogReminders
+from bp.models import Project, Student, TL, TLLog, AGGradeBeforeDeadline, AGGradeAfterDeadline, PitchGrade, DocsGrade, \
+    ReminderRun, QueuedMail, PretixOrder
+from bp.pagination import KeysetPaginator
+from bp.peer_groups import solve_peer_groups
+from bp.pretix import PretixClient, PretixError, PretixNotFoundError, get_order, pretix_url
+from bp.timetracking.aggregation import HoursSummary
+from bp.tllogs.reminders import send_reminders
+from bp.timetracking.models import TimeSpentCategory, TimeTrackingEntry, TimeTrackingRollup
+
+
+class ViewBudgetTest(TestCase):
+    """
+        Request every view as the roles using it on the cohort of the checked-in baseline, check that the actual page
+        is returned and compare the query counts and response sizes (the wall times are only compared by the
+        benchmark_views command).
+        After an intended change, update the baseline with: python manage.py benchmark_views --update-baseline
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.baseline = load_baseline()
+        cls.cohort = seed_cohort(**cls.baseline['cohort'])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_all_urls_covered(self):
+        self.assertSetEqual(bp_url_names() - set(VIEW_REQUESTS), set(), "URLs missing in VIEW_REQUESTS")
+
+    def test_view_budgets(self):
+        for measurement in measure_views(self.cohort, ROLES):
+            with self.subTest(measurement.key):
+                self.assertListEqual(compare_to_baseline(measurement, self.baseline, check_time=False), [])
+
+
+class TimeTrackingRollupTest(TestCase):
+    """
+        The totals must always equal the aggregated raw entries, whichever way the entries are written
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cohort = seed_cohort(projects=2, students_per_project=2, intervals=2, logs_per_project=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertRollupInSync(self):
+        stored = {}
+        for r in TimeTrackingRollup.objects.values('project', 'student', 'interval', 'category', 'hours'):
+            key = (r['project'], r['student'], r['interval'], r['category'])
+            stored[key] = stored.get(key, 0) + r['hours']
+        expected = TimeTrackingRollup.totals_from_entries()
+        self.assertDictEqual({key: hours for key, hours in stored.items() if hours},
+                             {key: hours for key, hours in expected.items() if hours})
+
+    def test_set_hours(self):
+        categories = TimeSpentCategory.get_all()
+        TimeTrackingEntry.set_hours(self.cohort.student, self.cohort.interval, categories[0], Decimal("3.5"))
+        TimeTrackingEntry.set_hours(self.cohort.student, self.cohort.interval, categories[1], Decimal("1"))
+        TimeTrackingEntry.set_hours(self.cohort.student, self.cohort.interval, categories[0], Decimal("0.25"))
+        self.assertRollupInSync()
+
+    def test_set_hours_of_cells(self):
+        categories = TimeSpentCategory.get_all()
+        intervals = list(self.cohort.project.timeinterval_set.all())
+        TimeTrackingEntry.set_hours_of_cells(self.cohort.student, {(interval, category): Decimal(i + 1)
+                                                                   for interval in intervals
+                                                                   for i, category in enumerate(categories)})
+        self.assertRollupInSync()
+        TimeTrackingEntry.set_hours_of_cells(self.cohort.student, {(intervals[0], categories[0]): Decimal(0)})
+        self.assertRollupInSync()
+
+    def test_save_and_delete_entries(self):
+        entry = TimeTrackingEntry.objects.filter(student=self.cohort.student).first()
+        entry.hours += 2
+        entry.save()
+        self.assertRollupInSync()
+        entry.interval = self.cohort.project.timeinterval_set.exclude(pk=entry.interval_id).first()
+        entry.category = None
+        entry.save()
+        self.assertRollupInSync()
+        TimeTrackingEntry.objects.create(student=self.cohort.student, interval=self.cohort.interval,
+                                         category=None, hours=Decimal(4))
+        self.assertRollupInSync()
+        entry.delete()
+        TimeTrackingEntry.objects.filter(student=self.cohort.student).delete()
+        self.assertRollupInSync()
+
+    def test_interval_and_category_changes(self):
+        interval = self.cohort.interval
+        interval.group = Project.get_active().exclude(pk=self.cohort.project.pk).first()
+        interval.save()
+        self.assertRollupInSync()
+        TimeSpentCategory.objects.first().delete()
+        self.assertRollupInSync()
+
+    def test_student_changes_project(self):
+        student = self.cohort.student
+        before = HoursSummary.for_projects([self.cohort.project.pk])[self.cohort.project.pk]
+        self.assertGreater(before.of_student(student), 0)
+        student.project = Project.get_active().exclude(pk=self.cohort.project.pk).first()
+        student.save()
+        after = HoursSummary.for_projects([self.cohort.project.pk])[self.cohort.project.pk]
+        self.assertEqual(after.of_student(student), 0)
+        self.assertEqual(after.total, before.total - before.of_student(student))
+        self.assertEqual(student.total_hours, 0)
+        self.assertRollupInSync()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'dashboard-cache-test'}})
+class DashboardCacheTest(TestCase):
+    """
+    A write must replace the generation of the dashboard keys, so that no process reads the cached key figures again
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cohort = seed_cohort(projects=3, students_per_project=1, intervals=1, logs_per_project=1,
+                                 graded_share=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_until_write(self):
+        metrics = orga_dashboard_metrics(self.cohort.bp)
+        with self.assertNumQueries(0):
+            self.assertEqual(orga_dashboard_metrics(self.cohort.bp), metrics)
+
+    def test_write_invalidates_generation(self):
+        key = cache_key(DASHBOARD, "orga", self.cohort.bp.pk)
+        before = orga_dashboard_metrics(self.cohort.bp)
+        TLLog.objects.create(bp=self.cohort.bp, group=self.cohort.project, tl=self.cohort.tl, text="Bericht",
+                             status=0)
+        self.assertNotEqual(cache_key(DASHBOARD, "orga", self.cohort.bp.pk), key)
+        # still stored, but no longer reachable
+        self.assertEqual(cache.get(key), before)
+        self.assertEqual(orga_dashboard_metrics(self.cohort.bp)['logs_count'], before['logs_count'] + 1)
+
+        AGGradeBeforeDeadline.objects.create(project=self.cohort.project, ag_points=80, ag_points_justification="-")
+        self.assertEqual(orga_dashboard_metrics(self.cohort.bp)['projects_graded_count'],
+                         before['projects_graded_count'] + 1)
+
+
+class LogListTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cohort = seed_cohort(projects=3, students_per_project=1, intervals=1, logs_per_project=4)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.cohort.orga)
+
+    def test_invalid_filter_shows_no_logs(self):
+        response = self.client.get(reverse("bp:log_list"), {'status': 99})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["filter_form"].errors)
+        self.assertListEqual(list(response.context["logs"]), [])
+
+    def test_filter(self):
+        response = self.client.get(reverse("bp:log_list"), {'group': self.cohort.project.pk})
+        self.assertFalse(response.context["filter_form"].errors)
+        self.assertSetEqual({log.pk for log in response.context["logs"]},
+                            set(self.cohort.project.tllog_set.values_list('pk', flat=True)))
+
+
+class KeysetPaginatorTest(TestCase):
+    """
+        Walking through the pages must return every log exactly once, even if many logs share their timestamp
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_cohort(projects=3, students_per_project=1, intervals=1, logs_per_project=4)
+        # 12 logs, two groups with equal timestamps crossing the page boundaries
+        logs = list(TLLog.objects.order_by('pk'))
+        now = timezone.now()
+        TLLog.objects.filter(pk__in=[log.pk for log in logs[:7]]).update(timestamp=now)
+        TLLog.objects.filter(pk__in=[log.pk for log in logs[7:]]).update(timestamp=now - timedelta(days=1))
+        cls.expected = list(TLLog.objects.order_by('-timestamp', '-pk').values_list('pk', flat=True))
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(TLLog.objects.all(), 5, 'timestamp')
+
+    @staticmethod
+    def pks(page):
+        return [log.pk for log in page]
+
+    def test_next_pages(self):
+        page = self.paginator.page()
+        self.assertFalse(page.has_previous)
+        pages = [self.pks(page)]
+        while page.has_next:
+            page = self.paginator.page(after=page.next_cursor)
+            self.assertTrue(page.has_previous)
+            pages.append(self.pks(page))
+        self.assertListEqual([pk for pks in pages for pk in pks], self.expected)
+        self.assertListEqual([len(pks) for pks in pages], [5, 5, 2])
+
+    def test_previous_pages(self):
+        page = self.paginator.page(last=True)
+        self.assertFalse(page.has_next)
+        pages = [self.pks(page)]
+        while page.has_previous:
+            page = self.paginator.page(before=page.previous_cursor)
+            self.assertTrue(page.has_next)
+            pages.insert(0, self.pks(page))
+        self.assertListEqual(pages[-1], self.expected[-5:])
+        # the first page is always a full page
+        self.assertListEqual(pages[0], self.expected[:5])
+        self.assertSetEqual({pk for pks in pages for pk in pks}, set(self.expected))
+
+    def test_back_and_forth(self):
+        second = self.paginator.page(after=self.paginator.page().next_cursor)
+        third = self.paginator.page(after=second.next_cursor)
+        self.assertListEqual(self.pks(self.paginator.page(before=third.previous_cursor)), self.pks(second))
+        self.assertListEqual(self.pks(self.paginator.page(before=second.previous_cursor)), self.expected[:5])
+
+
+class StudentImportTest(TestCase):
+    """
+        The import validates the whole file first, invalid rows are counted and skipped and the valid ones are written
+        all at once or not at all
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cohort = seed_cohort(projects=2, students_per_project=1, intervals=1, logs_per_project=0)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.cohort.orga)
+
+    def import_students(self, rows):
+        lines = ["ID;Name;E-Mail-Adresse;Gruppe"] + [";".join(row) for row in rows]
+        csv_file = SimpleUploadedFile("students.csv", "\n".join(lines).encode("utf-8"), content_type="text/csv")
+        return self.client.post(reverse("bp:student_import"), {'csvfile': csv_file}, follow=True)
+
+    def test_invalid_rows_are_not_written(self):
+        existing = self.cohort.student.moodle_id
+        response = self.import_students([
+            ["new-1", "Neu 1", "neu1@example.org", "1"],
+            ["new-2", "Neu 2", "keine Adresse", "1"],
+            ["new-3", "Neu 3", "neu3@example.org", "99"],
+            [existing, "Doppelt", "doppelt@example.org", "1"],
+            ["new-1", "Doppelt in der Datei", "neu1@example.org", "2"],
+        ])
+        self.assertListEqual(list(Student.objects.filter(moodle_id__startswith="new-").values_list('name', flat=True)),
+                             ["Neu 1"])
+        self.assertEqual(Student.objects.filter(moodle_id=existing).count(), 1)
+        texts = [str(message) for message in response.context["messages"]]
+        self.assertIn("1 Teilnehmer erfolgreich importiert", texts)
+        self.assertIn("1 Zeile(n) ignoriert wegen: Ungültiger Wert für 'E-Mail-Adresse'", texts)
+        self.assertIn("1 Zeile(n) ignoriert wegen: Teilnehmer existiert nicht", texts)
+        self.assertIn("2 Zeile(n) ignoriert wegen: Teilnehmer existiert bereits", texts)
+
+    def test_failed_write_writes_nothing(self):
+        bulk_create = Student.objects.bulk_create
+
+        def fail_after_first_batch(objs, batch_size=None, **kwargs):
+            # like a concurrent import of the same rows: the first batch is written, the second one conflicts
+            bulk_create(objs[:1], **kwargs)
+            raise IntegrityError("UNIQUE constraint failed: bp_student.moodle_id")
+
+        count = Student.objects.count()
+        with mock.patch.object(Student.objects, 'bulk_create', side_effect=fail_after_first_batch):
+            response = self.import_students([["new-1", "Neu 1", "neu1@example.org", "1"],
+                                             ["new-2", "Neu 2", "neu2@example.org", "2"]])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Student.objects.count(), count)
+        self.assertTrue(any("es wurde nichts importiert" in str(message).lower()
+                            for message in response.context["messages"]))
+
+
+class GradeAnnotationTest(TestCase):
+    # AG points before and after the deadline, pitch and documentation points (None: not graded)
+    GRADES = [
+        (80, None, "18.5", "20"),  # 118.5: close to 3.0
+        (80, None, "20", "21"),  # 121
+        (70, None, "10", "15"),  # 95: failed
+        (100, None, "20", "69.5"),  # 189.5: already 1.0
+        (90, None, "18.5", "80"),  # 188.5: close to 1.0
+        (50, 90, "9", "10"),  # 109 with the grade after the deadline
+        (0, None, "20", "80"),  # no AG points
+        (None, None, "20", "80"),  # not graded by the AG
+        (80, None, "18.5", None),  # documentation not graded
+        (100, None, "8.75", "0.5"),  # 109.25
+        (100, None, "0.25", "8.5"),  # 108.75
+        (100, None, "0.25", "8.25"),  # 108.5
+        (100, None, "0.5", "7.5"),  # 108: not close enough
+    ]
+
+    def setUp(self):
+        seed_cohort(projects=len(self.GRADES), graded_share=0)
+        self.projects = list(Project.get_active().order_by('pk'))
+        for project, (before, after, pitch, docs) in zip(self.projects, self.GRADES):
+            if before is not None:
+                AGGradeBeforeDeadline.objects.create(project=project, ag_points=before,
+                                                     ag_points_justification="Vorher")
+            if after is not None:
+                project.ag_grade = AGGradeAfterDeadline.objects.create(project=project, ag_points=after,
+                                                                       ag_points_justification="Nachher")
+                project.save()
+            if pitch is not None:
+                PitchGrade.objects.create(project=project, grade_points=Decimal(pitch), grade_notes="")
+            if docs is not None:
+                DocsGrade.objects.create(project=project, grade_points=Decimal(docs), grade_notes="")
+
+    def test_annotations_match_properties(self):
+        annotated = {project.pk: project for project in Project.get_active().with_grades()}
+        for project in Project.get_active().order_by('pk'):
+            with self.subTest(project=project.nr):
+                grades = annotated[project.pk]
+                self.assertEqual(grades.current_ag_points, project.ag_points)
+                self.assertEqual(grades.points_total, project.total_points)
+                self.assertEqual(grades.points_bucket, round(project.total_points) // 10 * 10)
+                self.assertEqual(grades.grade, project.grade)
+
+    def test_close_to_higher_grade_matches_property(self):
+        expected = {project.nr for project in Project.get_active() if project.grade_close_to_higher_grade}
+        self.assertEqual({project.nr for project in Project.get_active().close_to_higher_grade()}, expected)
+        self.assertEqual(expected, {self.projects[nr].nr for nr in [0, 4, 5, 9, 10, 11]})
+
+
+class PeerGroupSolverTest(TestCase):
+    @staticmethod
+    def solvable_projects(peer_groups=10, size=3, seed=0):
+        """
+        :return: projects that can be split into peer groups without conflicts: the k-th project of the g-th
+            peer group has TL g + k and AG g + size * k (modulo the number of peer groups), every TL and AG has
+            size projects
+        :rtype: list of SimpleNamespace
+        """
+        projects = [SimpleNamespace(pk=g * size + k, tl_id=(g + k) % peer_groups,
+                                    ag_mail=f"AG{(g + size * k) % peer_groups}@example.org")
+                    for g in range(peer_groups) for k in range(size)]
+        random.Random(seed).shuffle(projects)
+        return projects
+
+    @staticmethod
+    def pks(solution):
+        return [sorted(project.pk for project in peer_group) for peer_group in solution.peer_groups]
+
+    def test_no_conflicts_if_possible(self):
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                projects = self.solvable_projects(seed=seed)
+                solution = solve_peer_groups(projects, 3, 1_000, seed=seed)
+                self.assertTrue(solution.is_valid)
+                self.assertListEqual(solution.violated_peer_groups(), [])
+                self.assertListEqual([len(peer_group) for peer_group in solution.peer_groups], [3] * 10)
+                self.assertListEqual(sorted(pk for pks in self.pks(solution) for pk in pks), list(range(30)))
+
+    def test_minimum_violations_if_impossible(self):
+        # all projects of one AG: every peer group of two has a conflict
+        projects = [SimpleNamespace(pk=i, tl_id=i, ag_mail="ag@example.org") for i in range(6)]
+        solution = solve_peer_groups(projects, 2, 100, seed=0)
+        self.assertFalse(solution.is_valid)
+        self.assertEqual(solution.violations, 3)
+        self.assertListEqual(solution.violated_peer_groups(), [0, 1, 2])
+
+    def test_counted_violations_after_local_search(self):
+        # random cohorts with few TLs and AGs (the greedy assignment leaves conflicts): the violations maintained
+        # incrementally by the swaps must equal the conflicting pairs of the returned peer groups
+        for seed in range(10):
+            rng = random.Random(seed)
+            projects = [SimpleNamespace(pk=i, tl_id=rng.randrange(4), ag_mail=f"AG{rng.randrange(5)}@example.org")
+                        for i in range(45)]
+            solution = solve_peer_groups(projects, 3, 200, seed=seed)
+            with self.subTest(seed=seed, iterations=solution.iterations):
+                pairs = sum(1 for peer_group in solution.peer_groups
+                            for i, a in enumerate(peer_group) for b in peer_group[i + 1:]
+                            if a.tl_id == b.tl_id or a.ag_mail == b.ag_mail)
+                self.assertEqual(solution.violations, pairs)
+
+    def test_deterministic_for_seed(self):
+        projects = self.solvable_projects(peer_groups=20, size=4)
+        first = solve_peer_groups(projects, 4, 1_000, seed=42)
+        second = solve_peer_groups(projects, 4, 1_000, seed=42)
+        self.assertListEqual(self.pks(first), self.pks(second))
+        self.assertEqual(first.iterations, second.iterations)
+
+
+@override_settings(LOG_REMINDER_HOURS=(2, 6), LOG_REMINDER_INTERVAL_DAYS=1, SEND_MAILS_FROM="bp@example.org",
+                   SEND_MAILS_TO="orga@example.org")
+class LogReminderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cohort = seed_cohort(projects=5, students_per_project=1, intervals=1, logs_per_project=0,
+                                 graded_share=0)
+
+    @staticmethod
+    def at(day, hour, minute=0, second=0, microsecond=0):
+        return timezone.make_aware(datetime(2026, 10, day, hour, minute, second, microsecond))
+
+    def not_due_reason(self, now):
+        with mock.patch.object(timezone, 'now', return_value=now):
+            return SendLogReminders.not_due_reason()
+
+    def test_one_run_at_a_time(self):
+        run = ReminderRun.start(7)
+        self.assertIsNotNone(run)
+        self.assertIsNone(ReminderRun.start(7))
+        run.finish()
+        self.assertIsNotNone(ReminderRun.start(7))
+
+    def test_dry_run_without_lock(self):
+        dry_run = ReminderRun.start(7, dry_run=True)
+        self.assertIsNotNone(dry_run)
+        run = ReminderRun.start(7)
+        self.assertIsNotNone(run)
+        self.assertIsNotNone(ReminderRun.start(7, dry_run=True))
+        self.assertIsNone(ReminderRun.start(7))
+
+    def test_first_run_of_every_window(self):
+        self.assertIsNone(self.not_due_reason(self.at(10, 2)))
+        self.assertIsNotNone(self.not_due_reason(self.at(10, 1, 59)))
+        self.assertIsNotNone(self.not_due_reason(self.at(10, 6)))
+
+        ReminderRun.objects.create(started=self.at(10, 2, 0, 0, 500), status=ReminderRun.SUCCEEDED, period=7)
+        self.assertIsNotNone(self.not_due_reason(self.at(10, 3)))
+        # earlier in the hour than the last run, still due
+        self.assertIsNone(self.not_due_reason(self.at(11, 2, 0, 0, 300)))
+
+        ReminderRun.objects.create(started=self.at(11, 2, 0, 0, 300), status=ReminderRun.SUCCEEDED, period=7)
+        ReminderRun.objects.create(started=self.at(12, 2), status=ReminderRun.FAILED, period=7)
+        ReminderRun.objects.create(started=self.at(12, 2), status=ReminderRun.SUCCEEDED, period=7, dry_run=True)
+        self.assertIsNone(self.not_due_reason(self.at(12, 3)))
+
+    @override_settings(LOG_REMINDER_INTERVAL_DAYS=2)
+    def test_interval_of_days(self):
+        ReminderRun.objects.create(started=self.at(10, 5), status=ReminderRun.SUCCEEDED, period=7)
+        self.assertIsNotNone(self.not_due_reason(self.at(11, 2)))
+        self.assertIsNone(self.not_due_reason(self.at(12, 2)))
+
+    def test_sent_in_chunks(self):
+        tls = TL.objects.filter(bp=self.cohort.bp, project__isnull=False).distinct().count()
+        with mock.patch('bp.management.commands.send_log_reminders.send_reminders', wraps=send_reminders) as send:
+            call_command('send_log_reminders', force=True, chunk_size=2, stdout=StringIO())
+        self.assertEqual(send.call_count, (tls + 1) // 2)
+        self.assertTrue(all(len(reminders) <= 2 for (reminders, _), _ in send.call_args_list))
+
+        run = ReminderRun.get_last_successful()
+        self.assertEqual((run.tls_reminded, run.projects_reminded), (tls, 5))
+        self.assertEqual(QueuedMail.objects.count(), tls)
+
+        # reminded just now
+        call_command('send_log_reminders', force=True, stdout=StringIO())
+        self.assertEqual(ReminderRun.get_last_successful().tls_reminded, 0)
+        self.assertEqual(QueuedMail.objects.count(), tls)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', MAIL_QUEUE_MAX_ATTEMPTS=3,
+                   MAIL_QUEUE_RETRY_DELAY_SECONDS=60)
+class QueuedMailTest(TestCase):
+    @staticmethod
+    def message(nr=1):
+        return EmailMessage(f"Betreff {nr}", "Inhalt", "bp@example.org", [f"tl{nr}@example.org"],
+                            reply_to=["orga@example.org"])
+
+    @staticmethod
+    def send_queued_mails(**options):
+        call_command('send_queued_mails', stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_sent_by_command(self):
+        queued = QueuedMail.enqueue(self.message())
+        self.assertEqual(len(mail.outbox), 0)
+        self.send_queued_mails()
+        self.assertEqual([(m.subject, m.to, m.reply_to) for m in mail.outbox],
+                         [("Betreff 1", ["tl1@example.org"], ["orga@example.org"])])
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (QueuedMail.SENT, 1))
+        self.send_queued_mails()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_batch_sent_over_one_connection(self):
+        QueuedMail.enqueue_all([self.message(nr) for nr in range(5)])
+        with mock.patch('bp.management.commands.send_queued_mails.get_connection', wraps=get_connection) as connect:
+            self.send_queued_mails(batch_size=3)
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual([m.subject for m in mail.outbox], [f"Betreff {nr}" for nr in range(3)])
+        self.assertEqual(QueuedMail.objects.filter(status=QueuedMail.PENDING).count(), 2)
+
+    def test_claimed_mails_not_sent_twice(self):
+        QueuedMail.enqueue_all([self.message(nr) for nr in range(3)])
+        # claimed by another process
+        claimed = QueuedMail.claim_due(2)
+        self.assertEqual(len(claimed), 2)
+        self.send_queued_mails()
+        self.assertEqual([m.subject for m in mail.outbox], ["Betreff 2"])
+        self.assertEqual(QueuedMail.claim_due(5), [])
+
+        # the other process did not finish in time
+        expired = timezone.now() + timedelta(seconds=settings.MAIL_QUEUE_CLAIM_TIMEOUT_SECONDS + 1)
+        with mock.patch.object(timezone, 'now', return_value=expired):
+            self.assertEqual({m.pk for m in QueuedMail.claim_due(5)}, {m.pk for m in claimed})
+
+    def test_backoff_and_dead_letter(self):
+        queued = QueuedMail.enqueue(self.message())
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=ConnectionRefusedError("Verbindung abgelehnt")):
+            for attempt, delay in [(1, 60), (2, 120)]:
+                before = timezone.now()
+                self.send_queued_mails()
+                queued.refresh_from_db()
+                self.assertEqual((queued.status, queued.attempts), (QueuedMail.PENDING, attempt))
+                self.assertGreaterEqual(queued.next_attempt, before + timedelta(seconds=delay))
+                self.assertEqual(queued.last_error, "Verbindung abgelehnt")
+                # not due before the delay
+                self.assertEqual(QueuedMail.claim_due(1), [])
+                QueuedMail.objects.filter(pk=queued.pk).update(next_attempt=timezone.now())
+
+            self.send_queued_mails()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (QueuedMail.FAILED, 3))
+        self.send_queued_mails()
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class StubSession:
+    """
+        Instead of requests.Session: answers GET requests with the given function of the page number
+    """
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.requested = []
+
+    def get(self, url, timeout):
+        page = int(parse_qs(urlsplit(url).query).get('page', ["1"])[0])
+        self.requested.append(page)
+        status, body = self.answer(page)
+        if isinstance(status, Exception):
+            raise status
+        return SimpleNamespace(status_code=status, text=json.dumps(body))
+
+
+@override_settings(PRETIX_CACHE_TTL_SECONDS=24 * 60 * 60, PRETIX_CACHE_MAX_STALE_SECONDS=3 * 24 * 60 * 60)
+class PretixTest(TestCase):
+    EVENT = "ag-event"
+
+    @staticmethod
+    def order(code, secret="geheim"):
+        return {"code": code, "secret": secret, "email": "ag@example.org",
+                "positions": [{"attendee_name": "AG", "answers": [{"question_identifier": "JGSNWU7J",
+                                                                    "answer": "Projekt"}]}]}
+
+    @staticmethod
+    def pretix_client(answer):
+        client = PretixClient(token="token", max_workers=3)
+        client.session = StubSession(answer)
+        return client
+
+    def paginated(self, count=7, per_page=2, failing_page=None):
+        def answer(page):
+            # later pages answer faster, so they are complete before the earlier ones
+            time.sleep(0.01 * (count // per_page + 1 - page))
+            if page == failing_page:
+                return 500, {}
+            results = [self.order(f"O{nr}") for nr in range((page - 1) * per_page, min(page * per_page, count))]
+            next_url = f"http://localhost/api/v1/organizers/o/events/{self.EVENT}/orders/?page={page + 1}"
+            return 200, {"count": count, "next": next_url if page * per_page < count else None, "results": results}
+        return answer
+
+    def get_order(self, answer):
+        with mock.patch('bp.pretix.get_client', return_value=self.pretix_client(answer)):
+            return get_order("O1", self.EVENT)
+
+    @classmethod
+    def cache_order(cls, age_hours, secret="alt"):
+        PretixOrder.objects.create(event=cls.EVENT, code="O1", secret=secret,
+                                   fetched=timezone.now() - timedelta(hours=age_hours))
+
+    @staticmethod
+    def cache_order_age(hours):
+        PretixOrder.objects.filter(code="O1").update(fetched=timezone.now() - timedelta(hours=hours))
+
+    def test_entries_in_order_of_pages(self):
+        client, codes = self.pretix_client(self.paginated()), []
+        client.load_entries(pretix_url("orders/", self.EVENT), lambda result: codes.append(result["code"]))
+        self.assertEqual(codes, [f"O{nr}" for nr in range(7)])
+        self.assertEqual(sorted(client.session.requested), [1, 2, 3, 4])
+
+    def test_no_callback_if_a_page_fails(self):
+        client, codes = self.pretix_client(self.paginated(failing_page=3)), []
+        with self.assertRaises(PretixError):
+            client.load_entries(pretix_url("orders/", self.EVENT), lambda result: codes.append(result["code"]))
+        self.assertEqual(codes, [])
+
+    def test_cached_for_ttl(self):
+        self.cache_order(age_hours=23)
+        self.assertEqual(self.get_order(lambda page: self.fail("pretix requested")).secret, "alt")
+
+        self.cache_order_age(hours=25)
+        self.assertEqual(self.get_order(lambda page: (200, self.order("O1", "neu"))).secret, "neu")
+        self.assertTrue(PretixOrder.objects.get(code="O1").is_fresh)
+
+    def test_outdated_copy_if_unavailable(self):
+        self.cache_order(age_hours=25)
+        for failure in [requests.ConnectionError("abgelehnt"), requests.Timeout("Zeitüberschreitung"), 503]:
+            with self.subTest(failure=failure):
+                self.assertEqual(self.get_order(lambda page: (failure, {})).secret, "alt")
+
+        self.cache_order_age(hours=73)
+        with self.assertRaises(PretixError):
+            self.get_order(lambda page: (requests.ConnectionError("abgelehnt"), {}))
+
+    def test_no_outdated_copy_for_other_errors(self):
+        self.cache_order(age_hours=25)
+        with self.assertRaises(PretixError):
+            self.get_order(lambda page: (403, {}))
+        self.assertTrue(PretixOrder.objects.filter(code="O1").exists())
+
+    def test_deleted_order(self):
+        self.cache_order(age_hours=25)
+        with self.assertRaises(PretixNotFoundError):
+            self.get_order(lambda page: (404, {}))
+        self.assertFalse(PretixOrder.objects.filter(code="O1").exists())
+
+
+@override_settings(DATABASE_LOCK_RETRIES=2, DATABASE_LOCK_RETRY_DELAY_SECONDS=0.001)
+class RetryOnLockTest(SimpleTestCase):
+    def setUp(self):
+        lock_statistics.reset()
+
+    @staticmethod
+    def write_path(*errors):
+        """
+        :return: write path raising the given errors, one per call, and succeeding afterwards
+        """
+        errors = list(errors)
+
+        @retry_on_lock
+        def write():
+            write.calls += 1
+            if errors:
+                raise errors.pop(0)
+            return "geschrieben"
+        write.calls = 0
+        return write
+
+    def test_retried_once(self):
+        write = self.write_path(OperationalError("database is locked"))
+        self.assertEqual(write(), "geschrieben")
+        self.assertEqual(write.calls, 2)
+        counts = lock_statistics.snapshot()[write.__qualname__]
+        self.assertEqual({name: counts[name] for name in ['calls', 'locked', 'retries', 'failures']},
+                         {'calls': 1, 'locked': 1, 'retries': 1, 'failures': 0})
+        self.assertGreater(counts['wait_seconds'], 0)
+
+    def test_failed_after_all_retries(self):
+        write = self.write_path(*[OperationalError("database is locked")] * 3)
+        with self.assertRaisesMessage(OperationalError, "locked"), self.assertLogs('bp.database', 'WARNING'):
+            write()
+        self.assertEqual(write.calls, 3)
+        counts = lock_statistics.snapshot()[write.__qualname__]
+        self.assertEqual((counts['calls'], counts['retries'], counts['failures']), (1, 2, 1))
+
+    def test_other_errors_not_retried(self):
+        write = self.write_path(OperationalError("no such table: bp_tllog"))
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(write.calls, 1)
+        self.assertEqual(lock_statistics.snapshot(), {})
+
+    def test_contention_of_thread(self):
+        self.write_path()()
+        locks = lock_statistics.track_thread()
+        write = self.write_path(OperationalError("database is locked"))
+        write()
+        # only the calls since tracking started
+        self.assertEqual(list(locks), [write.__qualname__])
+        self.assertEqual((locks[write.__qualname__]['calls'], locks[write.__qualname__]['retries']), (1, 1))
+        self.assertEqual(lock_statistics.snapshot()[write.__qualname__]['calls'], 2)
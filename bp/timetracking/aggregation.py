@@ -0,0 +1,124 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import F, Sum
+
+from .models import TimeTrackingRollup
+
+
+class HoursSummary:
+    """
+        Tracked hours of a single project, broken down by student and category.
+
+        Only hours of students that are (still) members of the project are counted,
+        which matches the semantics of Student.total_hours.
+    """
+
+    def __init__(self):
+        self.by_student_and_category = defaultdict(Decimal)
+
+    def add(self, student_id, category_id, hours):
+        self.by_student_and_category[(student_id, category_id)] += hours
+
+    @property
+    def total(self):
+        return round(sum(self.by_student_and_category.values(), Decimal(0)), 2)
+
+    def of_student(self, student):
+        student_id = getattr(student, 'pk', student)
+        return round(sum((hours for (s, _), hours in self.by_student_and_category.items() if s == student_id),
+                         Decimal(0)), 2)
+
+    def of_category(self, category):
+        category_id = getattr(category, 'pk', category)
+        return round(sum((hours for (_, c), hours in self.by_student_and_category.items() if c == category_id),
+                         Decimal(0)), 2)
+
+    @staticmethod
+    def for_projects(project_ids):
+        """
+        Compute the hour summaries of the given projects with a single grouped query
+
+        :param project_ids: primary keys of the projects of interest
+        :type project_ids: iterable of int
+        :return: summary for each requested project (projects without entries get an empty summary)
+        :rtype: dict of int to HoursSummary
+        """
+        summaries = {pk: HoursSummary() for pk in project_ids}
+        if not summaries:
+            return summaries
+        totals = TimeTrackingRollup.objects \
+            .filter(project__in=summaries.keys(), student__project=F('project')) \
+            .values('project', 'student', 'category') \
+            .annotate(hours=Sum('hours')) \
+            .order_by()
+        for total in totals:
+            summaries[total['project']].add(total['student'], total['category'], total['hours'])
+        return summaries
+
+    @staticmethod
+    def attach(projects):
+        """
+        Attach the hour summaries to the given project instances as ``hours_summary``
+
+        :param projects: fetched project instances
+        :type projects: list of Project
+        """
+        summaries = HoursSummary.for_projects(p.pk for p in projects)
+        for project in projects:
+            project.hours_summary = summaries[project.pk]
+
+
+class HoursPivot:
+    """
+        Hours of time tracking entries or totals pivoted along two dimensions (e.g. interval × student),
+        loaded with a single grouped query and stored as a dense matrix.
+
+        Example Usage:
+        totals = TimeTrackingRollup.objects.filter(project=project)
+        pivot = HoursPivot(totals, rows=intervals, columns=students, row_field='interval', column_field='student')
+        pivot.cell(student, interval)  # hours of student in interval
+        pivot.column_totals            # hours of each student in all given intervals
+    """
+
+    def __init__(self, entries, *, rows, columns, row_field, column_field):
+        """
+        :param entries: time tracking entries or totals to be aggregated
+        :type entries: QuerySet of TimeTrackingEntry or TimeTrackingRollup
+        :param rows: objects (usually model instances) labelling the rows
+        :param columns: objects (usually model instances) labelling the columns
+        :param row_field: name of the entry field the rows are taken from
+        :type row_field: str
+        :param column_field: name of the entry field the columns are taken from
+        :type column_field: str
+        """
+        self.rows = list(rows)
+        self.columns = list(columns)
+        self._row_index = {getattr(row, 'pk', row): i for i, row in enumerate(self.rows)}
+        self._column_index = {getattr(column, 'pk', column): j for j, column in enumerate(self.columns)}
+
+        self.matrix = [[Decimal(0) for _ in self.columns] for _ in self.rows]
+        cells = entries.values(row_field, column_field).annotate(hours=Sum('hours')).order_by()
+        for cell in cells:
+            i, j = self._row_index.get(cell[row_field]), self._column_index.get(cell[column_field])
+            if i is not None and j is not None:
+                self.matrix[i][j] += cell['hours']
+        self.matrix = [[round(hours, 2) for hours in row] for row in self.matrix]
+
+    def cell(self, column, row):
+        """
+        Hours in the given cell, the argument order matches TimeTable's entry function
+        """
+        return self.matrix[self._row_index[getattr(row, 'pk', row)]][self._column_index[getattr(column, 'pk', column)]]
+
+    @property
+    def row_totals(self):
+        return [round(sum(row, Decimal(0)), 2) for row in self.matrix]
+
+    @property
+    def column_totals(self):
+        return [round(sum((row[j] for row in self.matrix), Decimal(0)), 2) for j in range(len(self.columns))]
+
+    @property
+    def total(self):
+        return round(sum(self.row_totals, Decimal(0)), 2)
@@ -190,12 +190,8 @@ class TLTimeIntervalEntryCorrectionForm(forms.ModelForm):
         return cleaned_data
 
     def save(self):
-        obj, created = TimeTrackingEntry.objects.update_or_create(student=self.cleaned_data['student'],
-                                                                  interval=self.cleaned_data['interval'],
-                                                                  category=self.cleaned_data['category'],
-                                                                  defaults={'hours': self.cleaned_data['hours']})
-
-        self.instance = obj
+        self.instance = TimeTrackingEntry.set_hours(self.cleaned_data['student'], self.cleaned_data['interval'],
+                                                    self.cleaned_data['category'], self.cleaned_data['hours'])
 
 
 class ProjectPitchPointsUpdateForm(forms.ModelForm):
@@ -1,18 +1,35 @@
 from datetime import date, timedelta
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Sum
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from bp.cache import cache_key, get_cached, REFERENCE_DATA
+from bp.database import retry_on_lock
 
 class TimeInterval(models.Model):
     class Meta:
         verbose_name = "Intervall für Zeiterfassung"
         verbose_name_plural = "Intervalle für Zeiterfassung"
         ordering = ['group', 'name']
+        indexes = [
+            # past and current intervals of a project
+            models.Index(fields=['group', 'start'], name='bp_interval_group_start_idx'),
+        ]
 
     name = models.CharField(verbose_name="Intervallname", max_length=50, blank=True)
     start = models.DateField(verbose_name="Beginn des Intervalls")
     end = models.DateField(verbose_name="Ende des Intervalls")
     group = models.ForeignKey("Project", on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Projekt")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # project as stored in the database, to detect changes (see update_rollup_of_interval_receiver)
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        return instance
+
     def is_editable_by_students(self):
         return date.today() <= self.end + timedelta(days=21)
 
@@ -30,6 +47,25 @@ class TimeSpentCategory(models.Model):
 
     name = models.CharField(verbose_name="Name", max_length=50)
 
+    @staticmethod
+    def get_all():
+        """
+        :return: all categories (cached, since they are needed for every time table)
+        :rtype: list of TimeSpentCategory
+        """
+        return get_cached(cache_key(REFERENCE_DATA, "timespentcategories"),
+                          lambda: list(TimeSpentCategory.objects.order_by('pk')))
+
+    @staticmethod
+    def get_by_name(name):
+        """
+        :param name: name of the category
+        :type name: str
+        :return: first category with the given name (if any)
+        :rtype: TimeSpentCategory
+        """
+        return next((category for category in TimeSpentCategory.get_all() if category.name == name), None)
+
     def __str__(self):
         return f"{self.name}"
 
@@ -37,11 +73,258 @@ class TimeTrackingEntry(models.Model):
     class Meta:
         verbose_name = "Eintrag für Zeiterfassung"
         verbose_name_plural = "Einträge für Zeiterfassung"
+        # one entry per student, interval and category (see set_hours), also used as index for these lookups
+        unique_together = [('interval', 'student', 'category')]
 
     hours = models.DecimalField(verbose_name="Stunden (h)", max_digits=5, decimal_places=2)
     category = models.ForeignKey(TimeSpentCategory, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Kategorie")
     interval = models.ForeignKey(TimeInterval, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Zeitintervall")
     student = models.ForeignKey("Student", on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Teammitglied")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_stored_values()
+        return instance
+
+    def remember_stored_values(self):
+        """
+        Remember the values as stored in the database, so that the receivers can apply
+        the difference to TimeTrackingRollup when the entry is saved or deleted
+        """
+        self._stored_values = (self.student_id, self.interval_id, self.category_id, self.hours)
+
+    @staticmethod
+    @retry_on_lock
+    def set_hours(student, interval, category, hours):
+        """
+        Set the hours a student spent on a category in an interval.
+        The entry is created if necessary and TimeTrackingRollup is updated (by the receivers) in the same transaction.
+
+        :return: the updated entry
+        :rtype: TimeTrackingEntry
+        """
+        with transaction.atomic():
+            entry, created = TimeTrackingEntry.objects.select_for_update().get_or_create(student=student,
+                                                                                         interval=interval,
+                                                                                         category=category,
+                                                                                         defaults={'hours': 0})
+            # the given instances instead of loading them again (e.g. the project of the interval by the receiver)
+            entry.student, entry.interval, entry.category = student, interval, category
+            entry.hours = hours
+            entry.save()
+        return entry
+
+    @staticmethod
+    @retry_on_lock
+    def set_hours_of_cells(student, cells):
+        """
+        Set the hours of several cells of a student's time table at once (see set_hours).
+        The entries and TimeTrackingRollup are upserted in bulk in a single transaction,
+        so the number of queries does not depend on the number of cells
+        (bulk operations send no signals, so the totals are updated here instead of by the receivers).
+
+        :param student: student who spent the hours
+        :type student: Student
+        :param cells: hours for each interval and category
+        :type cells: dict of (TimeInterval, TimeSpentCategory) to Decimal
+        :return: the updated entries (in the order of the cells)
+        :rtype: list of TimeTrackingEntry
+        """
+        with transaction.atomic():
+            existing = TimeTrackingEntry.objects.select_for_update().filter(
+                student=student, interval__in={interval for interval, _ in cells},
+                category__in={category for _, category in cells})
+            entries = {(entry.interval_id, entry.category_id): entry for entry in existing}
+            changed, created, deltas, updated = [], [], {}, []
+            for (interval, category), hours in cells.items():
+                entry = entries.get((interval.pk, category.pk))
+                if entry is None:
+                    entry = TimeTrackingEntry(student=student, interval=interval, category=category, hours=0)
+                    created.append(entry)
+                else:
+                    # the given instances instead of loading them again
+                    entry.interval, entry.category = interval, category
+                    if entry.hours != hours:
+                        changed.append(entry)
+                deltas[(interval, category)] = hours - entry.hours
+                entry.hours = hours
+                updated.append(entry)
+            TimeTrackingEntry.objects.bulk_update(changed, ['hours'])
+            TimeTrackingEntry.objects.bulk_create(created)
+            TimeTrackingRollup.add_hours_of_cells(student, deltas)
+        for entry in updated:
+            entry.remember_stored_values()
+        return updated
+
     def __str__(self):
         return f"{self.interval}: Eintrag von {self.student}"
+
+
+class TimeTrackingRollup(models.Model):
+    """
+        Current hour totals per project, student, interval and category.
+
+        Maintained incrementally whenever an entry is saved or deleted (see the receivers below), so that hour totals
+        can be read without aggregating over all entries. The project is the one of the interval, membership of the
+        students is checked when reading (e.g. HoursSummary), so moving a student to another project needs no update.
+        Updates of entries by QuerySet.update() are not tracked; the totals can be rebuilt and verified with the
+        management command rebuild_timetracking_rollup.
+    """
+    class Meta:
+        verbose_name = "Summe für Zeiterfassung"
+        verbose_name_plural = "Summen für Zeiterfassung"
+        unique_together = [('project', 'student', 'interval', 'category')]
+
+    project = models.ForeignKey("Project", on_delete=models.CASCADE, verbose_name="Projekt")
+    student = models.ForeignKey("Student", on_delete=models.CASCADE, verbose_name="Teammitglied")
+    interval = models.ForeignKey(TimeInterval, on_delete=models.CASCADE, verbose_name="Zeitintervall")
+    category = models.ForeignKey(TimeSpentCategory, on_delete=models.SET_NULL, blank=True, null=True,
+                                 verbose_name="Kategorie")
+    hours = models.DecimalField(verbose_name="Stunden (h)", max_digits=7, decimal_places=2, default=0)
+
+    @staticmethod
+    def add_hours(project_id, student_id, interval_id, category_id, delta):
+        """
+        Add the change of the hours of an entry to its total (given as primary keys)
+        """
+        if not delta or project_id is None or student_id is None or interval_id is None:
+            return
+        key = {'project_id': project_id, 'student_id': student_id, 'interval_id': interval_id,
+               'category_id': category_id}
+        if TimeTrackingRollup.objects.filter(**key).update(hours=F('hours') + delta):
+            return
+        try:
+            with transaction.atomic():
+                TimeTrackingRollup.objects.create(**key, hours=delta)
+        except IntegrityError:
+            # created by a concurrent first write of the same cell in the meantime
+            TimeTrackingRollup.objects.filter(**key).update(hours=F('hours') + delta)
+
+    @staticmethod
+    def add_hours_of_cells(student, deltas):
+        """
+        Bulk version of add_hours (the totals are locked, so it must be called within a transaction)
+
+        :param student: student who spent the hours
+        :type student: Student
+        :param deltas: change of the hours for each interval and category
+        :type deltas: dict of (TimeInterval, TimeSpentCategory) to Decimal
+        """
+        deltas = {(interval, category): delta for (interval, category), delta in deltas.items()
+                  if delta and interval.group_id is not None}
+        if not deltas or student is None:
+            return
+        existing = TimeTrackingRollup.objects.select_for_update().filter(
+            student=student, interval__in={interval for interval, _ in deltas},
+            category__in={category for _, category in deltas})
+        rollups = {(rollup.project_id, rollup.interval_id, rollup.category_id): rollup for rollup in existing}
+        changed, created = [], []
+        for (interval, category), delta in deltas.items():
+            rollup = rollups.get((interval.group_id, interval.pk, category.pk))
+            if rollup is None:
+                created.append(TimeTrackingRollup(project_id=interval.group_id, student=student, interval=interval,
+                                                  category=category, hours=delta))
+            else:
+                rollup.hours += delta
+                changed.append(rollup)
+        TimeTrackingRollup.objects.bulk_update(changed, ['hours'])
+        TimeTrackingRollup.objects.bulk_create(created)
+
+    @staticmethod
+    def totals_from_entries(intervals=None):
+        """
+        Aggregate the raw entries to the granularity of this model
+
+        :param intervals: restrict to these intervals, all intervals if None
+        :return: hours for each (project, student, interval, category) key (given as primary keys)
+        :rtype: dict of (int, int, int, int) to Decimal
+        """
+        entries = TimeTrackingEntry.objects.filter(interval__group__isnull=False, student__isnull=False)
+        if intervals is not None:
+            entries = entries.filter(interval__in=intervals)
+        totals = entries.values('interval__group', 'student', 'interval', 'category') \
+            .annotate(total=Sum('hours')).order_by()
+        return {(t['interval__group'], t['student'], t['interval'], t['category']): t['total'] for t in totals}
+
+    @staticmethod
+    def rebuild(intervals=None):
+        """
+        Recompute the totals from the raw entries
+
+        :param intervals: restrict to these intervals, all intervals if None
+        :return: number of totals written
+        :rtype: int
+        """
+        with transaction.atomic():
+            totals = TimeTrackingRollup.totals_from_entries(intervals)
+            rollups = TimeTrackingRollup.objects.all()
+            if intervals is not None:
+                rollups = rollups.filter(interval__in=intervals)
+            rollups.delete()
+            TimeTrackingRollup.objects.bulk_create(
+                [TimeTrackingRollup(project_id=project, student_id=student, interval_id=interval,
+                                    category_id=category, hours=hours)
+                 for (project, student, interval, category), hours in totals.items()],
+                batch_size=500)
+        return len(totals)
+
+    def __str__(self):
+        return f"{self.interval}: Summe von {self.student}"
+
+
+def project_of_interval(interval_id, interval=None):
+    if interval is not None and interval.pk == interval_id:
+        return interval.group_id
+    return TimeInterval.objects.filter(pk=interval_id).values_list('group', flat=True).first()
+
+
+@receiver(post_save, sender=TimeInterval)
+def update_rollup_of_interval_receiver(sender, instance: TimeInterval, created, raw, **kwargs):
+    # The totals belong to the project of the interval, rebuild them if it changed
+    # (fixtures are loaded without the previous values)
+    if raw or (not created and instance.group_id != getattr(instance, '_loaded_group_id', None)):
+        TimeTrackingRollup.rebuild(intervals=[instance])
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_save, sender=TimeTrackingEntry)
+def update_rollup_of_saved_entry_receiver(sender, instance: TimeTrackingEntry, created, raw, **kwargs):
+    stored = None if created else getattr(instance, '_stored_values', None)
+    if raw or (stored is None and not created):
+        # Fixtures and entries saved without being loaded (e.g. with a given primary key) come without
+        # the previous values, so the totals of the interval are recomputed
+        TimeTrackingRollup.rebuild(intervals=[instance.interval_id])
+    else:
+        current = (instance.student_id, instance.interval_id, instance.category_id)
+        interval = instance.interval if TimeTrackingEntry.interval.is_cached(instance) else None
+        if stored is not None and stored[:3] != current:
+            # moved to another student, interval or category
+            student_id, interval_id, category_id, hours = stored
+            if hours:
+                TimeTrackingRollup.add_hours(project_of_interval(interval_id, interval), student_id, interval_id,
+                                             category_id, -hours)
+            stored = None
+        delta = instance.hours - (stored[3] if stored is not None else 0)
+        if delta:
+            TimeTrackingRollup.add_hours(project_of_interval(instance.interval_id, interval), *current, delta)
+    instance.remember_stored_values()
+
+
+@receiver(post_delete, sender=TimeTrackingEntry)
+def update_rollup_of_deleted_entry_receiver(sender, instance: TimeTrackingEntry, **kwargs):
+    student_id, interval_id, category_id, hours = getattr(instance, '_stored_values', (
+        instance.student_id, instance.interval_id, instance.category_id, instance.hours))
+    if hours:
+        interval = instance.interval if TimeTrackingEntry.interval.is_cached(instance) else None
+        TimeTrackingRollup.add_hours(project_of_interval(interval_id, interval), student_id, interval_id,
+                                     category_id, -hours)
+
+
+@receiver(post_delete, sender=TimeSpentCategory)
+def update_rollup_of_deleted_category_receiver(sender, instance: TimeSpentCategory, **kwargs):
+    # The category of the entries and totals was set to NULL (without signals), merge the totals of the intervals
+    intervals = list(TimeTrackingRollup.objects.filter(category__isnull=True).values_list('interval', flat=True)
+                     .distinct())
+    if intervals:
+        TimeTrackingRollup.rebuild(intervals=intervals)
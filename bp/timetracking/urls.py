@@ -4,7 +4,7 @@ from .views import \
     TimetrackingOverview, TimetrackingProjectOverview, TimetrackingIntervalsDetailView, \
     TimetrackingIntervalsView, TimetrackingIntervalsCreateView, TimetrackingIntervalsGenerationView, \
     TimetrackingIntervalUpdateView, TimetrackingIntervalDeleteView, \
-    TLTimetrackingEntryCorrectView, ApiTimetrackingEntryUpdateHours, \
+    TLTimetrackingEntryCorrectView, ApiTimetrackingEntryUpdateHours, ApiTimetrackingEntryBulkUpdateHours, \
     TimetrackingMembersDetailView, TimetrackingStatisticsTLStudentView
 
 timetracking_intervals_patterns = [
@@ -21,6 +21,7 @@ timetracking_interval_content_patterns = [
     path('intervals/<pk>/detail/', TimetrackingIntervalsDetailView.as_view(), name="timetracking_interval_detail"),
     path('intervals/<pk>/correct/', TLTimetrackingEntryCorrectView.as_view(), name="timetracking_interval_tl_correct"),
     path('intervals/<pk>/add_hours/', ApiTimetrackingEntryUpdateHours.as_view(), name="timetracking_api_add_hours"),
+    path('add_hours/', ApiTimetrackingEntryBulkUpdateHours.as_view(), name="timetracking_api_bulk_add_hours"),
     path('members/<pk>/detail/', TimetrackingMembersDetailView.as_view(), name="timetracking_members_detail"),
 ]
 
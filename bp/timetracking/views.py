@@ -3,9 +3,8 @@ import json
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.db.models import Sum
-from django.db.models.functions import Coalesce
-from django.http import HttpResponse, HttpResponseForbidden, Http404
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseForbidden, Http404, JsonResponse
 from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.utils import formats
@@ -18,7 +17,8 @@ from bp.roles import get_bp_of_user
 
 from .forms import TimeIntervalForm, TimeIntervalGenerationForm, TimeIntervalUpdateForm, \
     TLTimeIntervalEntryCorrectionForm
-from .models import TimeInterval, TimeTrackingEntry, TimeSpentCategory
+from .aggregation import HoursPivot
+from .models import TimeInterval, TimeTrackingEntry, TimeTrackingRollup, TimeSpentCategory
 
 # necessary to load the project info tags
 from . import project_info_tags
@@ -61,6 +61,10 @@ class TimeTable:
         self.columns = columns
         self.create_entry = entry_function
 
+    @staticmethod
+    def from_pivot(pivot):
+        return TimeTable(pivot.rows, pivot.columns, pivot.cell)
+
     def get_table(self):
         return [[(None, None, ""), *[(None, None, col) for col in self.columns]],  # header
                 *([(None, None, row), *[(col, row, self.create_entry(col, row)) for col in self.columns]] for row in
@@ -104,34 +108,43 @@ class TimetrackingOverview(LoginRequiredMixin, TemplateView):
         return super().get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
-        def hours_of_student_in_interval(student, interval):
-            hours = \
-                interval.timetrackingentry_set.filter(student=student).aggregate(
-                    hours=Coalesce(Sum('hours'), Decimal(0)))[
-                    'hours']
-            return round(hours, 2)
-
         context = super().get_context_data(**kwargs)
         projects = self.request.user.tl.project_set.all()
-        context["projects"] = projects.prefetch_related('student_set', 'timeinterval_set')
+        context["projects"] = projects.prefetch_related('student_set', 'timeinterval_set').with_hours()
         context["timetables"] = \
-            [(project, project.total_hours,) for project in context["projects"]]
+            [(project, project.hours_summary.total,) for project in context["projects"]]
         return context
 
 
 # needed for timetracking graphs of time spent - group comparison
-def get_hours_per_group(category=None):
+def get_hours_per_group(projects, category=None):
+    """
+    Create a chart comparing the hours of all given projects
+
+    :param projects: projects with attached hours (see ProjectQuerySet.with_hours)
+    :type projects: list of Project
+    :param category: category to compare, all categories if None
+    :type category: TimeSpentCategory
+    """
     chart = Chart([
         {
             'x': f'{proj.nr}',
-            'y': f'{proj.total_hours_of_category(category) if category else proj.total_hours}'
-        } for proj in Project.get_active()
+            'y': f'{proj.hours_summary.of_category(category) if category else proj.hours_summary.total}'
+        } for proj in projects
     ])
 
     chart.sort()
     return chart
 
 
+def get_hours_per_group_charts(categories):
+    """
+    Create the group comparison charts (total and one per category) for all active projects
+    """
+    projects = list(Project.get_active().with_hours())
+    return [get_hours_per_group(projects)] + [get_hours_per_group(projects, category=c) for c in categories]
+
+
 class TimetrackingProjectOverview(ProjectByGroupMixin, LoginRequiredMixin, TemplateView):
     template_name = "bp/timetracking/timetracking_project_overview.html"
 
@@ -146,21 +159,17 @@ class TimetrackingProjectOverview(ProjectByGroupMixin, LoginRequiredMixin, Templ
         return super().get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
-        def hours_of_student_in_interval(student, interval):
-            hours = \
-                interval.timetrackingentry_set.filter(student=student).aggregate(
-                    hours=Coalesce(Sum('hours'), Decimal(0)))[
-                    'hours']
-            return round(hours, 2)
-
         context = super().get_context_data(**kwargs)
         project = self.get_object()
         context["project"] = project
         context["total_hours"] = project.total_hours
-        students = project.student_set.all()
-        context["timetable"] = TimeTable(project.get_past_and_current_intervals, students,
-                                         hours_of_student_in_interval).get_table()
+        students = list(project.student_set.all())
+        pivot = HoursPivot(TimeTrackingRollup.objects.filter(project=project),
+                           rows=project.get_past_and_current_intervals, columns=students,
+                           row_field='interval', column_field='student')
+        context["timetable"] = TimeTable.from_pivot(pivot).get_table()
         context["students"] = students
+        context["student_totals"] = [project.hours_summary.of_student(s) for s in students]
 
         return context
 
@@ -327,18 +336,13 @@ class TimetrackingIntervalsDetailView(ProjectByRequestMixin, OnlyOwnTimeInterval
 
         project = self.get_project_by_request(self.request)
         interval = self.get_object()
-        categories = TimeSpentCategory.objects.all()
-
-        def hours_of_student_in_category(s, cat):
-            hours_cat = Coalesce(Sum('hours'), Decimal(0))
-            hours = interval.timetrackingentry_set.filter(category=cat, student=s).aggregate(hours=hours_cat)['hours']
-            return round(hours, 2)
+        categories = TimeSpentCategory.get_all()
 
         context["group"] = project
-        all_students = list(project.student_set.all())
-        context["timetable"] = TimeTable(categories, all_students, hours_of_student_in_category).get_table()
-        context["student_summaries"] = [sum((hours_of_student_in_category(s, cat) for cat in categories)) for s in
-                                        all_students]
+        pivot = HoursPivot(interval.timetrackingrollup_set.all(), rows=categories, columns=project.student_set.all(),
+                           row_field='category', column_field='student')
+        context["timetable"] = TimeTable.from_pivot(pivot).get_table()
+        context["student_summaries"] = pivot.column_totals
         if is_student(self.request.user):
             context["editing_student"] = self.request.user.student
         context["is_student_editable"] = interval.is_editable_by_students()
@@ -420,26 +424,69 @@ class ApiTimetrackingEntryUpdateHours(ProjectByRequestMixin, TimeIntervalByReque
                                  f"{timeinterval.name} darf nicht mehr bearbeitet werden. Wende dich an die Orga für weitere Infos.")
             return HttpResponseForbidden("")
         category_name, hours = request.POST['category'], request.POST['hours']
-        category = TimeSpentCategory.objects.filter(name=category_name).first()
+        category = TimeSpentCategory.get_by_name(category_name)
         if not category:
             return HttpResponseForbidden("")
         hours = Decimal(hours)
         if hours < 0:
             return HttpResponseForbidden("")
 
-        obj, created = TimeTrackingEntry.objects.get_or_create(student=self.request.user.student,
-                                                               interval=timeinterval,
-                                                               category=category,
-                                                               defaults={'hours': 0})
         try:
-            obj.hours = hours
-            obj.save()
+            obj = TimeTrackingEntry.set_hours(self.request.user.student, timeinterval, category, hours)
         except InvalidOperation:
             return HttpResponseForbidden("")
         obj.refresh_from_db()
         return HttpResponse(formats.localize(obj.hours, use_l10n=True))
 
 
+class ApiTimetrackingEntryBulkUpdateHours(ProjectByRequestMixin, LoginRequiredMixin, TemplateView):
+    """
+        Sets the hours of all changed cells of the time table of a student with a single request.
+        Expects a JSON object like {"cells": [{"interval": 1, "category": "Meeting", "hours": 1.5}, ...]},
+        the cells are only saved if all of them are valid.
+    """
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        if not is_student(request.user):
+            return HttpResponseForbidden("")
+        project = self.get_project_by_request(request)
+        if not is_student_of_group(project, request.user):
+            return HttpResponseForbidden("")
+        try:
+            cells = [(int(cell['interval']), cell['category'], Decimal(str(cell['hours'])))
+                     for cell in json.loads(request.body)['cells']]
+        except (ValueError, KeyError, TypeError, InvalidOperation):
+            return HttpResponseForbidden("")
+
+        intervals = project.get_past_and_current_intervals.in_bulk({interval for interval, _, _ in cells})
+        if len(intervals) != len({interval for interval, _, _ in cells}):
+            messages.add_message(request, messages.WARNING, f"Ungültiges Intervall")
+            return HttpResponseForbidden("")
+        for interval in intervals.values():
+            if not interval.is_editable_by_students():
+                messages.add_message(request, messages.WARNING,
+                                     f"{interval.name} darf nicht mehr bearbeitet werden. Wende dich an die Orga für weitere Infos.")
+                return HttpResponseForbidden("")
+
+        hours_field = TimeTrackingEntry._meta.get_field('hours')
+        hours_of_cells = {}
+        for interval, category_name, hours in cells:
+            category = TimeSpentCategory.get_by_name(category_name)
+            if not category or not hours.is_finite() or hours < 0:
+                return HttpResponseForbidden("")
+            try:
+                hours_field.clean(hours, None)
+            except ValidationError:
+                return HttpResponseForbidden("")
+            hours_of_cells[(intervals[interval], category)] = hours.quantize(Decimal('0.01'))
+
+        entries = TimeTrackingEntry.set_hours_of_cells(request.user.student, hours_of_cells)
+        return JsonResponse({'cells': [{'interval': entry.interval.pk, 'category': entry.category.name,
+                                        'hours': formats.localize(entry.hours, use_l10n=True)}
+                                       for entry in entries]})
+
+
 class TimetrackingMembersDetailView(ProjectByRequestMixin, LoginRequiredMixin, DetailView):
     model = Student
     template_name = "bp/timetracking/timetracking_member_detail.html"
@@ -460,16 +507,13 @@ class TimetrackingMembersDetailView(ProjectByRequestMixin, LoginRequiredMixin, D
 
         project = self.get_project_by_request(self.request)
         member = self.get_object()
-        categories = TimeSpentCategory.objects.all()
-
-        def hours_spent_in_category_per_interval(cat, itv):
-            hours_cat = Coalesce(Sum('hours'), Decimal(0))
-            hours = member.timetrackingentry_set.filter(category=cat, interval=itv).aggregate(hours=hours_cat)['hours']
-            return round(hours, 2)
+        categories = TimeSpentCategory.get_all()
 
         context["group"] = project
         all_intervals = list(project.get_past_and_current_intervals)
-        context["timetable"] = TimeTable(all_intervals, categories, hours_spent_in_category_per_interval).get_table()
+        pivot = HoursPivot(member.timetrackingrollup_set.all(), rows=all_intervals, columns=categories,
+                           row_field='interval', column_field='category')
+        context["timetable"] = TimeTable.from_pivot(pivot).get_table()
         context["categories"] = categories
         context["intervals"] = all_intervals
         context["can_edit_entries"] = is_student(self.request.user) and self.request.user.student == member
@@ -488,11 +532,11 @@ class TimetrackingStatisticsOrgaView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        categories = TimeSpentCategory.objects.all()
-        charts = [get_hours_per_group()] + [get_hours_per_group(category=c) for c in categories]
+        categories = TimeSpentCategory.get_all()
+        charts = get_hours_per_group_charts(categories)
         context["hours_per_group_data"] = [
             HoursPerGroupData(cat, chart.get_chart_data(), None, i)
-            for cat, chart, i in zip(["Gesamt"] + list(categories.values_list("name", flat=True)),
+            for cat, chart, i in zip(["Gesamt"] + [category.name for category in categories],
                                      charts,
                                      range(len(charts)))
         ]
@@ -515,32 +559,28 @@ class TimetrackingStatisticsTLStudentView(LoginRequiredMixin, TemplateView, Proj
         return super().get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
-        def hours_of_student_in_interval(student, interval):
-            hours = \
-                interval.timetrackingentry_set.filter(student=student).aggregate(
-                    hours=Coalesce(Sum('hours'), Decimal(0)))[
-                    'hours']
-            return round(hours, 2)
-
         context = super().get_context_data(**kwargs)
-        categories = TimeSpentCategory.objects.all()
-        charts = [get_hours_per_group()] + [get_hours_per_group(category=c) for c in categories]
+        categories = TimeSpentCategory.get_all()
         context["project"] = self.get_object()
         students = context["project"].student_set.all()
+        pivot = HoursPivot(TimeTrackingRollup.objects.filter(project=context["project"]),
+                           rows=reversed(context["project"].get_past_and_current_intervals), columns=students,
+                           row_field='interval', column_field='student')
 
         # data for graph 1 (time spent per interval)
         context["hours_per_interval"] = Chart([
             {
                 'x': f'{itv.name}',
-                'y': f"{sum([hours_of_student_in_interval(s, itv) / len(itv) for s in students])}"
-            } for itv in reversed(context["project"].get_past_and_current_intervals)
+                'y': f"{sum([pivot.cell(s, itv) / len(itv) for s in pivot.columns])}"
+            } for itv in pivot.rows
         ]).get_chart_data()
 
         # data for remaining graphs (time spent - group comparison: total and for every category)
         if is_tl(self.request.user):
+            charts = get_hours_per_group_charts(categories)
             context["hours_per_group_data"] = [
                 HoursPerGroupData(cat, chart.get_chart_data(), chart.single_bar_highlighted(context["project"].nr), i)
-                for cat, chart, i in zip(["Gesamt"] + list(categories.values_list("name", flat=True)),
+                for cat, chart, i in zip(["Gesamt"] + [category.name for category in categories],
                                          charts,
                                          range(len(charts)))
             ]
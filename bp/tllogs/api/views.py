@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.urls import reverse
 from django.views.generic import DetailView
 
-from bp.models import TLLog
+from bp.models import BP, TLLog
 from bp.roles import is_orga
 
 
@@ -39,3 +41,18 @@ class APILogMarkHandledView(APILogMark):
 class APILogRate(APILogMark):
     def mark(self, log, rating):
         log.rating = rating
+
+
+class APILogTriageQueue(LoginRequiredMixin, DetailView):
+    """
+        IDs and URLs of the next unread logs after the given one, so that the browser can triage them
+        without asking the server for every single next log
+    """
+    http_method_names = ['get']
+    model = TLLog
+
+    def get(self, request, *args, **kwargs):
+        if not is_orga(request.user):
+            return HttpResponseForbidden("")
+        pks = TLLog.next_unread(BP.get_active().pk, self.get_object().pk, settings.LOG_TRIAGE_QUEUE_LENGTH)
+        return JsonResponse({'logs': [{'pk': pk, 'url': reverse('bp:log_detail', kwargs={'pk': pk})} for pk in pks]})
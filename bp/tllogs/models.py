@@ -1,9 +1,17 @@
+from datetime import timedelta
+
 from django.core.mail import EmailMessage
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.urls import reverse_lazy
+from django.utils import timezone
+
+from bp.cache import cache_key, get_cached, REFERENCE_DATA
+from bp.outbox.models import QueuedMail
+
+SIMPLE_TIMESTAMP_FORMAT = '%d.%m.%y %H:%M'
 
 
 class TLLog(models.Model):
@@ -11,6 +19,17 @@ class TLLog(models.Model):
         verbose_name = "TL-Log"
         verbose_name_plural = "TL-Logs"
         ordering = ['-timestamp']
+        indexes = [
+            # Filters on boolean fields are compiled to e.g. "NOT read", which cannot use an index on these fields,
+            # hence partial indexes containing only the (few) logs that match the filter
+            # next unread log (see next_unread), unread logs
+            models.Index(fields=['bp', 'id'], condition=models.Q(read=False), name='bp_tllog_unread_idx'),
+            # logs requiring attention (handled or not), newest first
+            models.Index(fields=['bp', 'timestamp'], condition=models.Q(requires_attention=True),
+                         name='bp_tllog_attention_idx'),
+            # latest log of a project (e.g. Project.without_recent_logs)
+            models.Index(fields=['group', 'timestamp'], name='bp_tllog_group_time_idx'),
+        ]
 
     STATUS_CHOICES = [
         (-2, 'Schlecht'),
@@ -45,7 +64,7 @@ class TLLog(models.Model):
 
     @property
     def simple_timestamp(self):
-        return self.timestamp.strftime('%d.%m.%y %H:%M')
+        return self.timestamp.strftime(SIMPLE_TIMESTAMP_FORMAT)
 
     @property
     def project_title(self):
@@ -60,6 +79,27 @@ class TLLog(models.Model):
     def get_active():
         return TLLog.objects.filter(bp__active=True)
 
+    @staticmethod
+    def next_unread(bp_id, current_pk, count=1):
+        """
+        IDs of the unread logs following the given log (in the order of their IDs, wrapping around at the end),
+        found by at most two range scans of the partial index of unread logs
+
+        :param bp_id: ID of the BP of the logs
+        :type bp_id: int
+        :param current_pk: ID of the current log (not part of the result)
+        :type current_pk: int
+        :param count: maximum number of IDs
+        :type count: int
+        :return: IDs of the next unread logs
+        :rtype: list of int
+        """
+        unread = TLLog.objects.filter(bp_id=bp_id, read=False).order_by('pk').values_list('pk', flat=True)
+        pks = list(unread.filter(pk__gt=current_pk)[:count])
+        if len(pks) < count:
+            pks += unread.filter(pk__lt=current_pk)[:count - len(pks)]
+        return pks
+
     def __str__(self):
         return f"{self.tl} für Gruppe {self.group.nr} am {self.simple_timestamp}"
 
@@ -71,6 +111,14 @@ class TLLogProblem(models.Model):
 
     name = models.CharField(max_length=150)
 
+    @staticmethod
+    def get_all():
+        """
+        :return: all problems (cached, since they are offered in every log form)
+        :rtype: list of TLLogProblem
+        """
+        return get_cached(cache_key(REFERENCE_DATA, "tllogproblems"), lambda: list(TLLogProblem.objects.order_by('pk')))
+
     def __str__(self):
         return self.name
 
@@ -87,7 +135,7 @@ def update_tllog_receiver(sender, instance: TLLog, created, **kwargs):
             [settings.SEND_MAILS_TO],
             reply_to=[instance.tl.user.email]
         )
-        mail.send(fail_silently=True)
+        QueuedMail.enqueue(mail)
 
     @property
     def simple_timestamp(self):
@@ -106,5 +154,89 @@ class TLLogTemplate(models.Model):
     text = models.TextField(blank=True, verbose_name="Vorlagentext",
                             help_text="Text, der den TLs als Vorlage angezeigt wird")
 
+    @staticmethod
+    def get_text(bp_id):
+        """
+        :param bp_id: ID of the BP of interest
+        :type bp_id: int
+        :return: text of the log template of the given BP (cached, empty if there is no template)
+        :rtype: str
+        """
+        return get_cached(cache_key(REFERENCE_DATA, "tllogtemplate", bp_id),
+                          lambda: TLLogTemplate.objects.filter(bp_id=bp_id).values_list('text', flat=True).first() or "")
+
     def __str__(self):
         return f"Vorlage für {self.bp}"
+
+
+class ReminderRun(models.Model):
+    """
+        Run of the send_log_reminders command, the running run also serves as lock against overlapping runs
+    """
+
+    class Meta:
+        verbose_name = "Erinnerungslauf"
+        verbose_name_plural = "Erinnerungsläufe"
+        ordering = ['-started']
+        constraints = [
+            # at most one run at a time (dry runs send nothing and do not block the scheduled runs)
+            models.UniqueConstraint(fields=['status'], condition=models.Q(status=0, dry_run=False),
+                                    name='bp_reminderrun_lock'),
+        ]
+
+    RUNNING = 0
+    SUCCEEDED = 1
+    FAILED = 2
+    STATUS_CHOICES = [
+        (RUNNING, 'Läuft'),
+        (SUCCEEDED, 'Erfolgreich'),
+        (FAILED, 'Fehlgeschlagen'),
+    ]
+
+    started = models.DateTimeField(default=timezone.now, verbose_name="Gestartet")
+    finished = models.DateTimeField(blank=True, null=True, verbose_name="Beendet")
+    status = models.SmallIntegerField(choices=STATUS_CHOICES, default=RUNNING, verbose_name="Status")
+    dry_run = models.BooleanField(default=False, verbose_name="Probelauf")
+    period = models.PositiveSmallIntegerField(verbose_name="Zeitraum ohne Log (Tage)")
+    tls_reminded = models.PositiveIntegerField(default=0, verbose_name="Erinnerte TLs")
+    projects_reminded = models.PositiveIntegerField(default=0, verbose_name="Projekte")
+    error = models.TextField(blank=True, verbose_name="Fehler")
+
+    @staticmethod
+    def start(period, dry_run=False):
+        """
+        Start a run unless another one is running (runs exceeding LOG_REMINDER_LOCK_TIMEOUT_SECONDS are aborted).
+        Dry runs do not take the lock.
+
+        :param period: number of days without log or reminder
+        :type period: int
+        :param dry_run: whether the reminders are only determined, not sent
+        :type dry_run: bool
+        :return: the started run or None if another run is running
+        :rtype: ReminderRun
+        """
+        timeout = timezone.now() - timedelta(seconds=settings.LOG_REMINDER_LOCK_TIMEOUT_SECONDS)
+        ReminderRun.objects.filter(status=ReminderRun.RUNNING, dry_run=False, started__lt=timeout) \
+            .update(status=ReminderRun.FAILED, finished=timezone.now(), error="Abgebrochen (Zeitlimit überschritten)")
+        try:
+            with transaction.atomic():
+                return ReminderRun.objects.create(period=period, dry_run=dry_run)
+        except IntegrityError:
+            return None
+
+    @staticmethod
+    def get_last_successful():
+        return ReminderRun.objects.filter(status=ReminderRun.SUCCEEDED, dry_run=False).first()
+
+    def finish(self, error=None):
+        self.finished = timezone.now()
+        self.status = ReminderRun.FAILED if error else ReminderRun.SUCCEEDED
+        self.error = str(error or "")
+        self.save()
+
+    @property
+    def duration(self):
+        return self.finished - self.started if self.finished else None
+
+    def __str__(self):
+        return f"{'Probelauf' if self.dry_run else 'Erinnerungslauf'} vom {timezone.localtime(self.started):%d.%m.%y %H:%M}"
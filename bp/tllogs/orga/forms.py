@@ -1,45 +1,45 @@
-import datetime
 import json
-import math
-from collections import Counter
-import random
 
 from django import forms
 from django.conf import settings
 from django.contrib import messages
-from django.core.mail import EmailMessage
+from django.db import IntegrityError, transaction
 from django.db.models import QuerySet
 from django.forms.utils import ErrorList
 
-from bp.models import Project, TL, PeerGroup, BP
+from bp.models import Project, TL, PeerGroup, BP, TLLog, TLLogProblem
+from bp.peer_groups import solve_peer_groups
+from bp.tllogs.reminders import Reminder, send_reminders, describe_reminders
 
 
 class LogReminderForm(forms.Form):
     tls = forms.MultipleChoiceField(widget=forms.CheckboxSelectMultiple)
+    dry_run = forms.BooleanField(required=False, label="Probelauf",
+                                 help_text="Nur anzeigen, wer erinnert würde, ohne E-Mails zu verschicken")
+
+    def selected_reminders(self):
+        """
+        :return: reminders of the selected TLs (loaded with two queries)
+        :rtype: list of Reminder
+        """
+        tl_keys = [json.loads(tl_key) for tl_key in self.cleaned_data["tls"]]
+        tls = TL.objects.select_related('user').in_bulk([tl_pk for tl_pk, _, _ in tl_keys])
+        projects = Project.objects.in_bulk([p_id for _, p_ids, _ in tl_keys for p_id in p_ids])
+        return [Reminder(tls[tl_pk], [projects[p_id] for p_id in p_ids if p_id in projects], period)
+                for tl_pk, p_ids, period in tl_keys if tl_pk in tls]
 
     def send_reminders(self):
-        for tl_key in self.cleaned_data["tls"]:
-            tl_key = json.loads(tl_key)
-            tl = TL.objects.get(pk=tl_key[0])
-            if tl.user is not None and tl.user.email:
-                mail = EmailMessage(
-                    f"[BP TL Logs] Erinnerung: Bitte Log(s) für Projekt(e) schreiben",
-                    f"Hallo {tl},\n\nfür deine Gruppe(n) {', '.join([Project.objects.get(pk=p_id).short_title_else_title for p_id in tl_key[1]])} wurde(n) seit mindestens {tl_key[2]} Tagen kein Log mehr geschrieben. Bitte trage zeitnah den aktuellen Stand im System ein.",
-                    settings.SEND_MAILS_FROM,
-                    [tl.user.email],
-                    reply_to=[settings.SEND_MAILS_TO]
-                )
-                mail.send(fail_silently=False)
-
-                for p_id in tl_key[1]:
-                    project = Project.objects.get(pk=p_id)
-                    project.last_reminded = datetime.datetime.now()
-                    project.save()
-
-                tl.log_reminder += 1
-                tl.save()
-
-        return f"{len(self.cleaned_data['tls'])} Erinnerungsmail(s) verschickt"
+        dry_run = self.cleaned_data["dry_run"]
+        sent, unreachable = send_reminders(self.selected_reminders(), dry_run=dry_run)
+        if dry_run:
+            message = f"Probelauf: {len(sent)} Erinnerungsmail(s) würden verschickt"
+            if sent:
+                message += f" an {describe_reminders(sent)}"
+        else:
+            message = f"{len(sent)} Erinnerungsmail(s) verschickt"
+        if unreachable:
+            message += f", ohne E-Mail-Adresse: {describe_reminders(unreachable)}"
+        return message
 
     def __init__(self, data=None, files=None, auto_id='id_%s', prefix=None, initial=None, error_class=ErrorList,
                  label_suffix=None, empty_permitted=False, field_order=None, use_required_attribute=None,
@@ -50,6 +50,49 @@ class LogReminderForm(forms.Form):
         self.fields["tls"].initial = [k for k, _ in self.initial["tl_choices"]]
 
 
+YES_NO_CHOICES = [("", "Alle"), ("1", "Ja"), ("0", "Nein")]
+
+
+class LogFilterForm(forms.Form):
+    """
+        Filters of the log list (submitted via GET), all of them are optional and can be combined
+    """
+    # do not highlight the (always bound) filters as successfully validated
+    bound_css_class = ""
+
+    group = forms.ModelChoiceField(queryset=Project.objects.none(), required=False, label="Projekt",
+                                   empty_label="Alle")
+    tl = forms.ModelChoiceField(queryset=TL.objects.none(), required=False, label="TL", empty_label="Alle")
+    status = forms.TypedChoiceField(choices=[("", "Alle")] + TLLog.STATUS_CHOICES, coerce=int, empty_value=None,
+                                    required=False, label="Status")
+    problem = forms.TypedChoiceField(coerce=int, empty_value=None, required=False, label="Problem")
+    read = forms.TypedChoiceField(choices=YES_NO_CHOICES, coerce=lambda value: value == "1", empty_value=None,
+                                  required=False, label="Gelesen")
+    requires_attention = forms.TypedChoiceField(choices=YES_NO_CHOICES, coerce=lambda value: value == "1",
+                                                empty_value=None, required=False, label="Aufmerksamkeit nötig")
+
+    def __init__(self, bp, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["group"].queryset = bp.project_set.all()
+        self.fields["tl"].queryset = bp.tl_set.all()
+        self.fields["problem"].choices = [("", "Alle")] + [(p.pk, str(p)) for p in TLLogProblem.get_all()]
+
+    def filter(self, queryset):
+        """
+        :param queryset: logs to filter
+        :type queryset: QuerySet
+        :return: logs matching all selected filters (none if the form is invalid, its errors are shown instead)
+        :rtype: QuerySet
+        """
+        if not self.is_valid():
+            return queryset.none()
+        data = self.cleaned_data
+        lookups = {"group": data["group"], "tl": data["tl"], "status": data["status"],
+                   "current_problems": data["problem"], "read": data["read"],
+                   "requires_attention": data["requires_attention"]}
+        return queryset.filter(**{lookup: value for lookup, value in lookups.items() if value is not None})
+
+
 class CreatePeerGroupsForm(forms.Form):
     projects = forms.MultipleChoiceField(widget=forms.CheckboxSelectMultiple)
 
@@ -63,94 +106,43 @@ class CreatePeerGroupsForm(forms.Form):
 
     def create_peer_groups(self, request):
         GROUPS_PER_PEERGROUP = settings.PEER_GROUPS_MEMBER_GROUPS_COUNT
-        MAX_TRIES = settings.PEER_GROUPS_OPTIMISATION_LIMIT
+        MAX_ITERATIONS = settings.PEER_GROUPS_OPTIMISATION_LIMIT
 
         queryset = Project.get_active().filter(pk__in=self.cleaned_data["projects"])
-        group_count = queryset.count()
-        groups_to_create = math.ceil(group_count / GROUPS_PER_PEERGROUP)
         active_bp = BP.get_active()
 
-        def peer_groups_from_list(groups: list, groups_per_peergroup):
-            """
-            Create virtual Peer Groups of size groups_per_peergroup from consecutive groups
-            """
-            yield from (groups[j:j + groups_per_peergroup] for j in range(0, len(groups), groups_per_peergroup))
-
-        def check_constraints(peer_group):
-            ag_counter = Counter()
-            tl_counter = Counter()
-            for p in peer_group:
-                ag_counter[p.ag_mail] += 1
-                tl_counter[p.tl] += 1
-
-            if len(ag_counter) == 0 or len(tl_counter) == 0:
-                print(f"No AGs or no TLs in peer group: {peer_group}")
-
-            # Check if group contains constraint violations
-            # Find cases where multiple groups of the same AG or TL are in the same peer group
-            most_common_ag, most_common_ag_count = ag_counter.most_common(1)[0]
-            most_common_tl, most_common_tl_count = tl_counter.most_common(1)[0]
-            if most_common_ag_count > 1:
-                print(f"Found violation (two groups of AG {most_common_ag})")
-                return False
-            elif most_common_tl_count > 1:
-                print(f"Found violation (two groups of TL {most_common_tl})")
-                return False
-            else:
-                # Group is clear, no need for handling
-                return True
-
-        def is_valid_assignment(groups, groups_per_peergroup):
-            for peer_group in peer_groups_from_list(groups, groups_per_peergroup):
-                if not check_constraints(peer_group):
-                    return False
-            return True
-
-        def generate_peer_groups(groups, groups_per_peergroup, max_tries):
-            """
-            Generate valid peer groups of size groups_per_peergroup from groups.
-            Tries at most max_tries times to randomly find a valid group assignment.
-
-            :param groups: groups that are to be assigned to peer groups
-            :type groups: list of Project
-            :param groups_per_peergroup: number of groups per peer group
-            :type groups_per_peergroup: int
-            :param max_tries: maximum number of tries before returning
-            :type max_tries: int
-            :return index of last try (0 <= try <= max_tries). try == max_tries indicates no solution found
-            :type int
-            """
-            for current_try in range(max_tries):
-                random.shuffle(groups)
-                if is_valid_assignment(groups, groups_per_peergroup):
-                    return current_try
-            return max_tries
-
-        if PeerGroup.objects.filter(bp=active_bp).count() > 0:
-            messages.add_message(request, messages.WARNING,
-                                 "Es existieren bereits Peergruppen, bitte zunächst löschen, um eine neue Einteilung vorzunehmen.")
+        groups_exist_message = "Es existieren bereits Peergruppen, bitte zunächst löschen, um eine neue Einteilung vorzunehmen."
+        if PeerGroup.objects.filter(bp=active_bp).exists():
+            messages.add_message(request, messages.WARNING, groups_exist_message)
+            return
+
+        groups = list(queryset.all())
+        if groups == []:
+            return
+
+        solution = solve_peer_groups(groups, GROUPS_PER_PEERGROUP, MAX_ITERATIONS)
+        try:
+            # Create and assign all peer groups at once, either completely or not at all
+            with transaction.atomic():
+                PeerGroup.objects.bulk_create(
+                    [PeerGroup(bp=active_bp, nr=nr) for nr in range(1, len(solution.peer_groups) + 1)])
+                peer_groups = list(PeerGroup.objects.filter(bp=active_bp))
+                for peer, grp in zip(peer_groups, solution.peer_groups):
+                    for project in grp:
+                        project.peer_group = peer
+                Project.objects.bulk_update(groups, ['peer_group'], batch_size=500)
+        except IntegrityError:
+            # Peer groups have been created by a concurrent request in the meantime
+            messages.add_message(request, messages.WARNING, groups_exist_message)
+            return
+        messages.add_message(request, messages.SUCCESS, f"{len(peer_groups)} Peergruppen angelegt.")
+
+        if solution.is_valid:
+            messages.add_message(request, messages.SUCCESS,
+                                 f"Found solution that satisfied all constraints ({solution.iterations} optimisation steps)")
         else:
-            groups = list(queryset.all())
-            if groups == []:
-                return
-
-            tries = generate_peer_groups(groups, GROUPS_PER_PEERGROUP, MAX_TRIES)
-            # Create new peer groups
-            for nr in range(1, groups_to_create + 1):
-                PeerGroup.objects.create(bp=active_bp, nr=nr)
-            messages.add_message(request, messages.SUCCESS, f"{groups_to_create} Peergruppen angelegt.")
-
-            peer_groups = list(PeerGroup.objects.filter(bp=active_bp))
-            for peer, grp in zip(peer_groups, peer_groups_from_list(groups, GROUPS_PER_PEERGROUP)):
-                for project in grp:
-                    project.peer_group = peer
-                    project.save()
-
-            if tries < MAX_TRIES:
-                messages.add_message(request, messages.SUCCESS,
-                                     f"Found solution that satisfied all constraints within {tries + 1} tries")
-            else:
-                violated_groups = [peer for peer in peer_groups if not check_constraints(peer.projects.all())]
-                messages.add_message(request, messages.WARNING,
-                                     f"No solution found that satisfied all constraints within {tries} tries. "
-                                     f"Solution violates constraints for peer groups {', '.join(str(pg) for pg in violated_groups)}")
+            violated_groups = [peer_groups[i] for i in solution.violated_peer_groups()]
+            messages.add_message(request, messages.WARNING,
+                                 f"No solution found that satisfied all constraints within {solution.iterations} optimisation steps "
+                                 f"({solution.violations} conflicting pair(s) of groups with the same AG or TL). "
+                                 f"Solution violates constraints for peer groups {', '.join(str(pg) for pg in violated_groups)}")
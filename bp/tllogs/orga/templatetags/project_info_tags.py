@@ -5,7 +5,7 @@ tllog_tab = ProjectInfoTabTags(priority=1)
 @tllog_tab.register_description('bp/tllogs/orga/project_info_misc_log_desc.html')
 def tllog_description(project):
     return {
-        'log_count' : project.tllog_set.all().count(),
+        'log_count' : project.log_count,
     }
 
 @tllog_tab.register_content('bp/tllogs/orga/project_info_misc_log_content.html')
@@ -13,5 +13,5 @@ def tllog_content(project):
     return {
         'status_data' : project.status_json_string,
         'logs'        : project.tllog_set.all(),
-        'log_count'   : project.tllog_set.all().count(),
+        'log_count'   : project.log_count,
     }
@@ -8,6 +8,5 @@ def status_column_description(**kwargs):
 
 @status_column.register_content('bp/tllogs/orga/project_overview_list_column_status_content.html')
 def status_column_content(project, **kwargs):
-    most_recent_tllog = project.tllog_set.order_by('-timestamp').first()
-    status = most_recent_tllog.status if most_recent_tllog else ""
-    return {'status' : status}
+    status = project.current_status
+    return {'status' : status if status is not None else ""}
@@ -3,18 +3,23 @@ from functools import reduce
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.db.models import Q
+from django.db.models.functions import Substr
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, FormView
 
-from .forms import LogReminderForm
-from bp.models import Project, TLLog
+from .forms import LogReminderForm, LogFilterForm
+from bp.models import BP, TLLog, ReminderRun
+from bp.pagination import KeysetPaginator
+from bp.tllogs.reminders import reminders_due
 from bp.views import FilterByActiveBPMixin
 
 # necessary to load the custom tags
 from .templatetags import project_info_tags, project_overview_list_tags
 
+# Number of characters of the log texts loaded for the list (which shows the first 50 words)
+LOG_PREVIEW_LENGTH = 1000
+
 
 class LogListView(PermissionRequiredMixin, FilterByActiveBPMixin, ListView):
     model = TLLog
@@ -24,11 +29,27 @@ class LogListView(PermissionRequiredMixin, FilterByActiveBPMixin, ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        return super().get_queryset().select_related('group', 'tl').prefetch_related("current_problems")
+        # The list only shows the beginning of the text, load the full text (and the comment) on the detail page only
+        self.filter_form = LogFilterForm(self.active_bp, self.request.GET)
+        return self.filter_form.filter(super().get_queryset()) \
+            .select_related('group', 'tl').prefetch_related("current_problems") \
+            .defer('text', 'comment').annotate(text_preview=Substr('text', 1, LOG_PREVIEW_LENGTH))
+
+    def paginate_queryset(self, queryset, page_size):
+        # Keyset pagination instead of COUNT and OFFSET, see KeysetPaginator
+        paginator = KeysetPaginator(queryset, page_size, 'timestamp')
+        page = paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'),
+                              last='last' in self.request.GET)
+        return paginator, page, page.object_list, page.has_other_pages()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["page_title"] = "Logs"
+        context["filter_form"] = self.filter_form
+        filters = self.request.GET.copy()
+        for parameter in ['after', 'before', 'last']:
+            filters.pop(parameter, None)
+        context["filter_query"] = filters.urlencode()
         return context
 
 
@@ -90,25 +111,24 @@ class LogReminderView(PermissionRequiredMixin, FormView):
 
     def get_initial(self):
         initial = super().get_initial()
-        projects_to_remind = [p for p in Project.no_log_or_reminder_since(self.kwargs.get("period"))]
-        tl_choices = {}
-        for p in projects_to_remind:
-            if p.tl in tl_choices:
-                tl_choices.get(p.tl).append(p)
-            else:
-                tl_choices[p.tl] = [p]
-        initial['tl_choices'] = [([tl.pk, [p.pk for p in projects], self.kwargs.get("period")],
-                                  f"{tl.name}: {', '.join([p.short_title_else_title for p in projects])}")
-                                 for tl, projects in tl_choices.items()]
+        initial['tl_choices'] = [([reminder.tl.pk, [p.pk for p in reminder.projects], reminder.period],
+                                  f"{reminder.tl.name}: "
+                                  f"{', '.join([p.short_title_else_title for p in reminder.projects])}")
+                                 for reminder in reminders_due(self.kwargs.get("period"))]
         return initial
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['log_period'] = self.kwargs.get("period")
+        context['last_reminder_run'] = ReminderRun.get_last_successful()
         return context
 
     def form_valid(self, form):
         message = form.send_reminders()
+        if form.cleaned_data["dry_run"]:
+            # stay on the page to send the reminders afterwards
+            messages.add_message(self.request, messages.INFO, message)
+            return redirect(self.request.path)
         messages.add_message(self.request, messages.SUCCESS, message)
         return super().form_valid(form)
 
@@ -118,14 +138,9 @@ class NextLog(DetailView):
 
     def get(self, request, *args, **kwargs):
 
-        current_log = self. get_object()
-        unread_logs = list(TLLog.get_active().filter(Q(read=False) | Q(pk=current_log.pk)).order_by('pk'))
-        if len(unread_logs) <= 1:
+        current_log = self.get_object()
+        next_logs = TLLog.next_unread(BP.get_active().pk, current_log.pk)
+        if not next_logs:
             messages.add_message(request, messages.WARNING, "Es gibt keine weiteren ungelesenen Logs.")
             return redirect("bp:log_detail", current_log.pk)
-        else:
-            try:
-                next_log = unread_logs[unread_logs.index(current_log) + 1]
-            except IndexError:
-                next_log = unread_logs[0]
-        return redirect("bp:log_detail", next_log.pk)
+        return redirect("bp:log_detail", next_logs[0])
@@ -0,0 +1,99 @@
+from collections import namedtuple
+from datetime import date
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import F
+
+from bp.models import Project, TL
+from bp.outbox.models import QueuedMail
+
+# TL to remind of the logs of the given projects, which are missing for at least period days
+Reminder = namedtuple('Reminder', ['tl', 'projects', 'period'])
+
+
+def reminders_due(period):
+    """
+    Select the TLs to remind (projects without log or reminder in the period) using a single query
+
+    :param period: number of days without log or reminder
+    :type period: int
+    :return: one reminder per TL
+    :rtype: list of Reminder
+    """
+    projects = Project.no_log_or_reminder_since(period).select_related('tl__user').order_by('tl__name', 'tl', 'nr')
+    return group_reminders(projects, period)
+
+
+def group_reminders(projects, period):
+    """
+    :param projects: projects to remind (with their TLs)
+    :type projects: iterable of Project
+    :param period: number of days without log or reminder
+    :type period: int
+    :return: one reminder per TL of the projects (in order of their first project)
+    :rtype: list of Reminder
+    """
+    reminders = {}
+    for project in projects:
+        reminders.setdefault(project.tl_id, Reminder(project.tl, [], period)).projects.append(project)
+    return list(reminders.values())
+
+
+def can_be_reminded(tl):
+    return tl.user is not None and bool(tl.user.email)
+
+
+def reminder_mail(reminder):
+    """
+    :param reminder: reminder to send
+    :type reminder: Reminder
+    :return: e-mail to the TL
+    :rtype: EmailMessage
+    """
+    return EmailMessage(
+        f"[BP TL Logs] Erinnerung: Bitte Log(s) für Projekt(e) schreiben",
+        f"Hallo {reminder.tl},\n\nfür deine Gruppe(n) "
+        f"{', '.join(project.short_title_else_title for project in reminder.projects)} wurde(n) seit mindestens "
+        f"{reminder.period} Tagen kein Log mehr geschrieben. Bitte trage zeitnah den aktuellen Stand im System ein.",
+        settings.SEND_MAILS_FROM,
+        [reminder.tl.user.email],
+        reply_to=[settings.SEND_MAILS_TO]
+    )
+
+
+def send_reminders(reminders, dry_run=False):
+    """
+    Queue the reminder mails and record the reminders (Project.last_reminded, TL.log_reminder)
+    with one query each instead of saving every project and TL
+
+    :param reminders: reminders to send
+    :type reminders: list of Reminder
+    :param dry_run: only determine who would be reminded
+    :type dry_run: bool
+    :return: reminders that were (or would be) sent and reminders of TLs without e-mail address
+    :rtype: (list of Reminder, list of Reminder)
+    """
+    sendable = [reminder for reminder in reminders if can_be_reminded(reminder.tl)]
+    unreachable = [reminder for reminder in reminders if not can_be_reminded(reminder.tl)]
+    if dry_run or not sendable:
+        return sendable, unreachable
+
+    mails = [reminder_mail(reminder) for reminder in sendable]
+    with transaction.atomic():
+        QueuedMail.enqueue_all(mails)
+        Project.objects.filter(pk__in=[project.pk for reminder in sendable for project in reminder.projects]) \
+            .update(last_reminded=date.today())
+        TL.objects.filter(pk__in=[reminder.tl.pk for reminder in sendable]) \
+            .update(log_reminder=F('log_reminder') + 1)
+    return sendable, unreachable
+
+
+def describe_reminders(reminders):
+    """
+    :return: TLs and their projects, e.g. for messages
+    :rtype: str
+    """
+    return "; ".join(f"{reminder.tl.name} ({', '.join(project.short_title_else_title for project in reminder.projects)})"
+                     for reminder in reminders)
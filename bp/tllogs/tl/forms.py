@@ -1,6 +1,12 @@
 from django import forms
 
-from ..models import TLLog
+from ..models import TLLog, TLLogProblem
+
+
+def set_problem_choices(form):
+    """ Offer the (cached) problems instead of querying them for every form """
+    form.fields['current_problems'].choices = [(problem.pk, str(problem)) for problem in TLLogProblem.get_all()]
+
 
 class TLLogForm(forms.ModelForm):
     class Meta:
@@ -22,6 +28,7 @@ class TLLogForm(forms.ModelForm):
         self.request = kwargs.pop('request')
         super(TLLogForm, self).__init__(*args, **kwargs)
         self.fields['group'].queryset = self.request.user.tl.project_set.all()
+        set_problem_choices(self)
 
 
 class TLLogUpdateForm(forms.ModelForm):
@@ -33,3 +40,7 @@ class TLLogUpdateForm(forms.ModelForm):
             'status': forms.RadioSelect,
             'current_problems': forms.CheckboxSelectMultiple,
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        set_problem_choices(self)
@@ -1,14 +1,16 @@
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
 from django.http import Http404
 from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
 from django.views.generic import TemplateView, DetailView, UpdateView, CreateView, DeleteView
 
 
+from bp.database import retry_on_lock
 from bp.roles import is_tl, is_tl_of_group
 
-from ..models import TLLog
+from ..models import TLLog, TLLogTemplate
 from .forms import TLLogForm, TLLogUpdateForm
 from .mixins import ProjectByRequestMixin
 from .roles import does_log_belong_to_group, is_log_of_tl
@@ -36,6 +38,12 @@ class LogTLCreateView(ProjectByRequestMixin, LoginRequiredMixin, CreateView):
         kwargs['request'] = self.request
         return kwargs
 
+    @retry_on_lock
+    @transaction.atomic
+    def form_valid(self, form):
+        # The log, its problems and the notification are saved together, so that they can be repeated if locked
+        return super().form_valid(form)
+
     def get_success_url(self):
         messages.add_message(self.request, messages.SUCCESS, "Log gespeichert")
         return reverse_lazy('bp:log_tl_start')
@@ -64,6 +72,7 @@ class LogTLCreateView(ProjectByRequestMixin, LoginRequiredMixin, CreateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["group"] = self.get_project_by_request(self.request)
+        context["log_template"] = TLLogTemplate.get_text(context["group"].bp_id)
         return context
 
 
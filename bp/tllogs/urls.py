@@ -1,6 +1,6 @@
 from django.urls import path
 
-from .api.views import APILogMarkReadView, APILogMarkHandledView, APILogRate
+from .api.views import APILogMarkReadView, APILogMarkHandledView, APILogRate, APILogTriageQueue
 from .orga.views import LogListView, LogAttentionListView, LogUnreadListView, LogReminderView, LogView, \
     LogUnratedListView, NextLog
 from .tl.views import LogTLOverview, LogTLCreateView, LogTLUpdateView, LogTLDeleteView, LogTLDetailView
@@ -24,4 +24,5 @@ tllog_orga_patterns = [
     path('<pk>/handled/', APILogMarkHandledView.as_view(), name='log_api_mark_handled'),
     path('<pk>/rate/', APILogRate.as_view(), name='log_api_rate'),
     path('<pk>/next_log', NextLog.as_view(), name='next_log'),
+    path('<pk>/triage_queue', APILogTriageQueue.as_view(), name='log_api_triage_queue'),
 ]
\ No newline at end of file
@@ -9,7 +9,7 @@ from bp.orgalogs.urls import orgalog_patterns
 from bp.timetracking.views import TimetrackingStatisticsOrgaView
 
 from bp.views import \
-    ProjectListView, ProjectUngradedListView, ProjectView, grade_export_view, ProjectImportView, \
+    ProjectListView, ProjectUngradedListView, ProjectView, ProjectTabView, grade_export_view, ProjectImportView, \
     TLView, TLListView, StudentListView, StudentImportView, ProjectEditPitchPoints, ProjectEditDocumentationPoints, \
     ProjectCloseToHigherGradeListView, PeerGroupListView, peer_group_export_view, PeerGroupCreateView, \
     delete_peer_groups
@@ -27,6 +27,7 @@ urlpatterns = [
     path('project/import/', ProjectImportView.as_view(), name="project_import"),
     path('project/export_grades/', grade_export_view, name="project_export_grades"),
     path('project/<pk>/', ProjectView.as_view(), name="project_detail"),
+    path('project/<pk>/tab/<tab>', ProjectTabView.as_view(), name="project_tab"),
     path('project/<pk>/edit_points/pitch', ProjectEditPitchPoints.as_view(), name="project_edit_pitch_points"),
     path('project/<pk>/edit_points/documentation', ProjectEditDocumentationPoints.as_view(), name="project_edit_documentation_points"),
     path('project/ungraded', ProjectUngradedListView.as_view(), name="project_list_ungraded"),
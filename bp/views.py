@@ -9,9 +9,9 @@ from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.core.exceptions import ValidationError
 from django.core.mail import EmailMessage
-from django.db import IntegrityError
-from django.db.models import Count, Q
-from django.http import HttpResponse, HttpResponseForbidden, Http404, HttpResponseRedirect
+from django.db import transaction, IntegrityError
+from django.db.models import Q
+from django.http import HttpResponseForbidden, Http404, HttpResponseRedirect
 from django.shortcuts import redirect, render, get_object_or_404
 from django.urls import reverse, reverse_lazy
 from django.views.defaults import bad_request, permission_denied, server_error, page_not_found
@@ -20,9 +20,12 @@ from django.views.generic import TemplateView, ListView, DetailView, UpdateView,
 from bp.forms import ProjectImportForm, StudentImportForm, ProjectImportSpecification as ProjectSpec, \
     StudentImportSpecification as StudentSpec
 from bp.grading.models import DocsGrade, PitchGrade
+from bp.cache import invalidate_cached_data, DASHBOARD
 from bp.models import BP, Project, Student, TL, PeerGroup
 from bp.forms import ProjectImportForm as Spec
+from bp.exports import streaming_csv_response
 from bp.roles import is_orga
+from bp.templatetags.tags_project_info_misc import ProjectInfoTabs
 from bp.timetracking.forms import ProjectPitchPointsUpdateForm, ProjectDocumentationPointsUpdateForm
 from bp.tllogs.orga.forms import CreatePeerGroupsForm
 
@@ -69,8 +72,8 @@ class ProjectListView(PermissionRequiredMixin, FilterByActiveBPMixin, ListView):
         return context
 
     def get_queryset(self):
-        return super().get_queryset().select_related('tl').select_related('peer_group').prefetch_related("student_set",
-                                                                                                         "tllog_set")
+        return super().get_queryset().select_related('tl', 'peer_group').prefetch_related("student_set") \
+            .with_grades().with_log_statistics()
 
 
 class ProjectUngradedListView(ProjectListView):
@@ -80,8 +83,7 @@ class ProjectUngradedListView(ProjectListView):
         return context
 
     def get_queryset(self):
-        return super().get_queryset().annotate(early_grades=Count('aggradebeforedeadline')).filter(
-            Q(early_grades=0) & Q(ag_grade__isnull=True))
+        return super().get_queryset().filter(Q(ag_points_before_deadline__isnull=True) & Q(ag_grade__isnull=True))
 
 
 class ProjectCloseToHigherGradeListView(ProjectListView):
@@ -91,9 +93,7 @@ class ProjectCloseToHigherGradeListView(ProjectListView):
         return context
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        queryset_ids = [project.id for project in queryset if project.grade_close_to_higher_grade]
-        return queryset.filter(Q(id__in=queryset_ids))
+        return super().get_queryset().close_to_higher_grade()
 
 
 class ProjectView(PermissionRequiredMixin, DetailView):
@@ -102,6 +102,31 @@ class ProjectView(PermissionRequiredMixin, DetailView):
     context_object_name = "project"
     permission_required = 'bp.view_project'
 
+    def get_queryset(self):
+        return super().get_queryset().with_grades().with_log_statistics()
+
+
+class ProjectTabView(PermissionRequiredMixin, DetailView):
+    """
+        Content of a single tab of the project page (see ProjectInfoTabs), loaded into its Turbo frame
+        when the tab is shown for the first time
+    """
+    model = Project
+    template_name = "bp/project/project_info/tab.html"
+    context_object_name = "project"
+    permission_required = 'bp.view_project'
+
+    def get_queryset(self):
+        return super().get_queryset().with_log_statistics()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        for desc, content in ProjectInfoTabs.get_ordered_tabs():
+            if content == self.kwargs['tab']:
+                context['desc'], context['content'] = desc, content
+                return context
+        raise Http404("Unbekannter Tab")
+
 
 class TLListView(PermissionRequiredMixin, FilterByActiveBPMixin, ListView):
     model = TL
@@ -110,7 +135,7 @@ class TLListView(PermissionRequiredMixin, FilterByActiveBPMixin, ListView):
     permission_required = 'bp.view_tl'
 
     def get_queryset(self):
-        return super().get_queryset().filter(confirmed=True).prefetch_related("project_set", "tllog_set")
+        return super().get_queryset().filter(confirmed=True).prefetch_related("project_set").with_log_statistics()
 
 
 class TLView(PermissionRequiredMixin, DetailView):
@@ -119,10 +144,13 @@ class TLView(PermissionRequiredMixin, DetailView):
     context_object_name = "tl"
     permission_required = 'bp.view_tl'
 
+    def get_queryset(self):
+        return super().get_queryset().with_log_statistics()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["logs"] = context["tl"].tllog_set.all()
-        context["logs_count"] = context["logs"].count()
+        context["logs"] = context["tl"].tllog_set.defer('text', 'comment')
+        context["logs_count"] = context["tl"].log_count
         context["reminder_count"] = context["tl"].log_reminder
         context["projects"] = context["tl"].project_set.all().prefetch_related("tllog_set",
                                                                                "tllog_set__current_problems")
@@ -169,20 +197,43 @@ class ProjectEditDocumentationPoints(ProjectEditPoints):
 
 @permission_required("bp.view_student")
 def grade_export_view(request):
-    # Create the HttpResponse object with the appropriate CSV header.
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="Bewertung-AG.csv"'
-
-    writer = csv.writer(response, delimiter=",")
-    writer.writerow(['ID', 'Vollständiger Name', 'E-Mail-Adresse', 'Status', 'Gruppe', 'Bewertung', 'Bestwertung',
-                     'Bewertung kann geändert werden', 'Zuletzt geändert (Bewertung)', 'Feedback als Kommentar'])
-
-    for student in Student.get_active().filter(project__isnull=False):
-        writer.writerow(
-            [student.moodle_id, student.name, student.mail, "", student.project.moodle_name, student.project.ag_points,
-             100, "Ja", "-", student.project.ag_points_justification])
-
-    return response
+    header = ['ID', 'Vollständiger Name', 'E-Mail-Adresse', 'Status', 'Gruppe', 'Bewertung', 'Bestwertung',
+              'Bewertung kann geändert werden', 'Zuletzt geändert (Bewertung)', 'Feedback als Kommentar']
+    # one row per student of the active BP, joined with the grade of the student's project
+    grades = Project.objects.with_grades() \
+        .filter(student__bp__active=True) \
+        .order_by('student__bp', 'student__name') \
+        .values_list('student__moodle_id', 'student__name', 'student__mail', 'nr', 'title',
+                     'current_ag_points', 'current_ag_points_justification')
+    rows = ([moodle_id, name, mail, "", f"{nr:02d}_{title}", ag_points, 100, "Ja", "-", justification or ""]
+            for moodle_id, name, mail, nr, title, ag_points, justification in grades.iterator())
+    return streaming_csv_response("Bewertung-AG.csv", header, rows)
+
+
+# Number of objects inserted per query by the CSV imports
+IMPORT_BATCH_SIZE = 500
+# e.g. the same rows were imported concurrently after the file had been validated
+IMPORT_CONFLICT_MESSAGE = "Import abgebrochen, da Einträge inzwischen anderweitig angelegt wurden. Es wurde nichts " \
+                          "importiert, bitte erneut versuchen."
+
+
+def _invalid_columns(instance, columns):
+    """
+    Validate the fields of an unsaved model instance that were read from a CSV file
+    (foreign keys are not checked to avoid one query per row, empty nullable fields are accepted)
+
+    :param instance: model instance created from a CSV row
+    :param columns: CSV column name of each validated model field
+    :type columns: dict of str to str
+    :return: CSV column names of invalid values
+    :rtype: list of str
+    """
+    try:
+        instance.clean_fields(exclude=[f.name for f in instance._meta.fields
+                                       if f.name not in columns or (f.null and getattr(instance, f.attname) is None)])
+    except ValidationError as e:
+        return [columns[field] for field in e.message_dict if field in columns]
+    return []
 
 
 class ProjectImportView(PermissionRequiredMixin, FormView):
@@ -201,58 +252,63 @@ class ProjectImportView(PermissionRequiredMixin, FormView):
                      }
 
     def form_valid(self, form):
-        import_count = 0
         reader = csv.DictReader(io.TextIOWrapper(form.cleaned_data.get("csvfile").file),
                                 delimiter=ProjectSpec.SEPARATOR.value)
         active_bp = BP.get_active()
         lines_ignored = defaultdict(lambda: 0)
+        columns = {'nr': ProjectSpec.PROJECT.value,
+                   'ag': ProjectSpec.CLIENT.value,
+                   'ag_mail': ProjectSpec.CLIENT_MAIL.value,
+                   'title': ProjectSpec.PROJECT_NAME.value,
+                   'short_title': ProjectSpec.PROJECT_SHORT_NAME.value,
+                   'order_id': ProjectSpec.PRETIX_ID.value}
+        existing = active_bp.project_set.values_list('nr', 'order_id')
+        taken_nrs = {nr for nr, _ in existing}
+        taken_order_ids = {order_id for _, order_id in existing}
+
+        '''validate all rows before writing anything'''
+        projects = []
         for row in reader:
             '''check if all columns exist'''
-            if ProjectSpec.PROJECT.value not in row:
-                lines_ignored[f"Spalte '{ProjectSpec.PROJECT.value}' nicht gefunden"] += 1
-                continue
-            if ProjectSpec.CLIENT.value not in row:
-                lines_ignored[f"Spalte '{ProjectSpec.CLIENT.value}' nicht gefunden"] += 1
-                continue
-            if ProjectSpec.CLIENT_MAIL.value not in row:
-                lines_ignored[f"Spalte '{ProjectSpec.CLIENT_MAIL.value}' nicht gefunden"] += 1
-                continue
-            if ProjectSpec.PROJECT_NAME.value not in row:
-                lines_ignored[f"Spalte '{ProjectSpec.PROJECT_NAME.value}' nicht gefunden"] += 1
-                continue
-            if ProjectSpec.PRETIX_ID.value not in row:
-                lines_ignored[f"Spalte '{ProjectSpec.PRETIX_ID.value}' nicht gefunden"] += 1
+            missing_column = next((column for field, column in columns.items()
+                                   if column not in row and field != 'short_title'), None)
+            if missing_column:
+                lines_ignored[f"Spalte '{missing_column}' nicht gefunden"] += 1
                 continue
 
             '''try to create object from row'''
-            project_nr = row[ProjectSpec.PROJECT.value]
-            client = row[ProjectSpec.CLIENT.value]
-            client_mail = row[ProjectSpec.CLIENT_MAIL.value]
-            project_name = row[ProjectSpec.PROJECT_NAME.value]
-            project_short_name = row[ProjectSpec.PROJECT_SHORT_NAME.value] if not row[
-                                                                                      ProjectSpec.PROJECT_SHORT_NAME.value] == "" else None
-            pretix_id = row[ProjectSpec.PRETIX_ID.value]
-            try:
-                Project.objects.create(nr=project_nr,
-                                       ag=client,
-                                       ag_mail=client_mail,
-                                       title=project_name,
-                                       short_title=project_short_name,
-                                       order_id=pretix_id,
-                                       bp=active_bp
-                                       )
-            except IntegrityError:
-                print(f"Project mit Nummer '{project_nr}' existiert bereits")
-                lines_ignored["Projekt existiert bereits"] += 1
+            project = Project(nr=row[ProjectSpec.PROJECT.value],
+                              ag=row[ProjectSpec.CLIENT.value],
+                              ag_mail=row[ProjectSpec.CLIENT_MAIL.value],
+                              title=row[ProjectSpec.PROJECT_NAME.value],
+                              short_title=row.get(ProjectSpec.PROJECT_SHORT_NAME.value) or None,
+                              order_id=row[ProjectSpec.PRETIX_ID.value],
+                              bp=active_bp
+                              )
+            invalid_columns = _invalid_columns(project, columns)
+            if invalid_columns:
+                lines_ignored[f"Ungültiger Wert für '{invalid_columns[0]}'"] += 1
                 continue
-            except ValueError:
-                lines_ignored[f"Ungültiger Wert für '{ProjectSpec.PROJECT.value}' (ValueError)"] += 1
+            if project.nr in taken_nrs or project.order_id in taken_order_ids:
+                print(f"Project mit Nummer '{project.nr}' existiert bereits")
+                lines_ignored["Projekt existiert bereits"] += 1
                 continue
-            else:
-                import_count += 1
+            taken_nrs.add(project.nr)
+            taken_order_ids.add(project.order_id)
+            projects.append(project)
+
+        '''write all valid rows at once (or none of them)'''
+        try:
+            with transaction.atomic():
+                Project.objects.bulk_create(projects, batch_size=IMPORT_BATCH_SIZE)
+        except IntegrityError:
+            messages.add_message(self.request, messages.ERROR, IMPORT_CONFLICT_MESSAGE)
+            return self.form_invalid(form)
+        # bulk_create does not send post_save signals
+        invalidate_cached_data(DASHBOARD)
 
         '''print success/error messages'''
-        messages.add_message(self.request, messages.SUCCESS, f"{import_count} Projekt(e) erfolgreich importiert")
+        messages.add_message(self.request, messages.SUCCESS, f"{len(projects)} Projekt(e) erfolgreich importiert")
         for error_msg, ignored_lines in lines_ignored.items():
             messages.add_message(self.request, messages.WARNING,
                                  f"{ignored_lines} Zeile(n) ignoriert wegen: {error_msg}")
@@ -284,32 +340,32 @@ class StudentImportView(PermissionRequiredMixin, FormView):
                      }
 
     def form_valid(self, form):
-        import_count = 0
         reader = csv.DictReader(io.TextIOWrapper(form.cleaned_data.get("csvfile").file),
                                 delimiter=StudentSpec.SEPARATOR.value)
         active_bp = BP.get_active()
         lines_ignored = defaultdict(lambda: 0)
+        columns = {'moodle_id': StudentSpec.ID.value,
+                   'name': StudentSpec.NAME.value,
+                   'mail': StudentSpec.MAIL.value}
+        projects = {project.nr: project for project in active_bp.project_set.all()}
+        taken_moodle_ids = set(Student.objects.values_list('moodle_id', flat=True))
+
+        '''validate all rows before writing anything'''
+        students = []
         for row in reader:
             '''check if all columns exist'''
-            if StudentSpec.ID.value not in row:
-                lines_ignored[f"Spalte '{StudentSpec.ID.value}' nicht gefunden"] += 1
-                continue
-            if StudentSpec.NAME.value not in row:
-                lines_ignored[f"Spalte '{StudentSpec.NAME.value}' nicht gefunden"] += 1
-                continue
-            if StudentSpec.MAIL.value not in row:
-                lines_ignored[f"Spalte '{StudentSpec.MAIL.value}' nicht gefunden"] += 1
-                continue
-            if StudentSpec.PROJECT.value not in row:
-                lines_ignored[f"Spalte '{StudentSpec.PROJECT.value}' nicht gefunden"] += 1
+            missing_column = next((column for column in [*columns.values(), StudentSpec.PROJECT.value]
+                                   if column not in row), None)
+            if missing_column:
+                lines_ignored[f"Spalte '{missing_column}' nicht gefunden"] += 1
                 continue
 
             '''check if project exists'''
             project_nr = row[StudentSpec.PROJECT.value]
             try:
-                project = active_bp.project_set.filter(nr=project_nr).first()
+                project = projects.get(int(project_nr))
             except ValueError:
-                lines_ignored[f"Ungültiger Wert für '{StudentSpec.PROJECT.value}' (ValueError)"] += 1
+                lines_ignored[f"Ungültiger Wert für '{StudentSpec.PROJECT.value}'"] += 1
                 continue
             if not project:
                 print(f"Project mit Nummer '{project_nr}' existiert nicht")
@@ -317,25 +373,35 @@ class StudentImportView(PermissionRequiredMixin, FormView):
                 continue
 
             '''try to create object from row'''
-            moodle_id = row[StudentSpec.ID.value]
-            name = row[StudentSpec.NAME.value]
-            mail = row[StudentSpec.MAIL.value]
-            try:
-                Student.objects.create(moodle_id=moodle_id,
-                                       name=name,
-                                       mail=mail,
-                                       project=project,
-                                       bp=active_bp
-                                       )
-            except IntegrityError:
-                print(f"Teilnehmer mit Moodle-ID '{moodle_id}' existiert bereits")
+            student = Student(moodle_id=row[StudentSpec.ID.value],
+                              name=row[StudentSpec.NAME.value],
+                              mail=row[StudentSpec.MAIL.value],
+                              project=project,
+                              bp=active_bp
+                              )
+            invalid_columns = _invalid_columns(student, columns)
+            if invalid_columns:
+                lines_ignored[f"Ungültiger Wert für '{invalid_columns[0]}'"] += 1
+                continue
+            if student.moodle_id in taken_moodle_ids:
+                print(f"Teilnehmer mit Moodle-ID '{student.moodle_id}' existiert bereits")
                 lines_ignored["Teilnehmer existiert bereits"] += 1
                 continue
-            else:
-                import_count += 1
+            taken_moodle_ids.add(student.moodle_id)
+            students.append(student)
+
+        '''write all valid rows at once (or none of them)'''
+        try:
+            with transaction.atomic():
+                Student.objects.bulk_create(students, batch_size=IMPORT_BATCH_SIZE)
+        except IntegrityError:
+            messages.add_message(self.request, messages.ERROR, IMPORT_CONFLICT_MESSAGE)
+            return self.form_invalid(form)
+        # bulk_create does not send post_save signals
+        invalidate_cached_data(DASHBOARD)
 
         '''print success/error messages'''
-        messages.add_message(self.request, messages.SUCCESS, f"{import_count} Teilnehmer erfolgreich importiert")
+        messages.add_message(self.request, messages.SUCCESS, f"{len(students)} Teilnehmer erfolgreich importiert")
         for error_msg, ignored_lines in lines_ignored.items():
             messages.add_message(self.request, messages.WARNING,
                                  f"{ignored_lines} Zeile(n) ignoriert wegen: {error_msg}")
@@ -376,24 +442,16 @@ class PeerGroupCreateView(PermissionRequiredMixin, FormView):
 
 @permission_required("bp.view_student")
 def delete_peer_groups(request):
-    PeerGroup.objects.all().delete()
+    PeerGroup.objects.filter(bp=BP.get_active()).delete()
     messages.add_message(request, messages.SUCCESS, "Alle Peer-Gruppen wurden gelöscht.")
     return redirect("bp:peer_group_list")
 
 
 @permission_required("bp.view_student")
 def peer_group_export_view(request):
-    response = HttpResponse(content_type="application/json")
-    response['Content-Disposition'] = "attachment; filename=peer_groups.csv"
-    writer = csv.writer(response)
-    writer.writerow(["name", "moodle_id", "mail", "group"])
-    for peer_group in PeerGroup.objects.all():
-        for group in peer_group.member_groups:
-            for student in group.student_set.all():
-                writer.writerow([
-                    student.name,
-                    student.moodle_id,
-                    student.mail,
-                    str(group.peer_group)
-                ])
-    return response
+    students = Student.objects.filter(project__peer_group__isnull=False) \
+        .order_by('project__peer_group__bp', 'project__peer_group__nr', 'project__bp', 'project__nr', 'bp', 'name') \
+        .values_list('name', 'moodle_id', 'mail', 'project__peer_group__nr')
+    rows = ([name, moodle_id, mail, f"Peergroup {peer_group_nr:02}"]
+            for name, moodle_id, mail, peer_group_nr in students.iterator())
+    return streaming_csv_response("peer_groups.csv", ["name", "moodle_id", "mail", "group"], rows)
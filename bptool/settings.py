@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import hashlib
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bp.performance.PerformanceMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -82,9 +85,51 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep the connection of a process (thread) open for further requests instead of opening one per request
+        # (without effect for the development server, which handles every request in a new thread)
+        'CONN_MAX_AGE': 60,
+        # The models of django-lti-provider do not match its migrations, so the test database cannot be serialized
+        'TEST': {'SERIALIZE': False},
     }
 }
 
+# Applied to every new SQLite connection (see bp/database.py): reads do not block writes and vice versa (WAL),
+# fewer syncs to disk (safe with WAL), waiting up to 5 s for locks, memory-mapped reads and 64 MB page cache
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+}
+# Write paths decorated with retry_on_lock are repeated this often if the database is locked,
+# waiting 0.05, 0.1, 0.2, ... seconds (with jitter), see the stress_database command
+DATABASE_LOCK_RETRIES = 5
+DATABASE_LOCK_RETRY_DELAY_SECONDS = 0.05
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Shared by all processes (e.g. the uwsgi workers), so that invalidating cached data after a write (see bp/cache.py)
+# reaches every process; a per-process backend like LocMemCache would serve stale data. See settings_production.py
+# for the production cache. Each checkout gets a directory of its own, the cached data belongs to its database.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(Path(tempfile.gettempdir()) / f"bptool_cache_{hashlib.sha1(bytes(BASE_DIR)).hexdigest()[:12]}"),
+    }
+}
+
+# Used instead of CACHES by the tests and the commands working on a test database (e.g. benchmark_views),
+# so that they neither read nor clear the cache of a running instance
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bptool-tests',
+    }
+}
+TEST_RUNNER = 'bp.test_runner.TestRunner'
+
 AUTHENTICATION_BACKENDS = [
   'django.contrib.auth.backends.ModelBackend',
   'lti_provider.auth.LTIBackend',
@@ -182,17 +227,72 @@ SESSION_COOKIE_SECURE = True
 PRETIX_BASE_URL = "https://<your-hostname>/"
 PRETIX_ORGANIZER = "<organizer>"
 PRETIX_API_TOKEN = "<secret-api-token>"
+# Timeout of a single request to the pretix API, number of pages that are loaded concurrently
+PRETIX_TIMEOUT_SECONDS = 10
+PRETIX_MAX_WORKERS = 4
+# Orders (e.g. the secrets of the AGs) are cached locally, refresh them with the refresh_pretix_orders command
+PRETIX_CACHE_TTL_SECONDS = 24 * 60 * 60
+# If pretix cannot be reached, an outdated copy of an order is used until it is this old
+PRETIX_CACHE_MAX_STALE_SECONDS = 3 * 24 * 60 * 60
 
 SEND_MAILS = True
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# E-mails are queued and sent by the send_queued_mails management command,
+# failed attempts are retried after 1, 2, 4, ... minutes until the maximum number of attempts is reached
+MAIL_QUEUE_MAX_ATTEMPTS = 5
+MAIL_QUEUE_RETRY_DELAY_SECONDS = 60
+# E-mails claimed by a sending process that did not finish in time (e.g. after a crash) are sent again
+MAIL_QUEUE_CLAIM_TIMEOUT_SECONDS = 10 * 60
+
 LOG_REMIND_PERIOD_DAYS = 7
+# The send_log_reminders command (e.g. run hourly by cron) reminds the TLs in one run every LOG_REMINDER_INTERVAL_DAYS
+# days, only between the given hours (start inclusive, end exclusive, local time) and LOG_REMINDER_CHUNK_SIZE TLs
+# at a time
+LOG_REMINDER_INTERVAL_DAYS = 1
+LOG_REMINDER_HOURS = (2, 6)
+LOG_REMINDER_CHUNK_SIZE = 20
+# A run that did not finish in time (e.g. after a crash) no longer blocks further runs
+LOG_REMINDER_LOCK_TIMEOUT_SECONDS = 60 * 60
+# Number of unread logs loaded at once by the triage mode of the log detail page
+LOG_TRIAGE_QUEUE_LENGTH = 10
+
+# Maximum age of the key figures shown on the dashboards (they are also updated whenever the data changes)
+DASHBOARD_CACHE_SECONDS = 5 * 60
+# Maximum age of cached reference data (active BP, time tracking categories, log problems and templates),
+# changes are visible immediately with a shared cache backend and after this period with the local memory cache
+REFERENCE_DATA_CACHE_SECONDS = 10 * 60
 
 LOGIN_URL = '/login/'
 
 PEER_GROUPS_OPTIMISATION_LIMIT = 1_000
 PEER_GROUPS_MEMBER_GROUPS_COUNT = 3
 
+# Opt-in log of the performance of every request (JSON lines, see bp/performance.py),
+# aggregate it with the performance_report command. It is shared by all uwsgi processes and rotated by logrotate
+# (see logrotate-bp-tool.conf), the report reads as many rotated files as given here
+PERFORMANCE_LOG_FILE = None
+PERFORMANCE_LOG_BACKUP_COUNT = 5
+# Also record the peak memory allocations of every request (tracemalloc slows down all requests considerably)
+PERFORMANCE_LOG_TRACE_MEMORY = False
+
+# Log messages of the bp app (e.g. export statistics) to the console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'bp': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
 include(optional("settings/*.py"))
 
 PRETIX_API_BASE_URL = f"{PRETIX_BASE_URL}api/v1/"
@@ -32,9 +32,37 @@ DATABASES = {
         'NAME': secrets.DB_NAME,
         'USER': secrets.DB_USER,
         'PASSWORD': secrets.DB_PASSWORD,
+        'CONN_MAX_AGE': 60,
     }
 }
 
+### CACHE ###
+
+# Shared by all uwsgi processes: "file" (default, no further dependencies) or "memcached" (requires pymemcache)
+CACHE_BACKEND = getattr(secrets, "CACHE_BACKEND", "file")
+
+# The cached data belongs to the database, instances with different databases (e.g. staging) must not share it
+if CACHE_BACKEND == "memcached":
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': getattr(secrets, "CACHE_LOCATION", "127.0.0.1:11211"),
+            'KEY_PREFIX': f"bptool_{secrets.DB_NAME}",
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': getattr(secrets, "CACHE_LOCATION", f"/var/tmp/bptool_cache/{secrets.DB_NAME}"),
+            'KEY_PREFIX': f"bptool_{secrets.DB_NAME}",
+        }
+    }
+
+### PERFORMANCE LOG ###
+
+PERFORMANCE_LOG_FILE = getattr(secrets, "PERFORMANCE_LOG_FILE", None)
+
 ### MAIL
 
 SEND_MAILS = True